@@ -5,25 +5,507 @@
 .. moduleauthor:: Michael Perez (Mgamerz) <developer.mgamerzproductions@gmail.com>
 .. moduleauthor:: wegry
 """
-import requests
+import collections
+import collections.abc
+import functools
 import logging
-from requests.auth import HTTPBasicAuth
+import threading
+import time
 
-class DesktopprAPI:
+#requests and urllib3 take most of the time of an import, so they are only imported when the first request is
+#sent; see DesktopprAPI.session and _pooled_adapter_class().
+
+class _DesktopprBase:
     """
-    This class allows you to create an object that allows you to query the Desktoppr site using their public API.
+    State and response handling shared by :class:`DesktopprAPI` and :class:`DesktopprAsync.AsyncDesktopprAPI`.
+    Subclasses only supply the transport: they send the request and pass the response to the matching
+    ``_*_result`` method, so both clients return exactly the same objects.
     """
     logger = logging.getLogger(__name__)
-    #Uncomment the following lines to show debugging information
-    #logger.setLevel(logging.INFO)
-    logger.addHandler(logging.StreamHandler())
+    #Messages are shown once the application configures logging, for example with
+    #logging.basicConfig(level=logging.INFO).
+    logger.addHandler(logging.NullHandler())
 
 
     __version__ = '0.9'
     baseurl = 'https://api.desktoppr.co/1/'
     apikey = None #: Stored API key for the session. It is set when an authorize method succeeds.
     authed_user = None #: Stored username for the authorized user. It is set when an authorize method succeeds.
+    lazy_pages = False #: If True, returned pages build their Wallpaper/User objects on first access. See :class:`Page`.
+
+    safefilters = ('safe', 'include_pending', 'all')
+    flags = ('flag_safe', 'flag_not_safe', 'flag_deletion')
+
+    def _check_filter(self, safefilter):
+        """Internal method that validates a safefilter argument, logging the valid options if it is not one."""
+        if safefilter not in self.safefilters:
+            self.logger.info(
+                'Unknown filter: {}. Valid options are safe, include_pending, all'.format(safefilter))
+            return False
+        return True
+
+    def _check_flag(self, flag):
+        """Internal method that validates a flag argument."""
+        if flag not in self.flags:
+            self.logger.info('ERROR: Flag must be flag_safe, flag_not_safe, or flag_deletion')
+            return False
+        return True
+
+    def _check_auth(self):
+        """Internal method that checks a privileged command can be sent, logging an error if it can't."""
+        if not self.apikey:
+            self.logger.info(
+                'ERROR: This is a user command. You must first authenticate as a user with authorize_user_pass() \
+                or authorize_API() method.')
+            return False
+        return True
+
+    def _authorize_API_result(self, r, apikey):
+        if r.status_code == 200:
+            self.apikey = apikey
+            self.authed_user = r.json()['response']['username']
+            self.logger.info('Authenticated as {}'.format(self.authed_user))
+            return True
+        else:
+            self.logger.info('Error authorizing via API key: {}'.format(r.status_code))
+            return False
+
+    def _authorize_user_pass_result(self, r):
+        if r.status_code == 200:
+            json = r.json()['response']
+            self.apikey = json['api_token']
+            self.authed_user = json['username']
+            self.logger.info('Authenticated, storing API token')
+            return True
+        else:
+            return False
+
+    def _user_info_result(self, r, username):
+        try:
+            response = r.json()['response']
+        except Exception as e:
+            self.logger.info('Error retrieving information for user {}: {}'.format(username, e))
+            return None
+        return User(response)
+
+    def _user_collection_result(self, r):
+        if r.status_code != 200:
+            self.logger.info('Abnormal response code when retrieving user collection: {}'.format(r.status_code))
+            return None
+        info = r.json()
+        if info['response']:
+            return Page('wallpapers', info, self.lazy_pages)
+        else:
+            self.logger.info('User has no wallpapers.')
+            return None
+
+    def _wallpapers_result(self, r):
+        if r.status_code == 200:
+            # Build wallpaper object
+            wallpapers = []
+            json = r.json()['response']
+            for paperinfo in json:
+                wallpapers.append(Wallpaper(paperinfo))
+            return wallpapers
+        else:
+            self.logger.info('Error getting wallpapers: {}'.format(r.status_code))
+            return None
+
+    def _wallpapers_page_result(self, r):
+        if r.status_code == 200:
+            return Page('wallpapers', r.json(), self.lazy_pages)
+        else:
+            self.logger.info('Error getting wallpapers: {}'.format(r.status_code))
+            return None
+
+    def _user_followers_result(self, r):
+        if r.status_code == 200:
+            return Page('users', r.json(), self.lazy_pages)
+        else:
+            self.logger.info('Unable to retrieve followers: {}'.format(r.status_code))
+            return None
+
+    def _followed_users_result(self, r):
+        if r.status_code == 200:
+            return Page('users', r.json(), self.lazy_pages)
+        else:
+            self.logger.info('Unable to retrieve following list: {}'.format(r.status_code))
+            return None
+
+    def _user_randomwallpaper_result(self, r):
+        if r.status_code == 500 or r.status_code == 404:
+            #error occurred
+            self.logger.info('Status code for URL {}: {}'.format(r.url, r.status_code))
+            return None
+        return Wallpaper(r.json()['response'])
+
+    def _random_wallpaper_result(self, r):
+        if r.status_code != 200:
+            #error occurred
+            self.logger.info('Error getting random wallpaper: {}'.format(r.status_code))
+            return None
+        return Wallpaper(r.json()['response'])
+
+    def _follow_result(self, r):
+        if r.status_code == 200:
+            return True
+        else:
+            return False
+
+    def _like_result(self, r, action):
+        if action == 'like' and (r.status_code == 200 or r.status_code == 422): #422 means its already liked
+            return True
+        else:
+            if action == 'unlike' and (r.status_code == 200 or r.status_code == 404): #If it 404's, the wallpaper isn't liked.
+                return True
+        return False
 
+    def _check_if_liked_result(self, r):
+        if r.status_code != 200:
+            self.logger.info('Error retrieving liked status:{}'.format(r.status_code))
+            return None
+        liked = r.json()['response']
+        #If the response content is empty, then the user doesn't like the wallpaper.
+        if liked:
+            return True
+        else:
+            return False
+
+    def _userlikes_result(self, r):
+        if r.status_code != 200:
+            self.logger.info('Error retrieving liked status:{}'.format(r.status_code))
+            return None
+        return Page('wallpapers', r.json(), self.lazy_pages)
+
+    def _sync_result(self, r, action):
+        if action == 'sync' and (r.status_code == 200 or r.status_code == 422): #422 means its already synced
+            return True
+        else:
+            if action == 'unsync' and (r.status_code == 200 or r.status_code == 404): #unsync checks against your dropbox folder. If it 404's, the file is already unsynced.
+                return True
+        return False
+
+    def _check_if_synced_result(self, r):
+        if r.status_code != 200:
+            #A logging message will go here.
+            self.logger.info('Error checking for synced wallpaper: {}'.format(r.status_code))
+            return None
+        try:
+            synced = r.json()['count']
+            if synced > 0:
+                return True
+            else:
+                return False
+        except:
+            return None
+
+    def _flag_result(self, r):
+        if r.status_code == 200:
+            return True
+        else:
+            return False
+
+
+_LIST_PATHS = {'collection': 'wallpapers', 'likes': 'likes'}
+"""Lists of a user that :meth:`DesktopprAPI.get_list_page` reads, with the path segment the API serves them under."""
+
+_calls = threading.local()
+_connects = threading.local()
+
+
+def _instrumented(method):
+    """Decorator for the public methods that send requests. While :class:`DesktopprAPI` has listeners, it collects
+    the :class:`RequestRecord` of every request the method sends, adds the time spent building the result and
+    passes the records to the listeners when the method returns. Calls made from inside it are part of it."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not self._listeners or getattr(_calls, 'records', None) is not None:
+            return method(self, *args, **kwargs)
+        records = _calls.records = []
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            _calls.records = None
+            finished = time.perf_counter()
+            for record in records:
+                record._finish(finished)
+                self._emit(record)
+    return wrapper
+
+
+class DesktopprAPI(_DesktopprBase):
+    """
+    This class allows you to create an object that allows you to query the Desktoppr site using their public API.
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, pool_block=False, cache=None, lazy_pages=False,
+                 rate_limit=None, retry=None, circuit_breaker=None, membership_ttl=300, timeout=30):
+        """Creates a new API object. Every request made by this object goes through a single keep-alive session, so
+        repeated calls reuse open connections instead of doing a new DNS lookup, TCP connect and TLS handshake.
+
+        :param pool_connections: *Optional*, number of per-host connection pools to keep cached. Defaults to **10**.
+        :type pool_connections: int
+        :param pool_maxsize: *Optional*, maximum number of connections kept open to a single host. Set this to at least \
+            the number of threads sharing this object. Defaults to **10**.
+        :type pool_maxsize: int
+        :param pool_block: *Optional*, if **True**, requests wait for a free connection when a host's pool is full \
+            instead of opening a throwaway one. Defaults to **False**.
+        :type pool_block: bool
+        :param cache: *Optional*, a :class:`DesktopprCache.ResponseCache` to serve repeated reads from, or **True** \
+            to use one with the default settings. Defaults to **None** (no caching).
+        :type cache: DesktopprCache.ResponseCache
+        :param lazy_pages: *Optional*, if **True**, the :class:`Page` objects returned by this object only build a \
+            :class:`Wallpaper` or :class:`User` when it is first accessed. Defaults to **False**.
+        :type lazy_pages: bool
+        :param rate_limit: *Optional*, a :class:`DesktopprRateLimit.RateLimiter` every request waits for, or **True** \
+            to share the process-wide one from :func:`DesktopprRateLimit.shared_limiter`. Throttled requests (429 or \
+            503) are retried after backing off. Defaults to **None** (no limiting).
+        :type rate_limit: DesktopprRateLimit.RateLimiter
+        :param retry: *Optional*, a :class:`DesktopprRetry.RetryPolicy` deciding which failed requests are sent \
+            again, or **True** to retry GET requests with the default policy. Defaults to **None** (no retries).
+        :type retry: DesktopprRetry.RetryPolicy
+        :param circuit_breaker: *Optional*, a :class:`DesktopprRetry.CircuitBreaker` that fails requests fast while \
+            the server is mostly failing, or **True** to use one with the default settings. Defaults to **None**.
+        :type circuit_breaker: DesktopprRetry.CircuitBreaker
+        :param membership_ttl: *Optional*, seconds the like/sync indexes of :meth:`check_liked_many` and \
+            :meth:`check_synced_many` are reused for users other than the authorized one, whose changes this object \
+            can't see. The authorized user's indexes are kept up to date instead. Defaults to **300**.
+        :type membership_ttl: float
+        :param timeout: *Optional*, seconds to wait for a connection and then between two reads of a response, or a \
+            (connect, read) tuple. A request that takes longer raises :class:`requests.Timeout`, which the retry \
+            policy retries and the circuit breaker counts as a failure. **None** waits forever. Defaults to **30**.
+        :type timeout: float
+        """
+        self._pool_options = {'pool_connections': pool_connections, 'pool_maxsize': pool_maxsize,
+                              'pool_block': pool_block}
+        self._session = None
+        self._adapter = None
+        self._session_lock = threading.Lock()
+
+        if cache is True:
+            from DesktopprCache import ResponseCache
+            cache = ResponseCache()
+        self.cache = cache
+        """The :class:`DesktopprCache.ResponseCache` in use, or None. Its ``stats()`` method reports hits, misses \
+        and evictions."""
+
+        if rate_limit is True:
+            from DesktopprRateLimit import shared_limiter
+            rate_limit = shared_limiter()
+        self.rate_limiter = rate_limit
+        """The :class:`DesktopprRateLimit.RateLimiter` in use, or None. Its ``stats()`` method reports the current \
+        rate and how many requests are waiting."""
+
+        if retry is True or circuit_breaker is True:
+            from DesktopprRetry import RetryPolicy, CircuitBreaker
+            retry = RetryPolicy() if retry is True else retry
+            circuit_breaker = CircuitBreaker() if circuit_breaker is True else circuit_breaker
+        self.retry_policy = retry
+        """The :class:`DesktopprRetry.RetryPolicy` in use, or None."""
+
+        self.circuit_breaker = circuit_breaker
+        """The :class:`DesktopprRetry.CircuitBreaker` in use, or None. Its ``stats()`` method reports its state, \
+        failure rate and how many requests it rejected."""
+
+        self._membership = {}
+        self._membership_lock = threading.Lock()
+        self.membership_ttl = membership_ttl
+        self.timeout = timeout
+        """Timeout of every request, as passed to the constructor. It can be changed at any time."""
+
+        self.lazy_pages = lazy_pages
+        self._listeners = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def session(self):
+        """The :class:`requests.Session` every request of this object is sent through. It is created (and
+        :mod:`requests` imported) the first time it is needed."""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    session = requests.Session()
+                    self._adapter = _pooled_adapter_class()(**self._pool_options)
+                    session.mount('https://', self._adapter)
+                    session.mount('http://', self._adapter)
+                    self._session = session
+        return self._session
+
+    def close(self):
+        """Closes every pooled connection held by this object."""
+        if self._session is not None:
+            self._session.close()
+
+    def connection_stats(self):
+        """Reports how well the connection pool is being reused.
+
+        :returns: dict with the keys **requests** (requests sent), **connections** (new connections opened), \
+            **reused** (requests that went over an already open connection) and **reuse_ratio** (reused / requests).
+        """
+        if self._adapter is None:
+            return {'requests': 0, 'connections': 0, 'reused': 0, 'reuse_ratio': 0.0}
+        return self._adapter.stats()
+
+    def add_listener(self, listener):
+        """Registers a function that is called with a :class:`RequestRecord` after every request this object sends
+        (or answers from its cache), once the method that sent it has built its result. A
+        :class:`DesktopprMetrics.MetricsAggregator` can be used as a listener.
+
+        Listeners are called on the thread that made the request, so they should be quick and thread-safe. Errors
+        they raise are logged and ignored. Nothing is measured while no listener is registered.
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Unregisters a function added with :meth:`add_listener`."""
+        self._listeners.remove(listener)
+
+    def _emit(self, record):
+        for listener in list(self._listeners):
+            try:
+                listener(record)
+            except Exception as e:
+                self.logger.info('Error in request listener {}: {}'.format(listener, e))
+
+    def _request(self, method, path, revalidate=False, **kwargs):
+        """Internal method that sends a request for an API path (relative to :attr:`baseurl`) through the pooled
+        session, answering it from :attr:`cache` when possible. With *revalidate*, a fresh cached copy is checked with
+        the server all the same. Other keyword arguments are passed on to :meth:`requests.Session.request`."""
+        if not self._listeners:
+            return self._lookup_or_send(method, path, None, revalidate, **kwargs)
+        record = RequestRecord(method, _endpoint_template(path))
+        try:
+            r = self._lookup_or_send(method, path, record, revalidate, **kwargs)
+        except Exception as e:
+            record.error = e
+            record._returned = time.perf_counter()
+            self._collect(record)
+            raise
+        record.status = r.status_code
+        record._returned = time.perf_counter()
+        r._record = record
+        self._collect(record)
+        return r
+
+    def _collect(self, record):
+        """Internal method that hands a record to the instrumented method being run on this thread, or straight to
+        the listeners if the request wasn't sent by one."""
+        records = getattr(_calls, 'records', None)
+        if records is not None:
+            records.append(record)
+        else:
+            record._finish(record._returned)
+            self._emit(record)
+
+    def _lookup_or_send(self, method, path, record, revalidate=False, **kwargs):
+        if self.cache is not None and method == 'GET':
+            ttl = self.cache.ttl_for(_endpoint_template(path))
+            if ttl:
+                return self._cached_request(path, ttl, record=record, revalidate=revalidate, **kwargs)
+        return self._send(method, path, record=record, **kwargs)
+
+    def _send(self, method, path, record=None, **kwargs):
+        """Internal method that sends a request over the network and reads the whole body as bytes.
+
+        With a :attr:`circuit_breaker`, requests fail fast with :class:`CircuitOpenError` while it is open. With a
+        :attr:`rate_limiter`, each attempt waits for its turn and throttled requests are retried, raising
+        :class:`RateLimitedError` when those retries run out. With a :attr:`retry_policy`, network errors and 5xx
+        statuses are retried after a backoff; once it gives up, the last error is raised or the last response
+        returned."""
+        url = '{}{}'.format(self.baseurl, path)
+        limiter, policy, breaker = self.rate_limiter, self.retry_policy, self.circuit_breaker
+        if limiter is None and policy is None and breaker is None:
+            return self._exchange(method, url, record, kwargs)
+        throttles = retries = 0
+        while True:
+            if record is not None:
+                record.retries = throttles + retries
+            if breaker is not None and not breaker.allow():
+                raise CircuitOpenError(path, breaker.retry_in())
+            if limiter is not None:
+                limiter.acquire(limiter.kind_for(method))
+            try:
+                response = self._exchange(method, url, record, kwargs)
+            except Exception as e:
+                if breaker is not None:
+                    breaker.record(False)
+                if policy is None or not policy.should_retry(method, retries, error=e):
+                    raise
+                delay = policy.delay(retries)
+                self.logger.info('Error on {} ({}), retrying in {:.1f}s'.format(path, e, delay))
+                retries += 1
+                time.sleep(delay)
+                continue
+            status = response.status_code
+            if breaker is not None:
+                breaker.record(status < 500)
+            if limiter is not None and status in (429, 503):
+                retry_after = response.headers.get('Retry-After')
+                if throttles >= limiter.max_retries:
+                    raise RateLimitedError(path, status, retry_after)
+                delay = limiter.throttled(retry_after, throttles)
+                self.logger.info('Throttled ({}) on {}, backing off {:.1f}s'.format(status, path, delay))
+                throttles += 1
+                continue
+            if policy is not None and policy.should_retry(method, retries, status=status):
+                delay = policy.delay(retries)
+                self.logger.info('Status {} on {}, retrying in {:.1f}s'.format(status, path, delay))
+                retries += 1
+                time.sleep(delay)
+                continue
+            return response
+
+    def _exchange(self, method, url, record, kwargs):
+        """Internal method that makes one HTTP request and reads its body. With a *record*, the time spent
+        connecting, waiting for the headers and reading the body is added to it."""
+        kwargs.setdefault('timeout', self.timeout)
+        if record is None:
+            r = self.session.request(method, url, **kwargs)
+            return _Response(r.status_code, r.url, r.headers, r.content)
+        _connects.seconds = 0.0
+        started = time.perf_counter()
+        r = self.session.request(method, url, stream=True, **kwargs)
+        headers_received = time.perf_counter()
+        content = r.content
+        record.body += time.perf_counter() - headers_received
+        record.connect += _connects.seconds
+        record.ttfb += headers_received - started - _connects.seconds
+        record.bytes += len(content)
+        return _Response(r.status_code, r.url, r.headers, content)
+
+    def _cached_request(self, path, ttl, headers=None, record=None, revalidate=False, **kwargs):
+        """Internal method that answers a cacheable GET from :attr:`cache`, revalidating stale entries (and fresh
+        ones too with *revalidate*)."""
+        key = self.cache.key(path, kwargs.get('params'))
+        entry = self.cache.lookup(key, revalidate)
+        if revalidate or entry is None or not entry.fresh():
+            headers = dict(headers or {})
+            if entry is not None:
+                headers.update(entry.validators())
+            r = self._send('GET', path, headers=headers, record=record, **kwargs)
+            if r.status_code == 304 and entry is not None:
+                self.cache.renew(entry, ttl)
+            elif r.status_code == 200:
+                entry = self.cache.store(key, r, ttl)
+            else:
+                return r
+        elif record is not None:
+            record.cached = True
+        #Every caller gets its own response, so decoded json is never shared between the objects built from it.
+        return _Response(entry.status_code, entry.url, entry.headers, entry.content)
+
+    def _invalidate(self, path, exact=False):
+        """Internal method that drops cached responses a mutating call has made out of date."""
+        if self.cache is not None:
+            self.cache.invalidate(path, exact)
+
+    @_instrumented
     def authorize_API(self, apikey):
         """Authorizes using a users api key. This does not require the user's
         password or username.
@@ -35,17 +517,10 @@ class DesktopprAPI:
             * **False** -- if the authorization did not work with the given apikey.
         """
         query = {'auth_token': apikey}
-        requesturl = '{}user/whoami'.format(self.baseurl)
-        r = requests.get(requesturl, params=query, headers={'Connection': 'close'})
-        if r.status_code == 200:
-            self.apikey = apikey
-            self.authed_user = r.json()['response']['username']
-            self.logger.info('Authenticated as {}'.format(self.authed_user))
-            return True
-        else:
-            self.logger.info('Error authorizing via API key: {}'.format(r.status_code))
-            return False
+        r = self._request('GET', 'user/whoami', params=query)
+        return self._authorize_API_result(r, apikey)
 
+    @_instrumented
     def authorize_user_pass(self, username, password):
         """Gets a users api key by authorizing to the site with a username/
         password. Stores the users API key in the field self.apikey for further privileged access in this
@@ -60,20 +535,10 @@ class DesktopprAPI:
             * **False** -- if the authorization did not work with the given username/password.
 
         """
-        r = requests.get(
-            'https://api.desktoppr.co/1/user/whoami',
-            auth=HTTPBasicAuth(
-                username,
-                password), headers={'Connection': 'close'})
-        if r.status_code == 200:
-            json = r.json()['response']
-            self.apikey = json['api_token']
-            self.authed_user = json['username']
-            self.logger.info('Authenticated, storing API token')
-            return True
-        else:
-            return False
+        r = self._request('GET', 'user/whoami', auth=(username, password))
+        return self._authorize_user_pass_result(r)
 
+    @_instrumented
     def get_user_info(self, username):
         """Get information about a user.
 
@@ -84,15 +549,16 @@ class DesktopprAPI:
             * :class:`User` object -- if the command succeeds. The user object's attributes can be parsed for desired information.
 
         """
-        requesturl = '{}users/{}'.format(self.baseurl, username)
         try:
-            response = requests.get(requesturl, headers={'Connection': 'close'}).json()['response']
+            r = self._request('GET', 'users/{}'.format(username))
+        except (RateLimitedError, CircuitOpenError):
+            raise
         except Exception as e:
-            #Put a logging message here
             self.logger.info('Error retrieving information for user {}: {}'.format(username, e))
             return None
-        return User(response)
+        return self._user_info_result(r, username)
 
+    @_instrumented
     def get_user_collection(self, username, page=1):
         """Gets a page of wallpapers defining ones in a users collection.
 
@@ -107,23 +573,10 @@ class DesktopprAPI:
         with the list of wallpapers the user has in their collection.
         """
         query = {'page': page}
-        requesturl = '{}users/{}/wallpapers'.format(self.baseurl, username)
-        r = requests.get(requesturl, params=query, headers={'Connection': 'close'})
-        if r.status_code != 200:
-            self.logger.info('Abnormal response code when retrieving user collection: {}'.format(r.status_code))
-            return None
-        page = Page('users', r.json())
-        wallpapers = r.json()['response']
-        #userpapers = []
-        if wallpapers:
-            return Page('wallpapers', r.json())
-            #for wallpaper in wallpapers:
-            #    userpapers.append(Wallpaper(wallpaper))
-            #return userpapers
-        else:
-            self.logger.info('User has no wallpapers.')
-            return None
+        r = self._request('GET', 'users/{}/wallpapers'.format(username), params=query)
+        return self._user_collection_result(r)
 
+    @_instrumented
     def get_wallpapers(self, page=1, safefilter='safe'):
         """Retrieves a list of wallpapers.
         The page parameter can query different pages of results.
@@ -146,24 +599,23 @@ class DesktopprAPI:
         with the list of wallpapers the returned by the server.
 
         """
-        if safefilter != 'safe' and safefilter != 'include_pending' and safefilter != 'all':
-            self.logger.info(
-                'Unknown filter: {}. Valid options are safe, include_pending, all'.format(safefilter))
+        if not self._check_filter(safefilter):
             return
         query = {'page': str(page), 'safe_filter': safefilter}
-        requesturl = '{}/wallpapers'.format(self.baseurl)
-        response = requests.get(requesturl, params=query, headers={'Connection': 'close'})
-        if response.status_code == 200:
-            # Build wallpaper object
-            wallpapers = []
-            json = response.json()['response']
-            for paperinfo in json:
-                wallpapers.append(Wallpaper(paperinfo))
-            return wallpapers
-        else:
-            self.logger.info('Error getting wallpapers:', response.status_code)
+        r = self._request('GET', 'wallpapers', params=query)
+        return self._wallpapers_result(r)
+
+    @_instrumented
+    def _get_wallpapers_page(self, page=1, safefilter='safe'):
+        """Internal method that works like :meth:`get_wallpapers`, but returns the whole :class:`Page` so the
+        pagination information is kept."""
+        if not self._check_filter(safefilter):
             return None
+        query = {'page': str(page), 'safe_filter': safefilter}
+        r = self._request('GET', 'wallpapers', params=query)
+        return self._wallpapers_page_result(r)
 
+    @_instrumented
     def get_wallpaper_urls(self, page=1, safefilter='safe'):
         """This is a subset of :meth:`get_wallpapers`, which returns a page of wallpaper URLs. The API does not document \
         sorting options.
@@ -180,9 +632,7 @@ class DesktopprAPI:
         populated with the list of wallpapers.
              * **None** -- If an error occurs trying to get wallpapers.
         """
-        if safefilter != 'safe' and safefilter != 'include_pending' and safefilter != 'all':
-            self.logger.info(
-                'Unknown filter: {}. Valid options are safe, include_pending, all'.format(safefilter))
+        if not self._check_filter(safefilter):
             return None
 
         wallpapers = self.get_wallpapers(page, safefilter)
@@ -192,6 +642,7 @@ class DesktopprAPI:
                 urls.append(wallpaper.image.url)
         return urls
 
+    @_instrumented
     def get_user_followers(self, username, page=1):
         """Gets a :class:`Page` contains a list of of :class:`User` objects representing users who follow this user.
         The pages can be iterated over to find all followers.
@@ -206,15 +657,11 @@ class DesktopprAPI:
         with the list of users.
 
         """
-        requesturl = '{}users/{}/followers'.format(self.baseurl, username)
         query = {'page': page}
-        r = requests.get(requesturl, params=query, headers={'Connection': 'close'})
-        if r.status_code == 200:
-            Page('users', r.json())
-        else:
-            self.logger.info('Unable to retrieve followers: {}'.format(r.status_code))
-            return None
+        r = self._request('GET', 'users/{}/followers'.format(username), params=query)
+        return self._user_followers_result(r)
 
+    @_instrumented
     def get_followed_users(self, username, page=1):
         """Gets a page containg a list of User objects who the specified user follows.
 
@@ -226,16 +673,11 @@ class DesktopprAPI:
             with the list of users.
 
         """
-        requesturl = '{}users/{}/following'.format(self.baseurl, username)
         query = {'page': page}
-        r = requests.get(requesturl, params=query, headers={'Connection': 'close'})
-        if r.status_code == 200:
-            users = []
-            return Page('users', r.json())
-        else:
-            self.logger.info('Unable to retrieve following list: {}'.format(r.status_code))
-            return None
+        r = self._request('GET', 'users/{}/following'.format(username), params=query)
+        return self._followed_users_result(r)
 
+    @_instrumented
     def get_user_randomwallpaper(self, username):
         """Fetches a random wallpaper a user has in their collection.
 
@@ -245,14 +687,10 @@ class DesktopprAPI:
             * :class:`Wallpaper` object -- If successful.
 
         """
-        requesturl = '{}users/{}/wallpapers/random'.format(self.baseurl, username)
-        r = requests.get(requesturl, headers={'Connection': 'close'})
-        if r.status_code == 500 or r.status_code == 404:
-            #error occurred
-            self.logger.info('Status code for URL {}: {}'.format(r.url, r.status_code))
-            return None
-        return Wallpaper(r.json()['response'])
+        r = self._request('GET', 'users/{}/wallpapers/random'.format(username))
+        return self._user_randomwallpaper_result(r)
 
+    @_instrumented
     def get_random_wallpaper(self, safefilter='safe'):
         """Retrieves a random wallpaper.
 
@@ -269,19 +707,13 @@ class DesktopprAPI:
         :returns: * **None** -- if a bad safefilter is passed (if any) or there was an error getting a wallpaper.
             * :class:`Wallpaper` object -- if successful.
         """
-        if safefilter != 'safe' and safefilter != 'include_pending' and safefilter != 'all':
-            self.logger.info(
-                'Unknown filter: {}. Valid options are safe, include_pending, all'.format(safefilter))
+        if not self._check_filter(safefilter):
             return None
-        requesturl = '{}/wallpapers/random'.format(self.baseurl)
         query = {'safe_filter': safefilter}
-        r = requests.get(requesturl, params=query, headers={'Connection': 'close'})
-        if r.status_code != 200:
-            #error occurred
-            self.logger.info('Error getting random wallpaper: {}'.format(r.status_code))
-            return None
-        return Wallpaper(r.json()['response'])
+        r = self._request('GET', 'wallpapers/random', params=query)
+        return self._random_wallpaper_result(r)
 
+    @_instrumented
     def follow_user(self, username):
         """
         Attempts to follow a user.
@@ -300,6 +732,7 @@ class DesktopprAPI:
         """
         return self._update_follow(username, 'follow')
 
+    @_instrumented
     def unfollow_user(self, username):
         """
         Attempts to unfollow a user.
@@ -315,30 +748,26 @@ class DesktopprAPI:
 
     def _update_follow(self, username, action):
         """Internal method to handle follow/unfollow requests"""
-        if not self.apikey:
-            self.logger.info(
-                'ERROR: This is a user command. You must first authenticate as a user with authorize_user_pass() or authorize_API() method.')
+        if not self._check_auth():
             return None
         if action != 'follow' and action != 'unfollow':
             self.logger.info('Internal error: Bad command for _update_follow: {}'.format(action))
             return None
-        r = None
-        if action == 'follow':
-            r = requests.post('{}users/{}/follow'.format(self.baseurl, username),
-                              params={'auth_token': self.apikey}, headers={'Connection': 'close'})
-
-            # if r.status_code!=200:
-            #	print('Abnormal response following user',username,':',r.status_code)
-        else:
-            r = requests.delete('{}users/{}/follow'.format(self.baseurl, username),
-                                params={'auth_token': self.apikey}, headers={'Connection': 'close'})
-            # if r.status_code!=200:
-            #	print('Abnormal response unfollowing user',username,':',r.status_code)
-        if r.status_code == 200:
-            return True
-        else:
-            return False
-
+        r = self._follow_request(username, action)
+        self._invalidate('users/{}'.format(self.authed_user), exact=True)
+        self._invalidate('users/{}/following'.format(self.authed_user), exact=True)
+        return self._follow_result(r)
+
+    def _follow_request(self, username, action):
+        """Internal method that sends one follow/unfollow request. Authorization isn't checked and the authorized
+        user's cached pages aren't invalidated: callers do that once."""
+        method = 'POST' if action == 'follow' else 'DELETE'
+        r = self._request(method, 'users/{}/follow'.format(username), params={'auth_token': self.apikey})
+        self._invalidate('users/{}'.format(username), exact=True)
+        self._invalidate('users/{}/followers'.format(username), exact=True)
+        return r
+
+    @_instrumented
     def like_wallpaper(self, wallpaper_id):
         """
         .. warning::
@@ -356,6 +785,7 @@ class DesktopprAPI:
         """
         return self.__update_like(wallpaper_id, 'like')
 
+    @_instrumented
     def unlike_wallpaper(self, wallpaper_id):
         """
         Unlikes a wallpaper.
@@ -380,24 +810,22 @@ class DesktopprAPI:
         if action != 'like' and action != 'unlike':
             self.logger.info('Internal error: Bad command for _update_like: {}'.format(action))
             return None
-        if not self.apikey:
-            self.logger.info(
-                'ERROR: This is a user command. You must first authenticate as a user with authorize_user_pass() or authorize_API() method.')
+        if not self._check_auth():
             return None
-        requesturl = '{}user/wallpapers/{}/like'.format(self.baseurl, wallpaper_id)
-        auth = {'auth_token': self.apikey}
-        r = None
-        if action == 'like':
-            r = requests.post(requesturl, params=auth, headers={'Connection': 'close'})
-        else:
-            r = requests.delete(requesturl, params=auth, headers={'Connection': 'close'})
-        if action == 'like' and (r.status_code == 200 or r.status_code == 422): #422 means its already synced
-            return True
-        else:
-            if action == 'unlike' and (r.status_code == 200 or r.status_code == 404): #unsync checks against your dropbox folder. If it 404's, the file is already unsynced.
-                return True
-        return False
-
+        r = self._like_request(wallpaper_id, action)
+        self._invalidate('users/{}/likes'.format(self.authed_user), exact=True)
+        return self._like_result(r, action)
+
+    def _like_request(self, wallpaper_id, action):
+        """Internal method that sends one like/unlike request and updates the membership index if it worked.
+        Authorization isn't checked and the cache isn't invalidated: callers do that once."""
+        method = 'POST' if action == 'like' else 'DELETE'
+        r = self._request(method, 'user/wallpapers/{}/like'.format(wallpaper_id), params={'auth_token': self.apikey})
+        if self._like_result(r, action):
+            self._update_membership('likes', wallpaper_id, action == 'like')
+        return r
+
+    @_instrumented
     def check_if_liked(self, username, wallpaper_id):
         """Checks if a user has liked a wallpaper.
 
@@ -412,18 +840,10 @@ class DesktopprAPI:
 
         """
         query = {'wallpaper_id': wallpaper_id}
-        r = requests.get('{}users/{}/likes'.format(self.baseurl, username), params=query,
-                         headers={'Connection': 'close'})
-        if r.status_code != 200:
-            self.logger.info('Error retrieving liked status:{}'.format(r.status_code))
-            return None
-        liked = r.json()['response']
-        #If the response content is empty, then the user doesn't like the wallpaper.
-        if liked:
-            return True
-        else:
-            return False
+        r = self._request('GET', 'users/{}/likes'.format(username), params=query)
+        return self._check_if_liked_result(r)
 
+    @_instrumented
     def get_userlikes(self, username, page=1):
         """Gets a list of wallpapers that a user likes.
 
@@ -436,13 +856,10 @@ class DesktopprAPI:
         """
 
         query = {'page': page}
-        r = requests.get('{}users/{}/likes'.format(self.baseurl, username), params=query,
-                         headers={'Connection': 'close'})
-        if r.status_code != 200:
-            self.logger.info('Error retrieving liked status:{}'.format(r.status_code))
-            return None
-        return Page('wallpapers', r.json())
+        r = self._request('GET', 'users/{}/likes'.format(username), params=query)
+        return self._userlikes_result(r)
 
+    @_instrumented
     def sync_wallpaper(self, wallpaper_id):
         """
         Informs the server that it should start a sync of a wallpaper to a user's DropBox.
@@ -461,6 +878,7 @@ class DesktopprAPI:
         """
         return self.__update_sync(wallpaper_id, 'sync')
 
+    @_instrumented
     def unsync_wallpaper(self, wallpaper_id):
         """
         Informs the server that it should remove a wallpaper from a user's DropBox.
@@ -484,25 +902,25 @@ class DesktopprAPI:
         if action != 'sync' and action != 'unsync':
             self.logger.info('Internal error: Bad command for _update_sync: {}'.format(action))
             return None
-        if not self.apikey:
-            self.logger.info(
-                'ERROR: This is a user command. You must first authenticate as a user with authorize_user_pass() \
-                 or authorize_API() method.')
+        if not self._check_auth():
             return None
-        requesturl = '{}user/wallpapers/{}/selection'.format(self.baseurl, wallpaper_id)
-        auth = {'auth_token': self.apikey}
-        r = None
-        if action == 'sync':
-            r = requests.post(requesturl, params=auth, headers={'Connection': 'close'})
-        else:
-            r = requests.delete(requesturl, params=auth, headers={'Connection': 'close'})
-        if action == 'sync' and (r.status_code == 200 or r.status_code == 422): #422 means its already synced
-            return True
-        else:
-            if action == 'unsync' and (r.status_code == 200 or r.status_code == 404): #unsync checks against your dropbox folder. If it 404's, the file is already unsynced.
-                return True
-        return False
-
+        r = self._sync_request(wallpaper_id, action)
+        #The collection and its count on the profile change; likes and follows don't.
+        self._invalidate('users/{}'.format(self.authed_user), exact=True)
+        self._invalidate('users/{}/wallpapers'.format(self.authed_user), exact=True)
+        return self._sync_result(r, action)
+
+    def _sync_request(self, wallpaper_id, action):
+        """Internal method that sends one sync/unsync request and updates the membership index if it worked.
+        Authorization isn't checked and the cache isn't invalidated: callers do that once."""
+        method = 'POST' if action == 'sync' else 'DELETE'
+        r = self._request(method, 'user/wallpapers/{}/selection'.format(wallpaper_id),
+                          params={'auth_token': self.apikey})
+        if self._sync_result(r, action):
+            self._update_membership('wallpapers', wallpaper_id, action == 'sync')
+        return r
+
+    @_instrumented
     def check_if_synced(self, username, wallpaper_id):
         """
         Checks if a user has a wallpaper currently synced to their personal DropBox.
@@ -520,21 +938,10 @@ class DesktopprAPI:
 
         """
         query = {'wallpaper_id': wallpaper_id}
-        r = requests.get('{}users/{}/wallpapers'.format(self.baseurl, username), params=query,
-                         headers={'Connection': 'close'})
-        if r.status_code != 200:
-            #A logging message will go here.
-            self.logger.info('Error checking for synced wallpaper: {}'.format(r.status_code))
-            return None
-        try:
-            synced = r.json()['count']
-            if synced > 0:
-                return True
-            else:
-                return False
-        except:
-            return None
+        r = self._request('GET', 'users/{}/wallpapers'.format(username), params=query)
+        return self._check_if_synced_result(r)
 
+    @_instrumented
     def flag_wallpaper(self, wallpaper_id, flag):
         """Flags a wallpaper for filtering on the site.
 
@@ -552,27 +959,829 @@ class DesktopprAPI:
             * **False** -- if the Wallpaper was not successfully flagged.
 
         """
-        if flag != 'flag_safe' and flag != 'flag_not_safe' and flag != 'flag_deletion':
-            self.logger.info('ERROR: Flag must be flag_safe, flag_not_safe, or flag_deletion')
+        if not self._check_flag(flag):
             return None
-        if not self.apikey:
-            self.logger.info(
-                'ERROR: This is a user command. You must first authenticate as a user with authorize_user_pass() \
-                or authorize_API() method.')
+        if not self._check_auth():
             return None
-        requesturl = '{}wallpapers/{}/{}'.format(self.baseurl, wallpaper_id, flag)
-        r = requests.post(requesturl, params={'auth_token': self.apikey}, headers={'Connection': 'close'})
-        if r.status_code == 200:
-            return True
-        else:
-            return False
+        r = self._request('POST', 'wallpapers/{}/{}'.format(wallpaper_id, flag), params={'auth_token': self.apikey})
+        return self._flag_result(r)
+
+    def like_wallpapers(self, wallpaper_ids, workers=4):
+        """Likes many wallpapers, several at a time.
+
+        .. warning::
+            This is a privileged method. You must authorize with :func:`authorize_user_pass` or :func:`authorize_API`
+            before you can use it.
+
+        :param wallpaper_ids: Wallpapers to like.
+        :type wallpaper_ids: iterable
+        :param workers: *Optional*, number of requests sent at the same time. Defaults to **4**.
+        :type workers: int
+        :returns: * **None** -- if the you haven't authorized against the server yet.
+            * :class:`BulkReport` -- with one :class:`BulkResult` per wallpaper: **ok**, **already** (it was \
+            already liked) or **failed**.
+        """
+        return self._bulk(wallpaper_ids, lambda wallpaper_id: self._like_request(wallpaper_id, 'like'),
+                          _BULK_OUTCOMES['like'], workers, [('users/{}/likes', True)])
+
+    def unlike_wallpapers(self, wallpaper_ids, workers=4):
+        """Unlikes many wallpapers, several at a time. See :meth:`like_wallpapers`; **already** means the
+        wallpaper wasn't liked."""
+        return self._bulk(wallpaper_ids, lambda wallpaper_id: self._like_request(wallpaper_id, 'unlike'),
+                          _BULK_OUTCOMES['unlike'], workers, [('users/{}/likes', True)])
+
+    def sync_wallpapers(self, wallpaper_ids, workers=4):
+        """Syncs many wallpapers to the authorized user's DropBox, several at a time. See :meth:`like_wallpapers`;
+        **already** means the wallpaper was already synced."""
+        return self._bulk(wallpaper_ids, lambda wallpaper_id: self._sync_request(wallpaper_id, 'sync'),
+                          _BULK_OUTCOMES['sync'], workers, [('users/{}', True), ('users/{}/wallpapers', True)])
+
+    def unsync_wallpapers(self, wallpaper_ids, workers=4):
+        """Removes many wallpapers from the authorized user's DropBox, several at a time. See
+        :meth:`like_wallpapers`; **already** means the wallpaper wasn't in the DropBox."""
+        return self._bulk(wallpaper_ids, lambda wallpaper_id: self._sync_request(wallpaper_id, 'unsync'),
+                          _BULK_OUTCOMES['unsync'], workers, [('users/{}', True), ('users/{}/wallpapers', True)])
+
+    def follow_users(self, usernames, workers=4):
+        """Follows many users, several at a time. See :meth:`like_wallpapers`. The server doesn't tell whether a
+        user was already followed, so every success is **ok**."""
+        return self._bulk(usernames, lambda username: self._follow_request(username, 'follow'),
+                          _BULK_OUTCOMES['follow'], workers,
+                          [('users/{}', True), ('users/{}/following', True)])
+
+    def unfollow_users(self, usernames, workers=4):
+        """Unfollows many users, several at a time. See :meth:`follow_users`."""
+        return self._bulk(usernames, lambda username: self._follow_request(username, 'unfollow'),
+                          _BULK_OUTCOMES['unfollow'], workers,
+                          [('users/{}', True), ('users/{}/following', True)])
+
+    def flag_wallpapers(self, wallpaper_ids, flag, workers=4):
+        """Places the same flag on many wallpapers, several at a time. See :meth:`like_wallpapers`.
+
+        :param flag: Flag to place on the wallpapers: **flag_safe**, **flag_not_safe** or **flag_deletion**.
+        :type flag: str
+        :returns: **None** if you haven't authorized yet or the flag is invalid, otherwise a :class:`BulkReport`.
+        """
+        if not self._check_flag(flag):
+            return None
+
+        def send(wallpaper_id):
+            return self._request('POST', 'wallpapers/{}/{}'.format(wallpaper_id, flag),
+                                 params={'auth_token': self.apikey})
+
+        return self._bulk(wallpaper_ids, send, _BULK_OUTCOMES['flag'], workers, ())
+
+    def _bulk(self, items, send, outcomes, workers, invalidate):
+        """Internal method that sends one mutating request per item on a thread pool, after checking authorization
+        once. *invalidate* lists the ``(path template, exact)`` pairs of the authorized user's cached pages to drop
+        once at the end, instead of after every item."""
+        if not self._check_auth():
+            return None
+        report = BulkReport()
+
+        def one(item):
+            try:
+                r = send(item)
+            except Exception as e:
+                self.logger.info('Error updating {}: {}'.format(item, e))
+                return BulkResult(item, 'failed', error=e)
+            return BulkResult(item, outcomes.get(r.status_code, 'failed'), r.status_code)
+
+        from concurrent.futures import ThreadPoolExecutor
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                report.results.extend(executor.map(one, items))
+        finally:
+            for path, exact in invalidate:
+                self._invalidate(path.format(self.authed_user), exact)
+            report.elapsed = time.monotonic() - report._started
+        return report
+
+    def check_liked_many(self, username, wallpaper_ids, workers=4):
+        """Checks which of many wallpapers a user has liked, using as few requests as possible.
+
+        The first page of the user's likes is always fetched. If the rest of them span no more pages than there are
+        wallpapers left to check, every page of likes is fetched once and kept as an index of liked ids, so this and
+        later calls for the same user are answered locally. Otherwise each wallpaper that wasn't on the first page
+        is checked with :meth:`check_if_liked`. Likes and unlikes made through this object are applied to the index
+        of the authorized user; the indexes of other users are rebuilt once they are older than the
+        ``membership_ttl`` given to the constructor.
+
+        :param username: Username to check likes for.
+        :type username: str
+        :param wallpaper_ids: Wallpapers to check.
+        :type wallpaper_ids: iterable of int
+        :param workers: *Optional*, number of requests sent at the same time. Defaults to **4**.
+        :type workers: int
+
+        :returns: dict mapping each wallpaper id to **True** (liked), **False** (not liked) or **None** (an error \
+            occurred).
+        """
+        return self._check_many('likes', username, wallpaper_ids, self.check_if_liked, workers)
+
+    def check_synced_many(self, username, wallpaper_ids, workers=4):
+        """Checks which of many wallpapers a user has synced to their DropBox, choosing between per-wallpaper \
+        :meth:`check_if_synced` requests and an index of the user's collection the same way as \
+        :meth:`check_liked_many`.
+
+        :returns: dict mapping each wallpaper id to **True**, **False** or **None** (an error occurred).
+        """
+        return self._check_many('wallpapers', username, wallpaper_ids, self.check_if_synced, workers)
+
+    def forget_membership(self, username=None):
+        """Drops the like/sync indexes built by :meth:`check_liked_many` and :meth:`check_synced_many`, so the next
+        check fetches fresh data.
+
+        :param username: *Optional*, only drop the indexes of this user. Defaults to **None** (every user).
+        :type username: str
+        """
+        with self._membership_lock:
+            for key in list(self._membership):
+                if username is None or key[1] == username:
+                    del self._membership[key]
+
+    def _check_many(self, kind, username, wallpaper_ids, check_one, workers):
+        """Internal method behind :meth:`check_liked_many` and :meth:`check_synced_many`. *kind* is the path the
+        user's ids are listed under: **likes** or **wallpapers**."""
+        wallpaper_ids = list(dict.fromkeys(wallpaper_ids))
+        #Only full indexes are kept in _membership.
+        complete = True
+        with self._membership_lock:
+            index, built = self._membership.get((kind, username), (None, None))
+            if index is not None and username != self.authed_user and \
+                    time.monotonic() - built >= self.membership_ttl:
+                del self._membership[(kind, username)]
+                index = None
+        if index is None:
+            index, complete = (self._build_membership(kind, username, wallpaper_ids, workers)
+                               if len(wallpaper_ids) > 1 else (None, False))
+        if complete:
+            return {wallpaper_id: _as_id(wallpaper_id) in index for wallpaper_id in wallpaper_ids}
+        #Page 1 was fetched anyway, so only the ids that weren't on it are asked about one at a time.
+        known = index or set()
+        results = {wallpaper_id: True for wallpaper_id in wallpaper_ids if _as_id(wallpaper_id) in known}
+        remaining = [wallpaper_id for wallpaper_id in wallpaper_ids if wallpaper_id not in results]
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results.update(zip(remaining, executor.map(check_one, [username] * len(remaining), remaining)))
+        return {wallpaper_id: results[wallpaper_id] for wallpaper_id in wallpaper_ids}
+
+    def _build_membership(self, kind, username, wallpaper_ids, workers):
+        """Internal method that fetches page 1 of a user's liked or synced ids, then builds the index from the other
+        pages if there are no more of them than single lookups still needed for *wallpaper_ids*. Returns an
+        ``(ids, complete)`` tuple: the index and **True**, the ids on page 1 and **False** if the index would cost
+        more, or **None** and **False** if page 1 could not be fetched."""
+        fetch = lambda page: self._membership_page(kind, username, page)
+        first = fetch(1)
+        if first is None:
+            return None, False
+        on_first = set(wallpaper.id for wallpaper in first.wallpapers)
+        checks = sum(1 for wallpaper_id in wallpaper_ids if _as_id(wallpaper_id) not in on_first)
+        if (first.pages_count or 1) - 1 > checks:
+            return on_first, False
+        try:
+            index = set(wallpaper.id for wallpaper in self._fetch_all_pages(fetch, 'wallpapers', workers, 2, 0.5,
+                                                                             first=first))
+        except PageFetchError as e:
+            self.logger.info('Could not build index of {} for {}: {}'.format(kind, username, e))
+            return None, False
+        with self._membership_lock:
+            self._membership[(kind, username)] = (index, time.monotonic())
+        return index, True
+
+    @_instrumented
+    def get_list_page(self, username, kind='collection', page=1, revalidate=False):
+        """Gets a page of a user's collection or likes, for code that walks the whole list. Unlike
+        :meth:`get_user_collection` and :meth:`get_userlikes`, an empty list is returned as an empty :class:`Page`,
+        so None always means an error.
+
+        :param username: User whose list should be read.
+        :type username: str
+        :param kind: *Optional*, **collection** (synced wallpapers) or **likes**. Defaults to **collection**.
+        :type kind: str
+        :param page: *Optional*, the page number to return. Defaults to **page 1**.
+        :type page: int
+        :param revalidate: *Optional*, if **True**, a copy of the page in :attr:`cache` is checked with the server even
+            while it is fresh. An unchanged page costs a ``304 Not Modified`` answer without a body. Defaults to
+            **False**.
+        :type revalidate: bool
+        :returns: * **None** -- if a bad kind is passed or an error occurs (not a user, etc).
+            * :class:`Page` object -- if successful, with the wallpapers in its wallpapers attribute.
+        """
+        if kind not in _LIST_PATHS:
+            self.logger.info('Unknown kind: {}. Valid options are {}'.format(kind, ', '.join(_LIST_PATHS)))
+            return None
+        return self._membership_page(_LIST_PATHS[kind], username, page, revalidate)
 
+    def _membership_page(self, kind, username, page, revalidate=False):
+        """Internal method behind :meth:`get_list_page`. *kind* is the path the list is served under: **likes** or
+        **wallpapers**."""
+        r = self._request('GET', 'users/{}/{}'.format(username, kind), revalidate=revalidate, params={'page': page})
+        if r.status_code != 200:
+            self.logger.info('Error retrieving {} of {}: {}'.format(kind, username, r.status_code))
+            return None
+        return Page('wallpapers', r.json(), self.lazy_pages)
+
+    def _update_membership(self, kind, wallpaper_id, member):
+        """Internal method that applies a successful like/unlike or sync/unsync to the authorized user's index."""
+        with self._membership_lock:
+            index = self._membership.get((kind, self.authed_user), (None,))[0]
+            if index is not None:
+                if member:
+                    index.add(_as_id(wallpaper_id))
+                else:
+                    index.discard(_as_id(wallpaper_id))
+
+    def iter_user_collection(self, username, start_page=1, max_items=None, prefetch=True):
+        """Iterates over every wallpaper in a user's collection, following the pages for you.
+
+        :param username: User whose collection should be walked.
+        :type username: str
+        :param start_page: *Optional*, page to start from. Defaults to **page 1**.
+        :type start_page: int
+        :param max_items: *Optional*, stop after this many wallpapers. Defaults to **None** (no limit).
+        :type max_items: int
+        :param prefetch: *Optional*, if **True**, the next page is requested in the background while the current \
+            one is being consumed. Defaults to **True**.
+        :type prefetch: bool
+        :returns: generator of :class:`Wallpaper` objects. It yields nothing if the user has no wallpapers or an \
+            error occurs on the first page.
+        :raises PageFetchError: if a later page still fails after 2 retries, so a walk never ends early without \
+            saying so.
+        """
+        return self._iter_pages(lambda page: self.get_user_collection(username, page), 'wallpapers',
+                                start_page, max_items, prefetch)
+
+    def iter_userlikes(self, username, start_page=1, max_items=None, prefetch=True):
+        """Iterates over every wallpaper a user likes. Takes the same arguments as :meth:`iter_user_collection`.
+
+        :returns: generator of :class:`Wallpaper` objects.
+        """
+        return self._iter_pages(lambda page: self.get_userlikes(username, page), 'wallpapers',
+                                start_page, max_items, prefetch)
+
+    def iter_wallpapers(self, safefilter='safe', start_page=1, max_items=None, prefetch=True):
+        """Iterates over the site's wallpapers. Takes the same arguments as :meth:`iter_user_collection`, with \
+        the safefilter of :meth:`get_wallpapers` in place of the username.
+
+        :returns: generator of :class:`Wallpaper` objects. It yields nothing if a bad safefilter is passed.
+        """
+        return self._iter_pages(lambda page: self._get_wallpapers_page(page, safefilter), 'wallpapers',
+                                start_page, max_items, prefetch)
 
-class Page:
+    def iter_user_followers(self, username, start_page=1, max_items=None, prefetch=True):
+        """Iterates over every user following a user. Takes the same arguments as :meth:`iter_user_collection`.
+
+        :returns: generator of :class:`User` objects.
+        """
+        return self._iter_pages(lambda page: self.get_user_followers(username, page), 'users',
+                                start_page, max_items, prefetch)
+
+    def iter_followed_users(self, username, start_page=1, max_items=None, prefetch=True):
+        """Iterates over every user a user follows. Takes the same arguments as :meth:`iter_user_collection`.
+
+        :returns: generator of :class:`User` objects.
+        """
+        return self._iter_pages(lambda page: self.get_followed_users(username, page), 'users',
+                                start_page, max_items, prefetch)
+
+    def fetch_all_pages(self, endpoint, *args, workers=4, retries=2, retry_delay=0.5, stream=False, **kwargs):
+        """Fetches every page of a paginated method at once. Page 1 is requested first to learn
+        :attr:`Page.pages_count`, then pages 2 and up are requested concurrently on a thread pool.
+
+        :param endpoint: Name of the paginated method to call: **get_user_collection**, **get_userlikes**, \
+            **get_user_followers**, **get_followed_users** or **get_wallpapers**.
+        :type endpoint: str
+        :param args: Arguments for the method, except the page number (for example the username).
+        :param workers: *Optional*, number of pages requested at the same time. Defaults to **4**.
+        :type workers: int
+        :param retries: *Optional*, how many more times a failed page is requested before giving up. \
+            Defaults to **2**.
+        :type retries: int
+        :param retry_delay: *Optional*, seconds to wait before the first retry of a page. Each further retry waits \
+            twice as long. Defaults to **0.5**.
+        :type retry_delay: float
+        :param stream: *Optional*, if **True**, a generator is returned instead of a list. It yields the items as \
+            soon as their page and every page before it have arrived, and only keeps a few pages in flight.
+        :type stream: bool
+        :param kwargs: Keyword arguments for the method (for example *safefilter* for **get_wallpapers**).
+
+        :returns: list (or generator, if *stream* is set) of the :class:`Wallpaper` or :class:`User` objects of \
+            every page, in page order. It is empty if page 1 has nothing on it or the server returned an error for it.
+        :raises PageFetchError: if a page after page 1 still fails after all retries.
+        """
+        if endpoint not in self._paginated:
+            raise ValueError('{} is not a paginated method. Valid options are {}'.format(
+                endpoint, ', '.join(sorted(self._paginated))))
+        attr = self._paginated[endpoint]
+        method = self._get_wallpapers_page if endpoint == 'get_wallpapers' else getattr(self, endpoint)
+        fetch = lambda page: method(*args, page=page, **kwargs)
+        items = self._fetch_all_pages(fetch, attr, workers, retries, retry_delay)
+        return items if stream else list(items)
+
+    _paginated = {'get_user_collection': 'wallpapers', 'get_userlikes': 'wallpapers', 'get_wallpapers': 'wallpapers',
+                  'get_user_followers': 'users', 'get_followed_users': 'users'}
+
+    def _fetch_all_pages(self, fetch, attr, workers, retries, retry_delay, first=None):
+        """Internal generator behind :meth:`fetch_all_pages`. If page 1 was already fetched, it can be passed as
+        *first* so only the other pages are requested."""
+        #Page 1 is only retried on exceptions: None there can simply mean there is nothing to fetch.
+        for attempt in range(retries + 1 if first is None else 0):
+            try:
+                first = fetch(1)
+                break
+            except Exception as e:
+                if attempt == retries:
+                    raise PageFetchError(1, e)
+                time.sleep(retry_delay * 2 ** attempt)
+        if not first:
+            return
+        for item in getattr(first, attr) or []:
+            yield item
+        pages_count = first.pages_count or 1
+        first = None
+        from concurrent.futures import ThreadPoolExecutor
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            pending = collections.deque()
+            next_page = 2
+            while next_page <= pages_count or pending:
+                #Keep a bounded window in flight so streaming large walks doesn't buffer every page.
+                while next_page <= pages_count and len(pending) < workers * 2:
+                    pending.append((next_page, executor.submit(fetch, next_page)))
+                    next_page += 1
+                number, future = pending.popleft()
+                page = self._page_with_retries(fetch, number, future, retries, retry_delay)
+                for item in getattr(page, attr) or []:
+                    yield item
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _page_with_retries(self, fetch, number, future, retries, retry_delay):
+        """Internal method that returns the page a future resolves to (or fetches it, if *future* is None),
+        requesting it again on failure."""
+        error = None
+        for attempt in range(retries + 1):
+            try:
+                page = future.result() if attempt == 0 and future is not None else fetch(number)
+                if page:
+                    return page
+                error = None
+            except Exception as e:
+                error = e
+            if attempt < retries:
+                self.logger.info('Retrying page {} ({} of {})'.format(number, attempt + 1, retries))
+                time.sleep(retry_delay * 2 ** attempt)
+        raise PageFetchError(number, error)
+
+    def _iter_pages(self, fetch, attr, start_page, max_items, prefetch, retries=2, retry_delay=0.5):
+        """Internal generator behind the ``iter_*`` methods. *fetch* is called with a page number and returns a
+        :class:`Page` or None. Only the page being consumed and the one being prefetched are held in memory. Pages
+        after *start_page* are retried like those of :meth:`fetch_all_pages`."""
+        if max_items is not None and max_items <= 0:
+            return
+        from concurrent.futures import ThreadPoolExecutor
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        upcoming = None
+        try:
+            yielded = 0
+            page = fetch(start_page)
+            while page:
+                items = getattr(page, attr) or []
+                upcoming = None
+                if page.next_page and (max_items is None or yielded + len(items) < max_items):
+                    if executor:
+                        upcoming = executor.submit(fetch, page.next_page)
+                for item in items:
+                    yield item
+                    yielded += 1
+                    if max_items is not None and yielded >= max_items:
+                        return
+                if not page.next_page or not items:
+                    return
+                page = self._page_with_retries(fetch, page.next_page, upcoming, retries, retry_delay)
+        finally:
+            if executor:
+                #The caller stopped early: don't fetch a page nobody will read.
+                if upcoming is not None:
+                    upcoming.cancel()
+                executor.shutdown(wait=False)
+
+    def download_wallpapers(self, wallpapers, dest, variant='full', workers=4, **kwargs):
+        """Downloads the images of many wallpapers into a folder over this object's connection pool. See
+        :func:`DesktopprDownload.download_wallpapers` for the arguments.
+
+        :returns: :class:`DesktopprDownload.DownloadReport` of the run.
+        """
+        from DesktopprDownload import download_wallpapers
+        return download_wallpapers(wallpapers, dest, variant, workers, session=self.session, **kwargs)
+
+
+def _as_id(wallpaper_id):
+    """Normalizes a wallpaper id given as a string to the int the server returns."""
+    try:
+        return int(wallpaper_id)
+    except (TypeError, ValueError):
+        return wallpaper_id
+
+
+def _endpoint_template(path):
+    """Turns an API path into the endpoint it belongs to, e.g. ``users/keithpitt/likes`` into ``users/{}/likes``."""
+    segments = path.split('/')
+    if segments[0] == 'users' and len(segments) > 1:
+        segments[1] = '{}'
+    return '/'.join('{}' if segment.isdigit() else segment for segment in segments)
+
+
+class DesktopprError(Exception):
+    """Base class for errors raised by this wrapper."""
+
+
+class PageFetchError(DesktopprError):
+    """Raised when a page could not be retrieved, even after retrying it."""
+
+    def __init__(self, page, cause=None):
+        self.page = page
+        """Number of the page that failed."""
+
+        self.cause = cause
+        """The exception raised by the last attempt, or None if the server just returned an error status."""
+
+        super().__init__('Could not retrieve page {}{}'.format(page, ': {}'.format(cause) if cause else ''))
+
+
+_BULK_OUTCOMES = {
+    'like': {200: 'ok', 422: 'already'},
+    'unlike': {200: 'ok', 404: 'already'},
+    'sync': {200: 'ok', 422: 'already'},
+    'unsync': {200: 'ok', 404: 'already'},
+    'follow': {200: 'ok'},
+    'unfollow': {200: 'ok'},
+    'flag': {200: 'ok'},
+}
+"""Outcome of each response status, per bulk action. Any other status is a failure."""
+
+
+class BulkResult:
+    """Outcome of one item of a bulk call such as :meth:`DesktopprAPI.sync_wallpapers`."""
+    __slots__ = ('item', 'status', 'status_code', 'error')
+
+    def __init__(self, item, status, status_code=None, error=None):
+        self.item = item
+        """The wallpaper id or username."""
+
+        self.status = status
+        """**ok**, **already** (nothing to change) or **failed**."""
+
+        self.status_code = status_code
+        """HTTP status of the response, or None if no response was received."""
+
+        self.error = error
+        """Exception raised while sending the request, or None."""
+
+    def __repr__(self):
+        return '<BulkResult {} {} ({})>'.format(self.item, self.status, self.status_code or self.error)
+
+
+class BulkReport:
+    """Per-item results of a bulk call, in the order the items were given."""
+
+    def __init__(self):
+        self.results = []
+        """:class:`BulkResult` objects, one per item."""
+
+        self.elapsed = 0.0
+        """Seconds the call took."""
+
+        self._started = time.monotonic()
+
+    def __len__(self):
+        return len(self.results)
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def _with(self, status):
+        return [result for result in self.results if result.status == status]
+
+    @property
+    def ok(self):
+        """Results of the items that were changed."""
+        return self._with('ok')
+
+    @property
+    def already(self):
+        """Results of the items that were already in the requested state."""
+        return self._with('already')
+
+    @property
+    def failed(self):
+        """Results of the items that could not be changed."""
+        return self._with('failed')
+
+    def __str__(self):
+        return '{} items in {:.2f}s: {} ok, {} already, {} failed'.format(
+            len(self.results), self.elapsed, len(self.ok), len(self.already), len(self.failed))
+
+
+class RateLimitedError(DesktopprError):
+    """Raised when the server kept throttling a request (429 or 503) after every retry allowed by the
+    :class:`DesktopprRateLimit.RateLimiter`. Without a limiter, throttled requests aren't retried and the methods
+    report them as failures like any other error status."""
+
+    def __init__(self, path, status_code, retry_after=None):
+        self.path = path
+        """API path of the request."""
+
+        self.status_code = status_code
+        """Status of the last response: 429 or 503."""
+
+        self.retry_after = retry_after
+        """The last response's ``Retry-After`` header, or None."""
+
+        super().__init__('Throttled by the server ({}) on {}'.format(status_code, path))
+
+
+class CircuitOpenError(DesktopprError):
+    """Raised instead of sending a request while the :class:`DesktopprRetry.CircuitBreaker` is open."""
+
+    def __init__(self, path, retry_in=0.0):
+        self.path = path
+        """API path of the request."""
+
+        self.retry_in = retry_in
+        """Seconds until the breaker lets probe requests through again."""
+
+        super().__init__('Circuit open, not sending {} (retry in {:.1f}s)'.format(path, retry_in))
+
+
+class _Response:
+    """A response whose body has been read in full. It has the same attribute names as :class:`requests.Response`
+    for what the ``_*_result`` methods read, and its :meth:`json` decodes the raw bytes once, with the decoder set by
+    :func:`set_json_decoder`."""
+    __slots__ = ('status_code', 'url', 'headers', 'content', '_json', '_record')
+
+    def __init__(self, status_code, url, headers, content):
+        self.status_code = status_code
+        self.url = url
+        self.headers = headers
+        self.content = content
+        self._json = _UNDECODED
+        self._record = None
+
+    def json(self):
+        if self._json is _UNDECODED:
+            if self._record is None:
+                self._json = _decode_json(self.content)
+            else:
+                started = time.perf_counter()
+                self._json = _decode_json(self.content)
+                self._record.decode += time.perf_counter() - started
+        return self._json
+
+
+class RequestRecord:
+    """
+    Measurements of one API request, passed to the listeners registered with
+    :meth:`DesktopprAPI.add_listener`. Times are in seconds. For a request that was retried, the network times add
+    up every attempt.
+    """
+    __slots__ = ('method', 'endpoint', 'status', 'cached', 'retries', 'bytes', 'connect', 'ttfb', 'body', 'decode',
+                 'build', 'total', 'error', '_started', '_returned')
+
+    phases = ('connect', 'ttfb', 'body', 'decode', 'build')
+    """The parts :attr:`total` is split into."""
+
+    def __init__(self, method, endpoint):
+        self.method = method
+        """HTTP method."""
+
+        self.endpoint = endpoint
+        """Endpoint template, such as ``users/{}/likes``: the path with usernames and ids replaced by ``{}``."""
+
+        self.status = None
+        """HTTP status of the response, or None if no response was received."""
+
+        self.cached = False
+        """True if the response was served from the cache without contacting the server."""
+
+        self.retries = 0
+        """Times the request was sent again after a throttling status, a network error or a 5xx status."""
+
+        self.bytes = 0
+        """Bytes of response body received over the network."""
+
+        self.connect = 0.0
+        """Time spent opening new connections (0 when a pooled connection was reused)."""
+
+        self.ttfb = 0.0
+        """Time from sending the request until its response headers arrived, not counting :attr:`connect`."""
+
+        self.body = 0.0
+        """Time spent reading the response body."""
+
+        self.decode = 0.0
+        """Time spent decoding the json body."""
+
+        self.build = 0.0
+        """Time spent building the returned objects (:class:`Page`, :class:`Wallpaper`...) from the decoded json."""
+
+        self.total = 0.0
+        """Time from the start of the request until the method that sent it had its result ready."""
+
+        self.error = None
+        """Exception that ended the request, or None."""
+
+        self._started = time.perf_counter()
+        self._returned = None
+
+    def _finish(self, finished):
+        self.build = max(finished - self._returned - self.decode, 0.0)
+        self.total = finished - self._started
+
+    def __repr__(self):
+        return '<RequestRecord {} {} {} {:.1f}ms>'.format(self.method, self.endpoint, self.status, self.total * 1e3)
+
+
+_UNDECODED = object()
+_json_decoder = None
+
+
+def set_json_decoder(decoder):
+    """Sets the function used to decode every response body. By default `orjson <https://github.com/ijl/orjson>`_ is
+    used if it is installed, and the standard library's :func:`json.loads` otherwise.
+
+    :param decoder: Function taking the raw body as bytes and returning the decoded object, or None to go back to \
+        the default.
+    :type decoder: callable
+    """
+    global _json_decoder
+    _json_decoder = decoder
+
+
+def _decode_json(content):
+    global _json_decoder
+    if _json_decoder is None:
+        try:
+            import orjson
+            _json_decoder = orjson.loads
+        except ImportError:
+            import json
+            _json_decoder = json.loads
+    return _json_decoder(content)
+
+
+@functools.lru_cache(maxsize=None)
+def _pooled_adapter_class():
+    """Defines the transport classes the first time a session is created and returns the adapter class. They
+    subclass requests and urllib3 classes, so defining them at import time would import both."""
+    from requests.adapters import HTTPAdapter
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class _TimedHTTPConnection(HTTPConnection):
+        """Connection that adds the time its connect (DNS lookup, TCP and TLS handshakes) took to the calling
+        thread's total, for :attr:`RequestRecord.connect`."""
+
+        def connect(self):
+            started = time.perf_counter()
+            try:
+                super().connect()
+            finally:
+                _connects.seconds = getattr(_connects, 'seconds', 0.0) + time.perf_counter() - started
+
+    class _TimedHTTPSConnection(HTTPSConnection):
+        """HTTPS version of :class:`_TimedHTTPConnection`."""
+
+        def connect(self):
+            started = time.perf_counter()
+            try:
+                super().connect()
+            finally:
+                _connects.seconds = getattr(_connects, 'seconds', 0.0) + time.perf_counter() - started
+
+    class _PooledAdapter(HTTPAdapter):
+        """Transport adapter that counts how many requests were sent and how many new connections its pools had to
+        open, so reuse of keep-alive connections can be reported."""
+
+        def __init__(self, *args, **kwargs):
+            self._stats_lock = threading.Lock()
+            self.requests_sent = 0
+            self.connections_opened = 0
+            super().__init__(*args, **kwargs)
+
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            adapter = self
+
+            class _HTTPPool(HTTPConnectionPool):
+                ConnectionCls = _TimedHTTPConnection
+
+                def _new_conn(self):
+                    adapter._count('connections_opened')
+                    return super()._new_conn()
+
+            class _HTTPSPool(HTTPSConnectionPool):
+                ConnectionCls = _TimedHTTPSConnection
+
+                def _new_conn(self):
+                    adapter._count('connections_opened')
+                    return super()._new_conn()
+
+            self.poolmanager.pool_classes_by_scheme = {'http': _HTTPPool, 'https': _HTTPSPool}
+
+        def send(self, request, **kwargs):
+            self._count('requests_sent')
+            return super().send(request, **kwargs)
+
+        def _count(self, counter):
+            with self._stats_lock:
+                setattr(self, counter, getattr(self, counter) + 1)
+
+        def stats(self):
+            with self._stats_lock:
+                sent = self.requests_sent
+                opened = self.connections_opened
+            reused = max(sent - opened, 0)
+            return {'requests': sent, 'connections': opened, 'reused': reused,
+                    'reuse_ratio': reused / sent if sent else 0.0}
+
+    return _PooledAdapter
+
+
+class _Model:
+    """Base of the model classes. They use ``__slots__`` for a fixed schema, so keys the server sends that aren't part
+    of it are kept in the ``extra`` dict instead, and are still readable as attributes.
+
+    .. note::
+        Only the known nested fields (a wallpaper's ``image``, an image's ``thumb`` and ``preview``) are turned into
+        :class:`Image` objects. An unknown key whose value is a dict stays a plain dict in ``extra``; earlier versions
+        turned every dict value of a wallpaper into an :class:`Image`.
+    """
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        #Only called when normal lookup fails, so slots and methods never get here.
+        if not name.startswith('__'):
+            try:
+                extra = object.__getattribute__(self, 'extra')
+            except AttributeError:
+                extra = None
+            if extra and name in extra:
+                return extra[name]
+        raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+
+    def to_dict(self):
+        """Returns the server's json representation of this object: the fields that aren't None, nested objects as
+        dicts and the keys kept in ``extra``. :meth:`from_dict` builds an equal object from it, and it can be dumped
+        as json."""
+        info = dict(self.extra) if self.extra else {}
+        for field in self.__slots__:
+            value = getattr(self, field)
+            if value is None or field == 'extra':
+                continue
+            if isinstance(value, _Model):
+                value = value.to_dict()
+            elif isinstance(value, list):
+                value = list(value)
+            info[field] = value
+        return info
+
+    @classmethod
+    def from_dict(cls, info):
+        """Builds an object from its json representation, such as :meth:`to_dict` returns."""
+        return cls(info)
+
+
+def _extra(info, fields):
+    """Returns the keys of a json dict that aren't in a model's schema, or None if there aren't any."""
+    if fields.issuperset(info):
+        return None
+    return {key: value for key, value in info.items() if key not in fields}
+
+
+_EMPTY = {}
+
+
+class Page(_Model):
     """A page object represents a 'page' of information returned by the API when it involves paginated information.
-    It contains either a list of :class:`Wallpaper` objects or a list of :class:`User` objects."""
+    It contains either a list of :class:`Wallpaper` objects or a list of :class:`User` objects.
 
-    def __init__(self, infotype, info):
+    A lazy page keeps the server's json list instead, behind a read-only sequence that builds each object the first
+    time it is indexed and caches it. Its pagination attributes are read straight from the json, so walking pages
+    without touching their contents costs next to nothing."""
+    __slots__ = ('wallpapers', 'users', 'current_page', 'previous_page', 'next_page', 'per_page', 'pages_count',
+                 'items_on_page')
+
+    def __init__(self, infotype, info, lazy=False):
+        """
+        :param infotype: **wallpapers** or **users**, the kind of objects on this page.
+        :type infotype: str
+        :param info: Server's json representation of the page.
+        :type info: dict
+        :param lazy: *Optional*, if **True**, build the objects on this page on first access. Defaults to **False**.
+        :type lazy: bool
+        """
         self.wallpapers = None
         """List of :class:`Wallpaper` objects contained on this page. It is None if that is not what this page is \
         supposed to return."""
@@ -582,73 +1791,135 @@ class Page:
             to return."""
 
         if info:
-            self.current_page = info['pagination']['current']
+            pagination = info['pagination']
+            self.current_page = pagination['current']
             """Index of the current page this object represents."""
 
-            self.previous_page = info['pagination']['previous']
+            self.previous_page = pagination['previous']
             """ The previous page of information. It can be None if there is no previous page."""
 
-            self.next_page = info['pagination']['next']
+            self.next_page = pagination['next']
             """ The next page of information. It can be None if there is no next page."""
 
-            self.per_page = info['pagination']['per_page']
+            self.per_page = pagination['per_page']
             """How many results this page can store. It should be the same across different page numbers from the query \
             that generated this page."""
 
-            self.pages_count = info['pagination']['pages']
+            self.pages_count = pagination['pages']
             """How many total pages of information are in the query that generated this page."""
 
             self.items_on_page = info['count']
             """How many pieces of information are on this page. This corresponds to the size of the :data:`wallpapers` \
              or :data:`users` list size. """
         else:
+            self.current_page = self.previous_page = self.next_page = None
+            self.per_page = self.pages_count = self.items_on_page = None
             logging.error('ERROR: Page object should have been passed an info json string.')
         if infotype != 'users' and infotype != 'wallpapers':
             logging.error('ERROR: Page object should have been passed either users or wallpapers indicator, \
                 got: {}'.format(infotype))
 
         if infotype == 'users':
-            userlist = []
-            for user in info['response']:
-                userlist.append(User(user))
-            self.users = userlist
+            self.users = _LazyModels(User, info['response']) if lazy else [User(user) for user in info['response']]
         if infotype == 'wallpapers':
-            paperlist = []
-            for paper in info['response']:
-                paperlist.append(Wallpaper(paper))
-            self.wallpapers = paperlist
-
+            self.wallpapers = _LazyModels(Wallpaper, info['response']) if lazy else \
+                [Wallpaper(paper) for paper in info['response']]
+
+    def to_dict(self):
+        """Returns the server's json representation of this page, with its wallpapers or users as dicts."""
+        items = self.users if self.users is not None else self.wallpapers
+        return {'response': [item.to_dict() for item in items or ()], 'count': self.items_on_page,
+                'pagination': {'current': self.current_page, 'previous': self.previous_page, 'next': self.next_page,
+                               'per_page': self.per_page, 'pages': self.pages_count}}
+
+    @classmethod
+    def from_dict(cls, info, infotype='wallpapers', lazy=False):
+        """Builds a page from its json representation, such as :meth:`to_dict` returns. Takes the same arguments as
+        the constructor, with *infotype* last since a dict alone doesn't say what the page holds."""
+        return cls(infotype, info, lazy)
 
     def __str__(self):
         string = 'Page Object: '
         props = []
         for attr in dir(self):
-            if not callable(attr) and not attr.startswith('__'):
+            if not attr.startswith('__') and not callable(getattr(self, attr)):
                 props.append('{}={}'.format(attr, str(getattr(self, attr))))
         return '{}{}'.format(string, str(props))
 
 
-class Wallpaper:
+_lazy_lock = threading.Lock()
+
+
+class _LazyModels(collections.abc.Sequence):
+    """Read-only sequence over a json list that builds each model object on first access and caches it. The json
+    list is let go once every object has been built.
+
+    Pages are handed between threads, so two threads may build the same object at once. Only the first one to store
+    it is kept and counted, under a lock shared by every lazy sequence (a lock of its own would keep pages from being
+    pickled)."""
+    __slots__ = ('_model', '_raw', '_items', '_built')
+
+    def __init__(self, model, raw):
+        self._model = model
+        self._raw = raw
+        self._items = [None] * len(raw)
+        self._built = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self._items)))]
+        item = self._items[index]
+        if item is not None:
+            return item
+        raw = self._raw
+        if raw is None:
+            #Another thread built the last missing object in the meantime.
+            return self._items[index]
+        built = self._model(raw[index])
+        with _lazy_lock:
+            item = self._items[index]
+            if item is None:
+                item = self._items[index] = built
+                self._built += 1
+                if self._built == len(self._items):
+                    self._raw = None
+        return item
+
+    def __repr__(self):
+        return '<{} {} of {} built>'.format(self._model.__name__, self._built, len(self._items))
+
+    def __str__(self):
+        return str(list(self))
+
+
+class Wallpaper(_Model):
     """Defines a Wallpaper on the Desktoppr server. Contains many attributes about the image."""
+    __slots__ = ('height', 'created_at', 'image', 'url', 'uploader', 'user_count', 'likes_count', 'review_state',
+                 'bytes', 'palette', 'id', 'width', 'extra')
+    _fields = frozenset(__slots__) - {'extra'}
 
     def __init__(self, info=None):
         """Predefined wallpaper attributes. These are elements in the returned \
         json response when querying for a wallpaper."""
+        info = info or _EMPTY
 
-        #Set wallpaper defaults
-        self.height = None
+        self.height = info.get('height')
         """ Height of the full resolution image contained in the :attr:`image` attribute of this object."""
 
-        self.created_at = None
+        self.created_at = info.get('created_at')
         """Datestamp the file was uploaded."""
 
-        self.image = None
+        image = info.get('image')
+        self.image = Image(image) if image else None
         """ Image object that contains the image-file specific details, like resolution and URLs to the image."""
 
-        self.url = None
+        self.url = info.get('url')
         """URL to the Desktoppr.co page, where you can like and sync the wallpaper."""
 
-        self.uploader = None
+        self.uploader = info.get('uploader')
         """Username of uploader.
 
         .. warning::
@@ -658,48 +1929,45 @@ class Wallpaper:
 
         """
 
-        self.user_count = None
+        self.user_count = info.get('user_count')
         """I am not sure what this field means."""
 
-        self.likes_count = None
+        self.likes_count = info.get('likes_count')
         """Number of likes this wallpaper currently has."""
 
-        self.review_state = None
+        self.review_state = info.get('review_state')
         """Current flag state of this wallpaper. Values in this field should be *safe*, *pending*, or *not_safe*. """
 
-        self.bytes = None
+        self.bytes = info.get('bytes')
         """Filesize of the full resolution image contained in the :data:`image` field."""
 
-        self.palette = None
+        self.palette = info.get('palette')
         """List of colors in the palette of the image... not exactly sure what this means."""
 
-        self.id = None
-        """ID for this wallpaper. This is the same as the one when normally browsing the site, located at the end of \
+        self.id = info.get('id')
+        """ ID for this wallpaper. This is the same as the one when normally browsing the site, located at the end of \
             the URL typically."""
 
-        self.width = None
+        self.width = info.get('width')
         """Width of the full resolution image contained in the :attr:`image` attribute of this object."""
 
-        if info:
-            #We are going to parse a new wallpaper json
-            for attribute in info:
-                if isinstance(info[attribute], dict):
-                    #it's an image object.
-                    setattr(self, attribute, Image(info[attribute]))
-                    continue
-                setattr(self, attribute, info[attribute])
+        self.extra = _extra(info, self._fields)
+        """Dict of any keys the server sent that aren't listed above, or None. They can also be read as attributes."""
 
     def __str__(self):
         string = 'Wallpaper object: '
         props = []
         for attr in dir(self):
-            if not callable(attr) and not attr.startswith('__'):
+            if not attr.startswith('_') and not callable(getattr(self, attr)):
                 props.append('{}={}'.format(attr, str(getattr(self, attr))))
         return '{}{}'.format(string, str(props))
 
 
-class User:
+class User(_Model):
     """Defines a user on the site."""
+    __slots__ = ('uploaded_count', 'followers_count', 'username', 'lifetime_member', 'avatar_url', 'wallpapers_count',
+                 'created_at', 'following_count', 'name', 'extra')
+    _fields = frozenset(__slots__) - {'extra'}
 
     def __init__(self, info=None):
         """
@@ -708,51 +1976,49 @@ class User:
         :type info: dict
 
         """
+        info = info or _EMPTY
 
-        self.uploaded_count = None
+        self.uploaded_count = info.get('uploaded_count')
         """How many images the user has uploaded."""
 
-        self.followers_count = None
+        self.followers_count = info.get('followers_count')
         """The number of people following this user."""
 
-        self.username = None
+        self.username = info.get('username')
         """This user's username."""
 
-        self.lifetime_member = None
+        self.lifetime_member = info.get('lifetime_member')
         """If the user is a lifetime member or not. Unsure what this means, perhaps they helped build the site or paid \
             money."""
 
-        self.avatar_url = None
+        self.avatar_url = info.get('avatar_url')
         """The URL to their avatar image, hosted by Gravatar."""
 
-        self.wallpapers_count = None
+        self.wallpapers_count = info.get('wallpapers_count')
         """The number of wallpapers this user has in their collection."""
 
-        self.created_at = None
+        self.created_at = info.get('created_at')
         """The date this user signed up."""
 
-        self.following_count = None
+        self.following_count = info.get('following_count')
         """The number of users this user follows."""
 
-        self.name = None
+        self.name = info.get('name')
         """The user's real name. This will be None if they didn't set one."""
 
-        #If an information package was included, create this user.
-        if info:
-            for attribute in info:
-                #There are no dictionaries in the response for a user.
-                setattr(self, attribute, info[attribute])
+        self.extra = _extra(info, self._fields)
+        """Dict of any keys the server sent that aren't listed above, or None. They can also be read as attributes."""
 
     def __str__(self):
         string = 'User object: '
         props = []
         for attr in dir(self):
-            if not callable(attr) and not attr.startswith('__'):
+            if not attr.startswith('_') and not callable(getattr(self, attr)):
                 props.append('{}={}'.format(attr, str(getattr(self, attr))))
         return '{}{}'.format(string, str(props))
 
 
-class Image(object):
+class Image(_Model):
     """
     Represents an image object (a part of a wallpaper object). All values are initialized to none, but are \
     set if an image dict is passed.
@@ -763,6 +2029,8 @@ class Image(object):
     * Contains width, height, and url = **Thumbnail or Preview Image**
 
     """
+    __slots__ = ('thumb', 'preview', 'url', 'width', 'height', 'extra')
+    _fields = frozenset(__slots__) - {'extra'}
 
     def __init__(self, info=None):
         """
@@ -771,32 +2039,31 @@ class Image(object):
             so the user doesn't have to do try/catch with dictionaries.
         :type info: dict
         """
+        info = info or _EMPTY
 
-        self.thumb = None
+        #Parsing image package - it might be the top level one (full) or lower (preview/thumbnail)
+        thumb = info.get('thumb')
+        self.thumb = Image(thumb) if thumb else None
         """Thumbnail version of this image object. It is None if it is a thumbnail or a preview image."""
 
-        self.preview = None
+        preview = info.get('preview')
+        self.preview = Image(preview) if preview else None
         """Preview version of this image object. It is higher resolution than a thumbnail. It is None if it is a \
             thumbnail or a preview."""
 
-        self.url = None
+        self.url = info.get('url')
         """Direct URL to the image."""
 
-        self.width = None
+        self.width = info.get('width')
         """Width of the image. This is only supplied in the thumbnail and preview objects. The resolution of the full \
             resolution can be found in the containing :class:`Wallpaper` object. """
 
-        self.height = None
+        self.height = info.get('height')
         """Height of the image. This is only supplied in the thumbnail and preview objects. The resolution of the full \
             resolution can be found in the containing :class:`Wallpaper` object. """
 
-        if info:
-            #Parsing image package - it might be the top level one (full) or lower (preview/thumbnail)
-            for attribute in info:
-                if isinstance(info[attribute], dict):
-                    setattr(self, attribute, Image(info[attribute]))
-                    continue
-                setattr(self, attribute, info[attribute])
+        self.extra = _extra(info, self._fields)
+        """Dict of any keys the server sent that aren't listed above, or None. They can also be read as attributes."""
 
     def __str__(self):
         string = None
@@ -806,6 +2073,6 @@ class Image(object):
             string = 'Image [Full] Object: '
         props = []
         for attr in dir(self):
-            if not callable(attr) and not attr.startswith('__'):
+            if not attr.startswith('_') and not callable(getattr(self, attr)):
                 props.append('{}={}'.format(attr, str(getattr(self, attr))))
         return '{}{}'.format(string, str(props))
@@ -0,0 +1,271 @@
+"""
+.. :platform: Unix, Windows, Mac OSX
+.. :synopsis: asyncio version of the Desktoppr.co API wrapper.
+
+This module needs the optional `aiohttp <https://docs.aiohttp.org/>`_ package.
+"""
+import asyncio
+
+import aiohttp
+
+from DesktopprApi import _DesktopprBase, _Response, CircuitOpenError, RateLimitedError
+
+
+class AsyncDesktopprAPI(_DesktopprBase):
+    """
+    asyncio counterpart of :class:`DesktopprApi.DesktopprAPI`. Every public method is a coroutine with the same
+    arguments and return values as its blocking equivalent, and the responses are parsed by the same code, so the
+    returned :class:`~DesktopprApi.Page`, :class:`~DesktopprApi.Wallpaper` and :class:`~DesktopprApi.User` objects are
+    identical.
+
+    The object should be closed when you are done with it, either with :meth:`close` or by using it as an async
+    context manager::
+
+        async with AsyncDesktopprAPI(max_concurrency=50) as api:
+            pages = await asyncio.gather(*(api.get_user_collection(name) for name in usernames))
+    """
+
+    def __init__(self, max_concurrency=10, session=None, lazy_pages=False, rate_limit=None, retry=None,
+                 circuit_breaker=None, timeout=30):
+        """
+        :param max_concurrency: *Optional*, the maximum number of requests this object will have in flight at once. \
+            Extra calls wait for a free slot. Defaults to **10**.
+        :type max_concurrency: int
+        :param session: *Optional*, an existing :class:`aiohttp.ClientSession` to send requests through. If it is not \
+            given, one is created on first use and closed by :meth:`close`.
+        :type session: aiohttp.ClientSession
+        :param lazy_pages: *Optional*, if **True**, returned pages build their objects on first access. See \
+            :class:`DesktopprApi.Page`. Defaults to **False**.
+        :type lazy_pages: bool
+        :param rate_limit: *Optional*, a :class:`DesktopprRateLimit.RateLimiter` (or **True** for the process-wide \
+            one) that requests wait for without blocking the event loop. See :class:`DesktopprApi.DesktopprAPI`. \
+            Defaults to **None** (no limiting).
+        :type rate_limit: DesktopprRateLimit.RateLimiter
+        :param retry: *Optional*, a :class:`DesktopprRetry.RetryPolicy`, or **True** to retry GET requests on \
+            network errors (including :class:`aiohttp.ClientError`) and 5xx statuses. Defaults to **None**.
+        :type retry: DesktopprRetry.RetryPolicy
+        :param circuit_breaker: *Optional*, a :class:`DesktopprRetry.CircuitBreaker`, or **True** for one with the \
+            default settings. Defaults to **None**.
+        :type circuit_breaker: DesktopprRetry.CircuitBreaker
+        :param timeout: *Optional*, seconds to wait for a connection and then between two reads of a response, or a \
+            (connect, read) tuple, as in :class:`DesktopprApi.DesktopprAPI`. A request that takes longer raises \
+            :class:`asyncio.TimeoutError`, which the retry policy retries. **None** waits forever. It applies to the \
+            session this object creates; a *session* passed in keeps its own timeout. Defaults to **30**.
+        :type timeout: float
+        """
+        self.max_concurrency = max_concurrency
+        self.lazy_pages = lazy_pages
+        self.session = session
+        self._owns_session = session is None
+        self.timeout = timeout
+        self._semaphore = None
+        if rate_limit is True:
+            from DesktopprRateLimit import shared_limiter
+            rate_limit = shared_limiter()
+        self.rate_limiter = rate_limit
+        if retry is True or circuit_breaker is True:
+            from DesktopprRetry import RetryPolicy, CircuitBreaker
+            if retry is True:
+                retry = RetryPolicy(exceptions=(OSError, aiohttp.ClientError, asyncio.TimeoutError))
+            circuit_breaker = CircuitBreaker() if circuit_breaker is True else circuit_breaker
+        self.retry_policy = retry
+        self.circuit_breaker = circuit_breaker
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Closes the underlying session if this object created it."""
+        if self.session is not None and self._owns_session:
+            await self.session.close()
+            self.session = None
+
+    async def _request(self, method, path, params=None, auth=None):
+        """Internal coroutine that sends a request for an API path (relative to :attr:`baseurl`), waiting for a free
+        concurrency slot (and for :attr:`rate_limiter`, if set) first. The body is read fully before the slot is
+        released. Throttling, retries and the circuit breaker work like in :meth:`DesktopprApi.DesktopprAPI._send`."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            connect, read = self.timeout if isinstance(self.timeout, tuple) else (self.timeout, self.timeout)
+            timeout = aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        if params:
+            params = {key: str(value) for key, value in params.items()}
+        url = '{}{}'.format(self.baseurl, path)
+        limiter, policy, breaker = self.rate_limiter, self.retry_policy, self.circuit_breaker
+        throttles = retries = 0
+        while True:
+            if breaker is not None and not breaker.allow():
+                raise CircuitOpenError(path, breaker.retry_in())
+            if limiter is not None:
+                await limiter.acquire_async(limiter.kind_for(method))
+            try:
+                async with self._semaphore:
+                    async with self.session.request(method, url, params=params, auth=auth) as response:
+                        body = await response.read()
+                        r = _Response(response.status, str(response.url), response.headers, body)
+            except Exception as e:
+                if breaker is not None:
+                    breaker.record(False)
+                if policy is None or not policy.should_retry(method, retries, error=e):
+                    raise
+                await asyncio.sleep(policy.delay(retries))
+                retries += 1
+                continue
+            if breaker is not None:
+                breaker.record(r.status_code < 500)
+            if limiter is not None and r.status_code in (429, 503):
+                retry_after = r.headers.get('Retry-After')
+                if throttles >= limiter.max_retries:
+                    raise RateLimitedError(path, r.status_code, retry_after)
+                limiter.throttled(retry_after, throttles)
+                throttles += 1
+                continue
+            if policy is not None and policy.should_retry(method, retries, status=r.status_code):
+                await asyncio.sleep(policy.delay(retries))
+                retries += 1
+                continue
+            return r
+
+    async def authorize_API(self, apikey):
+        """Awaitable version of :meth:`DesktopprApi.DesktopprAPI.authorize_API`."""
+        r = await self._request('GET', 'user/whoami', params={'auth_token': apikey})
+        return self._authorize_API_result(r, apikey)
+
+    async def authorize_user_pass(self, username, password):
+        """Awaitable version of :meth:`DesktopprApi.DesktopprAPI.authorize_user_pass`."""
+        r = await self._request('GET', 'user/whoami', auth=aiohttp.BasicAuth(username, password))
+        return self._authorize_user_pass_result(r)
+
+    async def get_user_info(self, username):
+        """Awaitable version of :meth:`DesktopprApi.DesktopprAPI.get_user_info`."""
+        try:
+            r = await self._request('GET', 'users/{}'.format(username))
+        except (RateLimitedError, CircuitOpenError):
+            raise
+        except Exception as e:
+            self.logger.info('Error retrieving information for user {}: {}'.format(username, e))
+            return None
+        return self._user_info_result(r, username)
+
+    async def get_user_collection(self, username, page=1):
+        """Awaitable version of :meth:`DesktopprApi.DesktopprAPI.get_user_collection`."""
+        r = await self._request('GET', 'users/{}/wallpapers'.format(username), params={'page': page})
+        return self._user_collection_result(r)
+
+    async def get_wallpapers(self, page=1, safefilter='safe'):
+        """Awaitable version of :meth:`DesktopprApi.DesktopprAPI.get_wallpapers`."""
+        if not self._check_filter(safefilter):
+            return None
+        r = await self._request('GET', 'wallpapers', params={'page': page, 'safe_filter': safefilter})
+        return self._wallpapers_result(r)
+
+    async def get_wallpaper_urls(self, page=1, safefilter='safe'):
+        """Awaitable version of :meth:`DesktopprApi.DesktopprAPI.get_wallpaper_urls`."""
+        if not self._check_filter(safefilter):
+            return None
+        wallpapers = await self.get_wallpapers(page, safefilter)
+        urls = []
+        if wallpapers:
+            for wallpaper in wallpapers:
+                urls.append(wallpaper.image.url)
+        return urls
+
+    async def get_user_followers(self, username, page=1):
+        """Awaitable version of :meth:`DesktopprApi.DesktopprAPI.get_user_followers`."""
+        r = await self._request('GET', 'users/{}/followers'.format(username), params={'page': page})
+        return self._user_followers_result(r)
+
+    async def get_followed_users(self, username, page=1):
+        """Awaitable version of :meth:`DesktopprApi.DesktopprAPI.get_followed_users`."""
+        r = await self._request('GET', 'users/{}/following'.format(username), params={'page': page})
+        return self._followed_users_result(r)
+
+    async def get_user_randomwallpaper(self, username):
+        """Awaitable version of :meth:`DesktopprApi.DesktopprAPI.get_user_randomwallpaper`."""
+        r = await self._request('GET', 'users/{}/wallpapers/random'.format(username))
+        return self._user_randomwallpaper_result(r)
+
+    async def get_random_wallpaper(self, safefilter='safe'):
+        """Awaitable version of :meth:`DesktopprApi.DesktopprAPI.get_random_wallpaper`."""
+        if not self._check_filter(safefilter):
+            return None
+        r = await self._request('GET', 'wallpapers/random', params={'safe_filter': safefilter})
+        return self._random_wallpaper_result(r)
+
+    async def follow_user(self, username):
+        """Awaitable version of :meth:`DesktopprApi.DesktopprAPI.follow_user`."""
+        return await self._update_follow(username, 'POST')
+
+    async def unfollow_user(self, username):
+        """Awaitable version of :meth:`DesktopprApi.DesktopprAPI.unfollow_user`."""
+        return await self._update_follow(username, 'DELETE')
+
+    async def _update_follow(self, username, method):
+        if not self._check_auth():
+            return None
+        r = await self._request(method, 'users/{}/follow'.format(username), params={'auth_token': self.apikey})
+        return self._follow_result(r)
+
+    async def like_wallpaper(self, wallpaper_id):
+        """Awaitable version of :meth:`DesktopprApi.DesktopprAPI.like_wallpaper`."""
+        return await self._update_like(wallpaper_id, 'like')
+
+    async def unlike_wallpaper(self, wallpaper_id):
+        """Awaitable version of :meth:`DesktopprApi.DesktopprAPI.unlike_wallpaper`."""
+        return await self._update_like(wallpaper_id, 'unlike')
+
+    async def _update_like(self, wallpaper_id, action):
+        if not self._check_auth():
+            return None
+        method = 'POST' if action == 'like' else 'DELETE'
+        r = await self._request(method, 'user/wallpapers/{}/like'.format(wallpaper_id),
+                                params={'auth_token': self.apikey})
+        return self._like_result(r, action)
+
+    async def check_if_liked(self, username, wallpaper_id):
+        """Awaitable version of :meth:`DesktopprApi.DesktopprAPI.check_if_liked`."""
+        r = await self._request('GET', 'users/{}/likes'.format(username), params={'wallpaper_id': wallpaper_id})
+        return self._check_if_liked_result(r)
+
+    async def get_userlikes(self, username, page=1):
+        """Awaitable version of :meth:`DesktopprApi.DesktopprAPI.get_userlikes`."""
+        r = await self._request('GET', 'users/{}/likes'.format(username), params={'page': page})
+        return self._userlikes_result(r)
+
+    async def sync_wallpaper(self, wallpaper_id):
+        """Awaitable version of :meth:`DesktopprApi.DesktopprAPI.sync_wallpaper`."""
+        return await self._update_sync(wallpaper_id, 'sync')
+
+    async def unsync_wallpaper(self, wallpaper_id):
+        """Awaitable version of :meth:`DesktopprApi.DesktopprAPI.unsync_wallpaper`."""
+        return await self._update_sync(wallpaper_id, 'unsync')
+
+    async def _update_sync(self, wallpaper_id, action):
+        if not self._check_auth():
+            return None
+        method = 'POST' if action == 'sync' else 'DELETE'
+        r = await self._request(method, 'user/wallpapers/{}/selection'.format(wallpaper_id),
+                                params={'auth_token': self.apikey})
+        return self._sync_result(r, action)
+
+    async def check_if_synced(self, username, wallpaper_id):
+        """Awaitable version of :meth:`DesktopprApi.DesktopprAPI.check_if_synced`."""
+        r = await self._request('GET', 'users/{}/wallpapers'.format(username), params={'wallpaper_id': wallpaper_id})
+        return self._check_if_synced_result(r)
+
+    async def flag_wallpaper(self, wallpaper_id, flag):
+        """Awaitable version of :meth:`DesktopprApi.DesktopprAPI.flag_wallpaper`."""
+        if not self._check_flag(flag):
+            return None
+        if not self._check_auth():
+            return None
+        r = await self._request('POST', 'wallpapers/{}/{}'.format(wallpaper_id, flag),
+                                params={'auth_token': self.apikey})
+        return self._flag_result(r)
+
@@ -0,0 +1,149 @@
+"""
+.. :platform: Unix, Windows, Mac OSX
+.. :synopsis: In-memory response cache for the Desktoppr.co API wrapper.
+"""
+import collections
+import threading
+import time
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of API responses, used by :class:`DesktopprApi.DesktopprAPI` when it is created with a *cache*.
+
+    Entries are keyed by API path plus query parameters. Each endpoint has its own time to live. Once an entry
+    is stale, the next request for it is sent with ``If-None-Match``/``If-Modified-Since`` headers (if the server
+    gave an ETag or Last-Modified). A ``304 Not Modified`` answer renews the cached copy without sending the body
+    again. Only successful (200) responses are stored.
+    """
+
+    default_ttls = {
+        'users/{}': 300,
+        'users/{}/wallpapers': 60,
+        'users/{}/likes': 60,
+        'users/{}/followers': 120,
+        'users/{}/following': 120,
+        'wallpapers': 60,
+    }
+    """Seconds an entry for each endpoint stays fresh. Endpoints that aren't listed (random wallpapers, \
+    authorization, every mutating call) are never cached."""
+
+    def __init__(self, max_entries=1024, ttls=None):
+        """
+        :param max_entries: *Optional*, the largest number of responses kept. The least recently used entry is \
+            evicted when it is exceeded. Defaults to **1024**.
+        :type max_entries: int
+        :param ttls: *Optional*, dict of endpoint template (as in :attr:`default_ttls`) to seconds, overriding the \
+            defaults. A TTL of **0** turns caching off for that endpoint.
+        :type ttls: dict
+        """
+        self.max_entries = max_entries
+        self.ttls = dict(self.default_ttls)
+        if ttls:
+            self.ttls.update(ttls)
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def ttl_for(self, endpoint):
+        """Returns the time to live of an endpoint template, or 0 if it shouldn't be cached."""
+        return self.ttls.get(endpoint, 0)
+
+    @staticmethod
+    def key(path, params=None):
+        """Builds the cache key for an API path and its query parameters."""
+        if not params:
+            return (path, ())
+        return (path, tuple(sorted((name, str(value)) for name, value in params.items())))
+
+    def lookup(self, key, revalidate=False):
+        """Returns the :class:`CachedResponse` stored for *key* (fresh or stale), or None. A fresh entry counts as a
+        hit, anything else as a miss. With *revalidate*, the caller checks the entry with the server whatever its
+        age, so it always counts as a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            if entry is not None and entry.fresh() and not revalidate:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry
+
+    def store(self, key, response, ttl):
+        """Stores a response and returns the :class:`CachedResponse` built from it."""
+        entry = CachedResponse(response.status_code, response.url, response.headers, response.content,
+                               time.monotonic() + ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def renew(self, entry, ttl):
+        """Marks a stale entry the server confirmed is unchanged (304) as fresh again."""
+        with self._lock:
+            entry.expires = time.monotonic() + ttl
+            self.revalidations += 1
+        return entry
+
+    def invalidate(self, path, exact=False):
+        """Drops every entry for an API path, whatever its query parameters were.
+
+        :param path: API path, such as ``users/keithpitt/likes``.
+        :type path: str
+        :param exact: *Optional*, if **False**, entries for paths below *path* are dropped as well. \
+            Defaults to **False**.
+        :type exact: bool
+        """
+        prefix = path + '/'
+        with self._lock:
+            stale = [key for key in self._entries
+                     if key[0] == path or (not exact and key[0].startswith(prefix))]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        """Drops every entry. The counters are kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Returns the cache counters.
+
+        :returns: dict with the keys **hits**, **misses**, **revalidations** (stale entries the server confirmed \
+            with a 304), **evictions**, **invalidations** and **size** (entries currently stored).
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'revalidations': self.revalidations,
+                    'evictions': self.evictions, 'invalidations': self.invalidations, 'size': len(self._entries)}
+
+
+class CachedResponse:
+    """A stored response body with its status, headers and expiry time."""
+
+    def __init__(self, status_code, url, headers, content, expires):
+        self.status_code = status_code
+        self.url = url
+        self.headers = headers
+        self.content = content
+        self.expires = expires
+
+    def fresh(self):
+        return time.monotonic() < self.expires
+
+    def validators(self):
+        """Returns the conditional request headers for revalidating this entry."""
+        headers = {}
+        if self.headers.get('ETag'):
+            headers['If-None-Match'] = self.headers['ETag']
+        if self.headers.get('Last-Modified'):
+            headers['If-Modified-Since'] = self.headers['Last-Modified']
+        return headers
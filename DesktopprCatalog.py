@@ -0,0 +1,345 @@
+"""
+.. :platform: Unix, Windows, Mac OSX
+.. :synopsis: SQLite catalog of wallpapers, users, likes, collections and follows fetched from the API.
+"""
+import json
+import sqlite3
+import threading
+import time
+
+from DesktopprApi import Page, User, Wallpaper
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS wallpapers (
+    id INTEGER PRIMARY KEY, uploader TEXT, review_state TEXT, width INTEGER, height INTEGER, pixels INTEGER,
+    likes_count INTEGER, user_count INTEGER, bytes INTEGER, created_at TEXT, url TEXT, image TEXT, palette TEXT,
+    extra TEXT, updated REAL);
+CREATE INDEX IF NOT EXISTS wallpapers_uploader ON wallpapers (uploader);
+CREATE INDEX IF NOT EXISTS wallpapers_review_state ON wallpapers (review_state);
+CREATE INDEX IF NOT EXISTS wallpapers_resolution ON wallpapers (width, height);
+CREATE INDEX IF NOT EXISTS wallpapers_pixels ON wallpapers (pixels);
+CREATE INDEX IF NOT EXISTS wallpapers_likes_count ON wallpapers (likes_count);
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY, name TEXT, followers_count INTEGER, following_count INTEGER,
+    wallpapers_count INTEGER, uploaded_count INTEGER, lifetime_member INTEGER, avatar_url TEXT, created_at TEXT,
+    extra TEXT, updated REAL);
+CREATE TABLE IF NOT EXISTS likes (
+    username TEXT NOT NULL, wallpaper_id INTEGER NOT NULL, PRIMARY KEY (username, wallpaper_id)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS likes_wallpaper ON likes (wallpaper_id);
+CREATE TABLE IF NOT EXISTS collections (
+    username TEXT NOT NULL, wallpaper_id INTEGER NOT NULL, PRIMARY KEY (username, wallpaper_id)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS collections_wallpaper ON collections (wallpaper_id);
+CREATE TABLE IF NOT EXISTS follows (
+    follower TEXT NOT NULL, followed TEXT NOT NULL, PRIMARY KEY (follower, followed)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS follows_followed ON follows (followed, follower);
+'''
+
+_WALLPAPER_COLUMNS = ('id', 'uploader', 'review_state', 'width', 'height', 'pixels', 'likes_count', 'user_count',
+                      'bytes', 'created_at', 'url', 'image', 'palette', 'extra', 'updated')
+_USER_COLUMNS = ('username', 'name', 'followers_count', 'following_count', 'wallpapers_count', 'uploaded_count',
+                 'lifetime_member', 'avatar_url', 'created_at', 'extra', 'updated')
+
+ORDERS = {'id': 'id', 'newest': 'id DESC', 'likes': 'likes_count DESC, id', 'pixels': 'pixels DESC, id'}
+"""Orders :meth:`Catalog.wallpapers` can sort by, with the SQL they stand for."""
+
+
+def _upsert(table, columns, key, merge):
+    #Merging, a value the new object doesn't have (None) keeps the one already stored. Otherwise the new object
+    #replaces the row, so a field the server now sends as null is cleared.
+    assignment = '{0} = coalesce(excluded.{0}, {0})' if merge else '{0} = excluded.{0}'
+    return 'INSERT INTO {0} ({1}) VALUES ({2}) ON CONFLICT ({3}) DO UPDATE SET {4}'.format(
+        table, ', '.join(columns), ', '.join('?' * len(columns)), key,
+        ', '.join(assignment.format(column) for column in columns if column != key))
+
+
+_UPSERT_WALLPAPER = _upsert('wallpapers', _WALLPAPER_COLUMNS, 'id', merge=False)
+_MERGE_WALLPAPER = _upsert('wallpapers', _WALLPAPER_COLUMNS, 'id', merge=True)
+_UPSERT_USER = _upsert('users', _USER_COLUMNS, 'username', merge=False)
+_MERGE_USER = _upsert('users', _USER_COLUMNS, 'username', merge=True)
+
+
+class Catalog:
+    """
+    Local SQLite copy of what the API returned, so it can be read again at disk speed. :class:`~DesktopprApi.Page`,
+    :class:`~DesktopprApi.Wallpaper` and :class:`~DesktopprApi.User` results are written in bulk, and the query
+    methods build the same model objects back::
+
+        >>> catalog = Catalog('desktoppr.db')
+        >>> catalog.add(api.fetch_all_pages('get_wallpapers', safefilter='all'))
+        >>> catalog.add(api.get_user_followers('keithpitt'))
+        >>> catalog.wallpapers(uploader='keithpitt', min_width=1920, order='likes', limit=10)
+
+    Writes go in transactions of up to *batch_size* rows, and a row that is already stored is updated in place with
+    every field of the new object, so values the server no longer sends (such as the uploader of a wallpaper whose
+    uploader deleted their account) are cleared. Objects added with ``partial=True`` only fill in the fields they
+    have, and the others keep their stored value. Wallpapers are indexed by id, uploader, review state,
+    resolution and likes count. A catalog can be shared between threads.
+
+    :param path: *Optional*, database file. It is created if it doesn't exist. Defaults to **:memory:**.
+    :type path: str
+    :param batch_size: *Optional*, rows written per transaction. Defaults to **500**.
+    :type batch_size: int
+    """
+
+    def __init__(self, path=':memory:', batch_size=500):
+        self.path = path
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        if path != ':memory:':
+            self._db.execute('PRAGMA journal_mode = WAL')
+            self._db.execute('PRAGMA synchronous = NORMAL')
+        self._db.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Closes the database."""
+        with self._lock:
+            self._db.close()
+
+    def _write(self, sql, rows):
+        """Runs *sql* for every row, *batch_size* rows per transaction. Returns the number of rows."""
+        count = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                count += self._commit(sql, batch)
+                batch = []
+        if batch:
+            count += self._commit(sql, batch)
+        return count
+
+    def _commit(self, sql, batch):
+        with self._lock, self._db:
+            self._db.executemany(sql, batch)
+        return len(batch)
+
+    def add(self, *results, partial=False):
+        """Stores any mix of pages, wallpapers and users, and lists of them.
+
+        :param partial: *Optional*, if **True**, the objects only hold some fields, and fields they leave empty keep \
+            their stored value. Defaults to **False**: the objects are complete, as the API returns them.
+        :type partial: bool
+        :returns: the number of wallpapers and users written.
+        """
+        wallpapers, users = [], []
+        for result in results:
+            if isinstance(result, Page):
+                items = result.wallpapers or result.users or ()
+            elif isinstance(result, (Wallpaper, User)):
+                items = (result,)
+            else:
+                items = result
+            for item in items:
+                (wallpapers if isinstance(item, Wallpaper) else users).append(item)
+        return self.add_wallpapers(wallpapers, partial) + self.add_users(users, partial)
+
+    def add_wallpapers(self, wallpapers, partial=False):
+        """Stores :class:`~DesktopprApi.Wallpaper` objects. *partial* works as in :meth:`add`.
+
+        :returns: the number written.
+        """
+        now = time.time()
+        return self._write(_MERGE_WALLPAPER if partial else _UPSERT_WALLPAPER,
+                           (_wallpaper_row(wallpaper, now) for wallpaper in wallpapers))
+
+    def add_users(self, users, partial=False):
+        """Stores :class:`~DesktopprApi.User` objects. *partial* works as in :meth:`add`.
+
+        :returns: the number written.
+        """
+        now = time.time()
+        return self._write(_MERGE_USER if partial else _UPSERT_USER, (_user_row(user, now) for user in users))
+
+    def add_likes(self, username, wallpapers, replace=False):
+        """Records wallpapers a user likes. :class:`~DesktopprApi.Wallpaper` objects are stored as well.
+
+        :param username: User who likes them.
+        :type username: str
+        :param wallpapers: :class:`~DesktopprApi.Wallpaper` objects or ids.
+        :type wallpapers: iterable
+        :param replace: *Optional*, if **True**, these are all the user's likes and any others are forgotten. The \
+            old likes are swapped for the new ones in a single transaction, so readers never see them half replaced. \
+            Defaults to **False**.
+        :type replace: bool
+        :returns: the number of likes written.
+        """
+        return self._add_membership('likes', username, wallpapers, replace)
+
+    def add_collection(self, username, wallpapers, replace=False):
+        """Records wallpapers in a user's collection. Takes the same arguments as :meth:`add_likes`."""
+        return self._add_membership('collections', username, wallpapers, replace)
+
+    def _add_membership(self, table, username, wallpapers, replace):
+        wallpapers = list(wallpapers)
+        objects = [wallpaper for wallpaper in wallpapers if isinstance(wallpaper, Wallpaper)]
+        if objects:
+            self.add_wallpapers(objects)
+        sql = 'INSERT OR IGNORE INTO {} (username, wallpaper_id) VALUES (?, ?)'.format(table)
+        rows = [(username, getattr(wallpaper, 'id', wallpaper)) for wallpaper in wallpapers]
+        if not replace:
+            return self._write(sql, rows)
+        #Not in batches: a failure between the delete and the inserts would lose the user's whole list.
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM {} WHERE username = ?'.format(table), (username,))
+            self._db.executemany(sql, rows)
+        return len(rows)
+
+    def add_follows(self, edges):
+        """Records follow relationships.
+
+        :param edges: (follower, followed) pairs of usernames, such as the :class:`~DesktopprCrawler.Edge` objects \
+            of a :class:`~DesktopprCrawler.FollowGraphCrawler`.
+        :type edges: iterable
+        :returns: the number written.
+        """
+        return self._write('INSERT OR IGNORE INTO follows (follower, followed) VALUES (?, ?)',
+                           (tuple(edge) for edge in edges))
+
+    def wallpaper(self, wallpaper_id):
+        """Returns the stored :class:`~DesktopprApi.Wallpaper` with this id, or None."""
+        wallpapers = self._wallpapers('WHERE id = ?', (wallpaper_id,))
+        return wallpapers[0] if wallpapers else None
+
+    def wallpapers(self, uploader=None, review_state=None, width=None, height=None, min_width=None, min_height=None,
+                   min_pixels=None, min_likes=None, order='id', limit=None, offset=0):
+        """Returns the stored wallpapers that match every filter given.
+
+        :param uploader: *Optional*, username of the uploader.
+        :type uploader: str
+        :param review_state: *Optional*, **safe**, **pending** or **not_safe**.
+        :type review_state: str
+        :param width: *Optional*, exact width.
+        :type width: int
+        :param height: *Optional*, exact height.
+        :type height: int
+        :param min_width: *Optional*, smallest width.
+        :type min_width: int
+        :param min_height: *Optional*, smallest height.
+        :type min_height: int
+        :param min_pixels: *Optional*, smallest width times height.
+        :type min_pixels: int
+        :param min_likes: *Optional*, smallest likes count.
+        :type min_likes: int
+        :param order: *Optional*, one of the keys of :data:`ORDERS`: **id**, **newest**, **likes** (most liked \
+            first) or **pixels** (largest first). Defaults to **id**.
+        :type order: str
+        :param limit: *Optional*, most wallpapers to return. Defaults to **None** (all of them).
+        :type limit: int
+        :param offset: *Optional*, matching wallpapers to skip first. Defaults to **0**.
+        :type offset: int
+        :returns: list of :class:`~DesktopprApi.Wallpaper` objects.
+        """
+        if order not in ORDERS:
+            raise ValueError('Unknown order: {}. Valid options are {}'.format(order, ', '.join(ORDERS)))
+        conditions, parameters = [], []
+        for column, operator, value in (('uploader', '=', uploader), ('review_state', '=', review_state),
+                                        ('width', '=', width), ('height', '=', height),
+                                        ('width', '>=', min_width), ('height', '>=', min_height),
+                                        ('pixels', '>=', min_pixels), ('likes_count', '>=', min_likes)):
+            if value is not None:
+                conditions.append('{} {} ?'.format(column, operator))
+                parameters.append(value)
+        sql = '{} ORDER BY {} LIMIT ? OFFSET ?'.format(
+            'WHERE ' + ' AND '.join(conditions) if conditions else '', ORDERS[order])
+        return self._wallpapers(sql, parameters + [-1 if limit is None else limit, offset])
+
+    def likes(self, username):
+        """Returns the stored wallpapers a user likes, as :class:`~DesktopprApi.Wallpaper` objects. Liked ids whose
+        wallpaper isn't stored are left out."""
+        return self._wallpapers('WHERE id IN (SELECT wallpaper_id FROM likes WHERE username = ?) ORDER BY id',
+                                (username,))
+
+    def collection(self, username):
+        """Returns the stored wallpapers in a user's collection. Works like :meth:`likes`."""
+        return self._wallpapers('WHERE id IN (SELECT wallpaper_id FROM collections WHERE username = ?) ORDER BY id',
+                                (username,))
+
+    def liked_by(self, wallpaper_id):
+        """Returns the usernames of the users recorded as liking a wallpaper."""
+        return self._column('SELECT username FROM likes WHERE wallpaper_id = ? ORDER BY username', (wallpaper_id,))
+
+    def user(self, username):
+        """Returns the stored :class:`~DesktopprApi.User` with this username, or None."""
+        users = self._users('WHERE username = ?', (username,))
+        return users[0] if users else None
+
+    def followers(self, username):
+        """Returns the usernames of the users recorded as following a user."""
+        return self._column('SELECT follower FROM follows WHERE followed = ? ORDER BY follower', (username,))
+
+    def following(self, username):
+        """Returns the usernames of the users a user is recorded as following."""
+        return self._column('SELECT followed FROM follows WHERE follower = ? ORDER BY followed', (username,))
+
+    def counts(self):
+        """Returns a dict with the number of stored **wallpapers**, **users**, **likes**, **collections** and
+        **follows**."""
+        with self._lock:
+            return {table: self._db.execute('SELECT count(*) FROM {}'.format(table)).fetchone()[0]
+                    for table in ('wallpapers', 'users', 'likes', 'collections', 'follows')}
+
+    def _wallpapers(self, where, parameters):
+        with self._lock:
+            rows = self._db.execute('SELECT {} FROM wallpapers {}'.format(', '.join(_WALLPAPER_COLUMNS), where),
+                                    parameters).fetchall()
+        return [_wallpaper_from_row(row) for row in rows]
+
+    def _users(self, where, parameters):
+        with self._lock:
+            rows = self._db.execute('SELECT {} FROM users {}'.format(', '.join(_USER_COLUMNS), where),
+                                    parameters).fetchall()
+        return [_user_from_row(row) for row in rows]
+
+    def _column(self, sql, parameters):
+        with self._lock:
+            return [row[0] for row in self._db.execute(sql, parameters)]
+
+
+def _dumps(value):
+    return None if value is None else json.dumps(value, separators=(',', ':'))
+
+
+def _loads(value):
+    return None if value is None else json.loads(value)
+
+
+def _wallpaper_row(wallpaper, now):
+    pixels = wallpaper.width * wallpaper.height if wallpaper.width and wallpaper.height else None
+    return (wallpaper.id, wallpaper.uploader, wallpaper.review_state, wallpaper.width, wallpaper.height, pixels,
+            wallpaper.likes_count, wallpaper.user_count, wallpaper.bytes, wallpaper.created_at, wallpaper.url,
+            _dumps(wallpaper.image.to_dict()) if wallpaper.image else None, _dumps(wallpaper.palette),
+            _dumps(wallpaper.extra), now)
+
+
+def _wallpaper_from_row(row):
+    (wallpaper_id, uploader, review_state, width, height, _, likes_count, user_count, size, created_at, url, image,
+     palette, extra, _) = row
+    info = _loads(extra) or {}
+    info.update(id=wallpaper_id, uploader=uploader, review_state=review_state, width=width, height=height,
+                likes_count=likes_count, user_count=user_count, bytes=size, created_at=created_at, url=url,
+                image=_loads(image), palette=_loads(palette))
+    return Wallpaper(info)
+
+
+def _user_row(user, now):
+    lifetime_member = None if user.lifetime_member is None else int(bool(user.lifetime_member))
+    return (user.username, user.name, user.followers_count, user.following_count, user.wallpapers_count,
+            user.uploaded_count, lifetime_member, user.avatar_url, user.created_at, _dumps(user.extra), now)
+
+
+def _user_from_row(row):
+    (username, name, followers_count, following_count, wallpapers_count, uploaded_count, lifetime_member, avatar_url,
+     created_at, extra, _) = row
+    info = _loads(extra) or {}
+    info.update(username=username, name=name, followers_count=followers_count, following_count=following_count,
+                wallpapers_count=wallpapers_count, uploaded_count=uploaded_count,
+                lifetime_member=None if lifetime_member is None else bool(lifetime_member), avatar_url=avatar_url,
+                created_at=created_at)
+    return User(info)
@@ -0,0 +1,241 @@
+"""
+.. :platform: Unix, Windows, Mac OSX
+.. :synopsis: Breadth-first, resumable crawler of the follow graph between users.
+"""
+import collections
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+Edge = collections.namedtuple('Edge', ('follower', 'followed'))
+"""One follow relationship: *follower* follows *followed*."""
+
+DIRECTIONS = ('following', 'followers')
+
+
+class FollowGraphCrawler:
+    """
+    Walks the follow graph breadth first from seed users, fetching several users at a time and yielding each
+    :class:`Edge` as soon as it is found::
+
+        >>> crawler = FollowGraphCrawler(api, ['keithpitt'], max_depth=2, checkpoint='crawl.json')
+        >>> for edge in crawler.crawl():
+        ...     print(edge.follower, '->', edge.followed)
+
+    Every user is fetched once: the frontier of users still to visit is deduplicated against every user already
+    queued. For each user, every page of the users they follow and/or their followers is read. When both
+    directions are crawled, an edge between two visited users is yielded only once.
+
+    With a *checkpoint* file, the crawl state (visited users, frontier, failures) is saved every *checkpoint_every*
+    users and when the crawl stops, whether it finished, was interrupted or crashed. Creating a crawler with the
+    same checkpoint file resumes where it left off; the seeds are then ignored. With an *edges_path* as well, edges
+    are appended to that file (one ``follower<TAB>followed`` line each), and on resume it is cut back to what the
+    checkpoint covers, so it holds every edge exactly once. Edges yielded by :meth:`crawl` may repeat across a
+    resume for the users that were being processed when it stopped.
+
+    :param api: :class:`DesktopprApi.DesktopprAPI` to fetch with. Its ``pool_maxsize`` should be at least *workers*.
+    :type api: DesktopprApi.DesktopprAPI
+    :param seeds: Usernames to start from.
+    :type seeds: iterable
+    :param directions: *Optional*, which lists to follow: **following**, **followers** or both. Defaults to both.
+    :type directions: tuple
+    :param max_depth: *Optional*, how many hops from the seeds to go. Users further away are not fetched, but the \
+        edges leading to them are still yielded. Defaults to **None** (no limit).
+    :type max_depth: int
+    :param max_users: *Optional*, stop after fetching this many users. Defaults to **None** (no limit).
+    :type max_users: int
+    :param workers: *Optional*, number of users fetched at the same time. Defaults to **4**.
+    :type workers: int
+    :param retries: *Optional*, times a user whose pages failed is queued again before being given up on. \
+        Defaults to **2**.
+    :type retries: int
+    :param checkpoint: *Optional*, path of the json file the crawl state is saved to and resumed from.
+    :type checkpoint: str
+    :param checkpoint_every: *Optional*, number of users visited between two saves. Defaults to **100**.
+    :type checkpoint_every: int
+    :param edges_path: *Optional*, path of a file every edge is appended to.
+    :type edges_path: str
+    """
+
+    def __init__(self, api, seeds=(), directions=DIRECTIONS, max_depth=None, max_users=None, workers=4, retries=2,
+                 checkpoint=None, checkpoint_every=100, edges_path=None):
+        for direction in directions:
+            if direction not in DIRECTIONS:
+                raise ValueError('Unknown direction: {}. Valid options are following, followers'.format(direction))
+        self.api = api
+        self.directions = tuple(directions)
+        self.max_depth = max_depth
+        self.max_users = max_users
+        self.workers = workers
+        self.retries = retries
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        self.edges_path = edges_path
+
+        self.visited = set()
+        """Usernames whose lists were fetched and whose edges were yielded."""
+
+        self.failed = {}
+        """Usernames given up on, with the last error."""
+
+        self.edges_found = 0
+        """Number of edges yielded, over every run of a resumed crawl."""
+
+        self._frontier = collections.deque()
+        self._seen = set()
+        self._attempts = {}
+        self._in_flight = {}
+        self._edges_offset = 0
+        if checkpoint and os.path.exists(checkpoint):
+            self._load()
+        else:
+            for username in seeds:
+                self._enqueue(username, 0)
+
+    def _enqueue(self, username, depth):
+        if username not in self._seen:
+            self._seen.add(username)
+            self._frontier.append((username, depth))
+
+    def crawl(self):
+        """Runs (or resumes) the crawl.
+
+        :returns: generator of :class:`Edge` objects, in the order they are found. Closing it stops the crawl and \
+            saves a checkpoint.
+        """
+        edges_file = None
+        if self.edges_path:
+            edges_file = open(self.edges_path, 'r+b' if os.path.exists(self.edges_path) else 'wb')
+            edges_file.truncate(self._edges_offset)
+            edges_file.seek(self._edges_offset)
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        in_flight = self._in_flight
+        since_checkpoint = 0
+        try:
+            while self._frontier or in_flight:
+                while self._frontier and len(in_flight) < self.workers and not self._user_limit_reached():
+                    username, depth = self._frontier.popleft()
+                    in_flight[executor.submit(self._fetch_user, username)] = (username, depth)
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    username, depth = in_flight[future]
+                    try:
+                        lists = future.result()
+                    except Exception as e:
+                        del in_flight[future]
+                        self._retry_later(username, depth, e)
+                        continue
+                    edges = self._edges(username, lists)
+                    for edge in edges:
+                        yield edge
+                    #Only now is the user done: if the crawl stops while its edges are being consumed, it is
+                    #fetched again on resume.
+                    del in_flight[future]
+                    self.visited.add(username)
+                    self.edges_found += len(edges)
+                    if edges_file is not None:
+                        edges_file.write(''.join('{}\t{}\n'.format(*edge) for edge in edges).encode('utf-8'))
+                    if self.max_depth is None or depth < self.max_depth:
+                        for names in lists.values():
+                            for name in names:
+                                self._enqueue(name, depth + 1)
+                    since_checkpoint += 1
+                    if self.checkpoint and since_checkpoint >= self.checkpoint_every:
+                        self._save(edges_file)
+                        since_checkpoint = 0
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            #Users that were being fetched go back to the front of the frontier.
+            for username, depth in reversed(list(in_flight.values())):
+                self._frontier.appendleft((username, depth))
+            in_flight.clear()
+            if self.checkpoint:
+                self._save(edges_file)
+            if edges_file is not None:
+                edges_file.close()
+
+    def _user_limit_reached(self):
+        return self.max_users is not None and len(self.visited) + len(self._in_flight) >= self.max_users
+
+    def _fetch_user(self, username):
+        """Fetches every page of the requested lists of a user. Runs on a worker thread."""
+        lists = {}
+        for direction in self.directions:
+            fetch = self.api.get_followed_users if direction == 'following' else self.api.get_user_followers
+            names = []
+            number = 1
+            while True:
+                page = fetch(username, number)
+                if page is None:
+                    raise LookupError('could not get page {} of the {} of {}'.format(number, direction, username))
+                users = page.users or []
+                names.extend(user.username for user in users)
+                if not page.next_page or not users:
+                    break
+                number = page.next_page
+            lists[direction] = names
+        return lists
+
+    def _edges(self, username, lists):
+        #With both directions, an edge between two users is found from each end: keep it from the first one. A user
+        #following themselves is in both of their own lists.
+        both = len(self.directions) == 2
+        edges = []
+        for name in lists.get('following', ()):
+            if not (both and name in self.visited):
+                edges.append(Edge(username, name))
+        for name in lists.get('followers', ()):
+            if not (both and (name in self.visited or name == username)):
+                edges.append(Edge(name, username))
+        return edges
+
+    def _retry_later(self, username, depth, error):
+        attempts = self._attempts.get(username, 0) + 1
+        if attempts <= self.retries:
+            self._attempts[username] = attempts
+            self._frontier.append((username, depth))
+        else:
+            self._attempts.pop(username, None)
+            self.failed[username] = str(error)
+            self.api.logger.info('Giving up on user {}: {}'.format(username, error))
+
+    def stats(self):
+        """Returns a dict with the number of users **visited**, waiting in the **frontier**, being fetched
+        (**in_flight**) and **failed**, and of **edges** found."""
+        return {'visited': len(self.visited), 'frontier': len(self._frontier), 'in_flight': len(self._in_flight),
+                'failed': len(self.failed), 'edges': self.edges_found}
+
+    def _save(self, edges_file):
+        """Writes the checkpoint atomically. The edges file is flushed to disk first, so the offset it records is
+        never ahead of the edges actually stored."""
+        if edges_file is not None:
+            edges_file.flush()
+            os.fsync(edges_file.fileno())
+            self._edges_offset = edges_file.tell()
+        frontier = [[username, depth] for username, depth in self._in_flight.values()]
+        frontier.extend([username, depth] for username, depth in self._frontier)
+        state = {'version': 1, 'directions': list(self.directions), 'visited': sorted(self.visited),
+                 'frontier': frontier, 'failed': self.failed, 'attempts': self._attempts,
+                 'edges_found': self.edges_found, 'edges_offset': self._edges_offset}
+        temporary = self.checkpoint + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.checkpoint)
+
+    def _load(self):
+        with open(self.checkpoint, encoding='utf-8') as f:
+            state = json.load(f)
+        if tuple(state['directions']) != self.directions:
+            raise ValueError('Checkpoint {} was made crawling {}, not {}'.format(
+                self.checkpoint, ', '.join(state['directions']), ', '.join(self.directions)))
+        self.visited = set(state['visited'])
+        self.failed = state['failed']
+        self._attempts = state['attempts']
+        self.edges_found = state['edges_found']
+        self._edges_offset = state['edges_offset']
+        self._frontier = collections.deque((username, depth) for username, depth in state['frontier'])
+        self._seen = self.visited | set(self.failed) | {username for username, _ in self._frontier}
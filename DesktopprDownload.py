@@ -0,0 +1,255 @@
+"""
+.. :platform: Unix, Windows, Mac OSX
+.. :synopsis: Concurrent, resumable downloading of wallpaper images.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = ('full', 'preview', 'thumb')
+"""Image variants that can be downloaded: the full resolution image, its preview and its thumbnail."""
+
+
+def download_wallpapers(wallpapers, dest, variant='full', workers=4, session=None, chunk_size=64 * 1024,
+                        timeout=60, store=None):
+    """Downloads the images of many wallpapers into a folder, several at a time.
+
+    Bodies are streamed to disk in chunks, so memory use doesn't depend on file size. Each image is written to
+    ``<name>.part`` first and renamed when it is complete. If a ``.part`` file is left over from an earlier
+    interrupted run, only the missing bytes are requested, with an HTTP Range header. The image's ETag (or
+    Last-Modified date) is kept next to it in ``<name>.part.validator`` and sent as ``If-Range``, so an image that
+    changed on the server in the meantime is downloaded again from the start. Images that are already
+    complete are skipped. Full resolution downloads are checked against :attr:`~DesktopprApi.Wallpaper.bytes`.
+
+    With a *store*, images it already holds are linked into *dest* without any network request, and new downloads
+    are moved into it (deduplicated by content) and linked back.
+
+    Files are named after the wallpaper id: ``<id>.jpg`` for full images, ``<id>_preview.jpg`` and
+    ``<id>_thumb.jpg`` for the smaller variants, keeping the extension of the image URL.
+
+    :param wallpapers: :class:`~DesktopprApi.Wallpaper` objects to download.
+    :type wallpapers: iterable
+    :param dest: Folder to save images in. It is created if it doesn't exist.
+    :type dest: str
+    :param variant: *Optional*, **full**, **preview** or **thumb**. Defaults to **full**.
+    :type variant: str
+    :param workers: *Optional*, number of images downloaded at the same time. Defaults to **4**.
+    :type workers: int
+    :param session: *Optional*, :class:`requests.Session` to download with, such as \
+        :attr:`DesktopprApi.DesktopprAPI.session`. A pooled one is created if it isn't given.
+    :type session: requests.Session
+    :param chunk_size: *Optional*, bytes read and written at a time. Defaults to **65536**.
+    :type chunk_size: int
+    :param timeout: *Optional*, seconds to wait for the server before a download fails. Defaults to **60**.
+    :type timeout: float
+    :param store: *Optional*, local store to check before downloading and to keep new images in.
+    :type store: DesktopprStore.WallpaperStore
+
+    :returns: :class:`DownloadReport` with one :class:`DownloadResult` per wallpaper and the throughput.
+    """
+    if variant not in VARIANTS:
+        raise ValueError('Unknown variant: {}. Valid options are full, preview, thumb'.format(variant))
+    os.makedirs(dest, exist_ok=True)
+    own_session = session is None
+    if own_session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+    report = DownloadReport()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for result in executor.map(lambda wallpaper: _download(session, wallpaper, dest, variant, chunk_size,
+                                                                   timeout, store, report), wallpapers):
+                report.results.append(result)
+    finally:
+        report.elapsed = time.monotonic() - report._started
+        if own_session:
+            session.close()
+    return report
+
+
+def image_url(wallpaper, variant='full'):
+    """Returns the URL of a wallpaper's full, preview or thumb image, or None if the wallpaper doesn't have one."""
+    image = wallpaper.image
+    if image is not None and variant != 'full':
+        image = getattr(image, variant)
+    return image.url if image is not None else None
+
+
+def image_filename(wallpaper, variant='full'):
+    """Returns the file name :func:`download_wallpapers` saves a wallpaper's image under."""
+    url = image_url(wallpaper, variant) or ''
+    extension = os.path.splitext(urlsplit(url).path)[1] or '.jpg'
+    return '{}{}{}'.format(wallpaper.id, '' if variant == 'full' else '_' + variant, extension)
+
+
+class DownloadResult:
+    """Outcome of downloading one wallpaper."""
+
+    def __init__(self, wallpaper_id, path, status, received=0, error=None):
+        self.wallpaper_id = wallpaper_id
+        """Id of the wallpaper."""
+
+        self.path = path
+        """Where the image was saved (or would have been)."""
+
+        self.status = status
+        """One of **downloaded**, **resumed** (a partial file was completed), **skipped** (already complete), \
+        **stored** (linked from a :class:`DesktopprStore.WallpaperStore` without a network request) or **failed**."""
+
+        self.received = received
+        """Bytes received over the network for this image."""
+
+        self.error = error
+        """Why the download failed, or None."""
+
+    def __repr__(self):
+        return '<DownloadResult {} {}>'.format(self.wallpaper_id, self.status)
+
+
+class DownloadReport:
+    """Results and throughput of a :func:`download_wallpapers` run."""
+
+    def __init__(self):
+        self.results = []
+        """:class:`DownloadResult` objects, in the order the wallpapers were given."""
+
+        self.bytes_received = 0
+        """Total bytes received over the network."""
+
+        self.elapsed = 0.0
+        """Seconds the run took."""
+
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _add_bytes(self, count):
+        with self._lock:
+            self.bytes_received += count
+
+    @property
+    def failed(self):
+        """Results of the downloads that failed."""
+        return [result for result in self.results if result.status == 'failed']
+
+    @property
+    def mb_per_second(self):
+        """Network throughput in megabytes (10^6 bytes) per second."""
+        return self.bytes_received / 1e6 / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def files_per_second(self):
+        """Images downloaded or resumed per second. Skipped and failed images are not counted."""
+        done = sum(1 for result in self.results if result.status in ('downloaded', 'resumed'))
+        return done / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        counts = {}
+        for result in self.results:
+            counts[result.status] = counts.get(result.status, 0) + 1
+        return '{} images ({}) in {:.2f}s: {:.2f} MB/s, {:.2f} files/s'.format(
+            len(self.results), ', '.join('{} {}'.format(count, status) for status, count in sorted(counts.items())),
+            self.elapsed, self.mb_per_second, self.files_per_second)
+
+
+def _download(session, wallpaper, dest, variant, chunk_size, timeout, store, report):
+    path = os.path.join(dest, image_filename(wallpaper, variant))
+    if store is not None and store.has(wallpaper.id, variant):
+        if not (os.path.exists(path) and os.path.samefile(path, store.path(wallpaper.id, variant))):
+            store.link(wallpaper.id, variant, path)
+        return DownloadResult(wallpaper.id, path, 'stored')
+    url = image_url(wallpaper, variant)
+    if not url:
+        return DownloadResult(wallpaper.id, path, 'failed', error='no {} image URL'.format(variant))
+    expected = wallpaper.bytes if variant == 'full' else None
+    if os.path.exists(path) and (expected is None or os.path.getsize(path) == expected):
+        return DownloadResult(wallpaper.id, path, 'skipped')
+    partial = path + '.part'
+    validator_path = partial + '.validator'
+    offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+    if expected is not None and offset > expected:
+        offset = 0
+    received = 0
+    sha = None
+    try:
+        if expected is None or offset < expected:
+            headers = {}
+            if offset:
+                headers['Range'] = 'bytes={}-'.format(offset)
+                validator = _read_validator(validator_path)
+                if validator:
+                    #The server answers 200 with the whole image instead if it changed since the partial file began.
+                    headers['If-Range'] = validator
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as r:
+                if r.status_code == 416 and offset:
+                    #Nothing past what we have: the partial file is already complete.
+                    pass
+                elif r.status_code not in (200, 206):
+                    return DownloadResult(wallpaper.id, path, 'failed', error='HTTP {}'.format(r.status_code))
+                else:
+                    if r.status_code == 200:
+                        offset = 0
+                        _write_validator(validator_path, r)
+                    #Hash while writing when the whole body comes over the network, so the store needn't reread it.
+                    sha = hashlib.sha256() if store is not None and not offset else None
+                    with open(partial, 'ab' if offset else 'wb') as f:
+                        for chunk in r.iter_content(chunk_size):
+                            f.write(chunk)
+                            if sha is not None:
+                                sha.update(chunk)
+                            received += len(chunk)
+                            report._add_bytes(len(chunk))
+        size = os.path.getsize(partial)
+        if expected is not None and size != expected:
+            os.remove(partial)
+            _remove(validator_path)
+            return DownloadResult(wallpaper.id, path, 'failed', received,
+                                  'size mismatch: got {} bytes, expected {}'.format(size, expected))
+        if store is not None:
+            store.add(wallpaper.id, variant, partial, sha.digest() if sha is not None else None)
+            store.link(wallpaper.id, variant, path)
+        else:
+            os.replace(partial, path)
+        _remove(validator_path)
+    except (requests.RequestException, OSError) as e:
+        logger.info('Error downloading wallpaper {}: {}'.format(wallpaper.id, e))
+        return DownloadResult(wallpaper.id, path, 'failed', received, str(e))
+    return DownloadResult(wallpaper.id, path, 'resumed' if offset else 'downloaded', received)
+
+
+def _read_validator(path):
+    """Returns the validator saved for a partial file, or None if there isn't one."""
+    try:
+        with open(path) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _write_validator(path, response):
+    """Saves the strong ETag, or else the Last-Modified date, of a response whose body is about to be written to a
+    partial file. Weak ETags can't be used with If-Range."""
+    etag = response.headers.get('ETag')
+    validator = etag if etag and not etag.startswith('W/') else response.headers.get('Last-Modified')
+    if validator:
+        with open(path, 'w') as f:
+            f.write(validator)
+    else:
+        _remove(path)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,395 @@
+"""
+.. :platform: Unix, Windows, Mac OSX
+.. :synopsis: Local stand-in for the Desktoppr.co public API, for offline testing and benchmarking.
+
+The server implements the endpoints the wrapper uses, with the same pagination and status codes, on top of a
+generated in-memory data set. Point an API object's :attr:`~DesktopprApi.DesktopprAPI.baseurl` at it::
+
+    with FakeDesktopprServer(latency=0.02) as server:
+        api = DesktopprApi.DesktopprAPI()
+        api.baseurl = server.baseurl
+        api.authorize_API(server.data.apikey)
+
+It can also be run on its own, for example to benchmark a client in another process. It prints its base URL::
+
+    $ python DesktopprFakeServer.py --port 8000 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+REVIEW_STATES = ('safe', 'pending', 'not_safe')
+FLAGS = ('flag_safe', 'flag_not_safe', 'flag_deletion')
+_SIZES = ((1920, 1080), (2560, 1440), (1920, 1200), (3840, 2160), (1280, 1024), (1366, 768), (2560, 1600))
+
+
+class FakeDesktoppr:
+    """
+    Generated data set served by :class:`FakeDesktopprServer`: users, wallpapers, each user's collection (synced
+    wallpapers), likes and follows. The same *seed* always gives the same data.
+
+    :param users: *Optional*, number of users, named ``user0``, ``user1``... Defaults to **50**.
+    :type users: int
+    :param wallpapers: *Optional*, number of wallpapers, with ids from 1. Defaults to **500**.
+    :type wallpapers: int
+    :param per_page: *Optional*, items per page of every paginated endpoint. Defaults to **10**.
+    :type per_page: int
+    :param seed: *Optional*, seed of the random generator. Defaults to **1**.
+    :type seed: int
+    :param apikey: *Optional*, API key of the authorized user (``user0``). Defaults to **FAKE_API_KEY**.
+    :type apikey: str
+    :param password: *Optional*, password of the authorized user. Defaults to **password**.
+    :type password: str
+    """
+
+    def __init__(self, users=50, wallpapers=500, per_page=10, seed=1, apikey='FAKE_API_KEY', password='password'):
+        rng = random.Random(seed)
+        self.per_page = per_page
+        self.apikey = apikey
+        self.password = password
+        self.lock = threading.Lock()
+        """Held while a request reads or changes the data."""
+
+        self.users = {}
+        for i in range(users):
+            name = 'user{}'.format(i)
+            self.users[name] = {'username': name, 'name': None, 'avatar_url': 'https://gravatar.com/{}'.format(i),
+                                'created_at': '2013-01-01T00:00:00Z', 'lifetime_member': False,
+                                'uploaded_count': 0}
+        names = sorted(self.users)
+        self.wallpapers = {}
+        for wallpaper_id in range(1, wallpapers + 1):
+            width, height = rng.choice(_SIZES)
+            image = 'https://a.desktopprassets.com/wallpapers/{}/'.format(wallpaper_id)
+            self.wallpapers[wallpaper_id] = {
+                'id': wallpaper_id, 'width': width, 'height': height, 'bytes': rng.randint(100000, 5000000),
+                'created_at': '2013-{:02d}-{:02d}T00:00:00Z'.format(rng.randint(1, 12), rng.randint(1, 28)),
+                'review_state': rng.choice(REVIEW_STATES), 'uploader': rng.choice(names) if names else None,
+                'user_count': 0, 'likes_count': rng.randint(0, 500),
+                'palette': ['{:06X}'.format(rng.randint(0, 0xFFFFFF)) for _ in range(5)],
+                'url': 'https://www.desktoppr.co/wallpapers/{}'.format(wallpaper_id),
+                'image': {'url': image + 'full.jpg',
+                          'thumb': {'url': image + 'thumb.jpg', 'width': 296, 'height': 185},
+                          'preview': {'url': image + 'preview.jpg', 'width': 960, 'height': 540}}}
+        ids = sorted(self.wallpapers)
+        self.collections = {name: rng.sample(ids, rng.randint(0, min(60, len(ids)))) for name in names}
+        """Wallpaper ids synced by each user, newest first."""
+
+        self.likes = {name: rng.sample(ids, rng.randint(0, min(60, len(ids)))) for name in names}
+        """Wallpaper ids liked by each user, newest first."""
+
+        self.following = {name: rng.sample(names, rng.randint(0, min(15, len(names)))) for name in names}
+        """Usernames each user follows."""
+
+        self.flags = []
+        """(wallpaper id, flag) pairs received, in order."""
+
+        self.authed_user = names[0] if names else None
+        """The user the API key and password belong to."""
+
+    def set_asset_base(self, base):
+        """Points every image URL at *base*, so the images can be downloaded from the fake server."""
+        for wallpaper in self.wallpapers.values():
+            image = wallpaper['image']
+            for info in (image, image['thumb'], image['preview']):
+                info['url'] = base + urlsplit(info['url']).path
+
+    def followers(self, name):
+        """Returns the usernames following *name*."""
+        return [other for other in sorted(self.following) if name in self.following[other]]
+
+
+class FakeDesktopprServer(ThreadingHTTPServer):
+    """
+    HTTP server answering like ``api.desktoppr.co/1/``, one thread per connection. Images are served too, at the
+    URLs of the data set, with their real sizes and support for ``Range`` requests.
+
+    :param data: *Optional*, the :class:`FakeDesktoppr` to serve. A default one is generated if it isn't given.
+    :type data: FakeDesktoppr
+    :param latency: *Optional*, seconds every request is delayed by. Defaults to **0**.
+    :type latency: float
+    :param error_rate: *Optional*, share of requests (0 to 1) answered with *error_status* instead. Defaults to **0**.
+    :type error_rate: float
+    :param error_status: *Optional*, status of the injected errors. Defaults to **500**.
+    :type error_status: int
+    :param retry_after: *Optional*, ``Retry-After`` header sent with injected errors, such as **1**. Defaults to \
+        **None** (no header).
+    :type retry_after: str
+    :param address: *Optional*, (host, port) to listen on. Defaults to a free port on 127.0.0.1.
+    :type address: tuple
+    """
+    daemon_threads = True
+
+    def __init__(self, data=None, latency=0.0, error_rate=0.0, error_status=500, retry_after=None,
+                 address=('127.0.0.1', 0)):
+        self.data = data or FakeDesktoppr()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.requests_served = 0
+        self._rng = random.Random(0)
+        self._thread = None
+        super().__init__(address, _Handler)
+        self.data.set_asset_base('http://{}:{}'.format(*self.server_address[:2]))
+
+    @property
+    def baseurl(self):
+        """Base URL of the API, to assign to :attr:`DesktopprApi.DesktopprAPI.baseurl`."""
+        return 'http://{}:{}/1/'.format(*self.server_address[:2])
+
+    def start(self):
+        """Starts serving on a background thread and returns the server."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops serving and closes the listening socket."""
+        if self._thread is not None:
+            self.shutdown()
+            self._thread = None
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _inject_error(self):
+        with self.data.lock:
+            self.requests_served += 1
+            return bool(self.error_rate) and self._rng.random() < self.error_rate
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    #Buffer the status line, headers and body into one write, so small responses aren't held back by Nagle's
+    #algorithm waiting for the client's delayed ACK.
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def _send(self, status, body=None, headers=None):
+        payload = json.dumps(body if body is not None else {}).encode()
+        etag = '"{}"'.format(hashlib.sha1(payload).hexdigest())
+        if status == 200 and self.command == 'GET' and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(status)
+        if status == 200:
+            self.send_header('ETag', etag)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_image(self, segments):
+        """Serves /wallpapers/<id>/<variant>.jpg. The full image is exactly the wallpaper's 'bytes' long. Single
+        'bytes=N-' Range requests are honoured, unless an If-Range header doesn't match the image's ETag."""
+        wallpaper = self.server.data.wallpapers.get(_int_or_none(segments[1]) if len(segments) == 3 else None)
+        if wallpaper is None:
+            return self._send(404)
+        variant = segments[2].split('.')[0]
+        size = wallpaper['bytes'] if variant == 'full' else 4096
+        etag = '"{}-{}-{}"'.format(wallpaper['id'], variant, size)
+        start = 0
+        range_header = self.headers.get('Range', '')
+        if self.headers.get('If-Range', etag) != etag:
+            range_header = ''
+        if range_header.startswith('bytes=') and range_header.endswith('-'):
+            start = int(range_header[6:-1])
+            if start >= size:
+                self.send_response(416)
+                self.send_header('Content-Range', 'bytes */{}'.format(size))
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+        pattern = (str(wallpaper['id']) + variant).encode() * 64
+        body = (pattern * (size // len(pattern) + 1))[start:size]
+        self.send_response(206 if start else 200)
+        self.send_header('ETag', etag)
+        if start:
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, size - 1, size))
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _page(self, items, query):
+        data = self.server.data
+        page = _int_or_none(query.get('page', ['1'])[0]) or 1
+        pages = max((len(items) + data.per_page - 1) // data.per_page, 1)
+        chunk = items[(page - 1) * data.per_page:page * data.per_page]
+        return {'response': chunk, 'count': len(chunk),
+                'pagination': {'current': page, 'previous': page - 1 if page > 1 else None,
+                               'next': page + 1 if page < pages else None, 'per_page': data.per_page,
+                               'pages': pages}}
+
+    def _dispatch(self, method):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        if server._inject_error():
+            headers = {'Retry-After': str(server.retry_after)} if server.retry_after is not None else None
+            return self._send(server.error_status, {'error': 'injected'}, headers)
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        segments = [segment for segment in parts.path.split('/') if segment]
+        if segments[:1] == ['wallpapers'] and method == 'GET':
+            return self._send_image(segments)
+        if segments[:1] != ['1']:
+            return self._send(404)
+        with server.data.lock:
+            status, body = self._route(method, segments[1:], query)
+        self._send(status, body)
+
+    def _authorized_user(self, query):
+        data = self.server.data
+        if query.get('auth_token', [None])[0] == data.apikey:
+            return data.authed_user
+        authorization = self.headers.get('Authorization', '')
+        if authorization.startswith('Basic '):
+            try:
+                username, _, password = base64.b64decode(authorization[6:]).decode().partition(':')
+            except ValueError:
+                return None
+            if username == data.authed_user and password == data.password:
+                return username
+        return None
+
+    def _route(self, method, segments, query):
+        data = self.server.data
+        authed = self._authorized_user(query)
+        wallpapers = data.wallpapers
+        if segments == ['user', 'whoami']:
+            if authed:
+                return 200, {'response': dict(data.users[authed], api_token=data.apikey)}
+            return 401, {'error': 'unauthorized'}
+        if segments == ['wallpapers'] and method == 'GET':
+            items = [wallpapers[i] for i in sorted(wallpapers)]
+            safefilter = query.get('safe_filter', ['safe'])[0]
+            if safefilter != 'all':
+                allowed = ('safe',) if safefilter == 'safe' else ('safe', 'pending')
+                items = [wallpaper for wallpaper in items if wallpaper['review_state'] in allowed]
+            return 200, self._page(items, query)
+        if segments == ['wallpapers', 'random'] and method == 'GET':
+            return 200, {'response': wallpapers[self.server._rng.choice(sorted(wallpapers))]}
+        if len(segments) == 3 and segments[0] == 'wallpapers' and method == 'POST':
+            if not authed:
+                return 401, {}
+            if segments[2] not in FLAGS or _int_or_none(segments[1]) not in wallpapers:
+                return 404, {}
+            data.flags.append((int(segments[1]), segments[2]))
+            return 200, {}
+        if len(segments) == 4 and segments[:2] == ['user', 'wallpapers'] and segments[3] in ('like', 'selection'):
+            if not authed:
+                return 401, {}
+            wallpaper_id = _int_or_none(segments[2])
+            if wallpaper_id not in wallpapers:
+                return 404, {}
+            ids = (data.likes if segments[3] == 'like' else data.collections)[authed]
+            if method == 'POST':
+                if wallpaper_id in ids:
+                    return 422, {}
+                ids.insert(0, wallpaper_id)
+                return 200, {}
+            if wallpaper_id not in ids:
+                return 404, {}
+            ids.remove(wallpaper_id)
+            return 200, {}
+        if segments[:1] == ['users'] and len(segments) >= 2:
+            return self._route_user(method, segments[1], segments[2:], query, authed)
+        return 404, {'error': 'not found'}
+
+    def _route_user(self, method, name, rest, query, authed):
+        data = self.server.data
+        wallpapers = data.wallpapers
+        if name not in data.users:
+            return 404, {'error': 'not found'}
+        if not rest and method == 'GET':
+            user = dict(data.users[name], wallpapers_count=len(data.collections[name]),
+                        followers_count=len(data.followers(name)), following_count=len(data.following[name]))
+            return 200, {'response': user}
+        if rest == ['wallpapers', 'random']:
+            if not data.collections[name]:
+                return 404, {}
+            return 200, {'response': wallpapers[self.server._rng.choice(data.collections[name])]}
+        if rest in (['wallpapers'], ['likes']) and method == 'GET':
+            ids = (data.collections if rest == ['wallpapers'] else data.likes)[name]
+            if 'wallpaper_id' in query:
+                wanted = _int_or_none(query['wallpaper_id'][0])
+                ids = [i for i in ids if i == wanted]
+            return 200, self._page([wallpapers[i] for i in ids], query)
+        if rest == ['followers'] and method == 'GET':
+            return 200, self._page([data.users[user] for user in data.followers(name)], query)
+        if rest == ['following'] and method == 'GET':
+            return 200, self._page([data.users[user] for user in data.following[name]], query)
+        if rest == ['follow'] and method in ('POST', 'DELETE'):
+            if not authed:
+                return 401, {}
+            following = data.following[authed]
+            if method == 'POST' and name not in following:
+                following.append(name)
+            elif method == 'DELETE' and name in following:
+                following.remove(name)
+            return 200, {}
+        return 404, {'error': 'not found'}
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serves a fake Desktoppr.co API until interrupted.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0, help='port to listen on; a free one by default')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--wallpapers', type=int, default=500)
+    parser.add_argument('--per-page', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests that fail (0 to 1)')
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--retry-after', help='Retry-After header sent with injected errors')
+    args = parser.parse_args(argv)
+    data = FakeDesktoppr(users=args.users, wallpapers=args.wallpapers, per_page=args.per_page)
+    server = FakeDesktopprServer(data, args.latency, args.error_rate, args.error_status, args.retry_after,
+                                 (args.host, args.port))
+    print(server.baseurl, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+.. :platform: Unix, Windows, Mac OSX
+.. :synopsis: Columnar view of many wallpapers for fast filtering, sorting and statistics.
+
+This module needs the optional `NumPy <https://numpy.org/>`_ package.
+"""
+import numpy
+
+REVIEW_STATES = ('safe', 'pending', 'not_safe')
+"""Review states, in the order of their codes in :attr:`WallpaperFrame.review_state`."""
+
+_STATE_CODES = {state: code for code, state in enumerate(REVIEW_STATES)}
+
+
+class WallpaperFrame:
+    """
+    Stores the numeric fields of many :class:`~DesktopprApi.Wallpaper` objects as NumPy columns, so filters, sorts
+    and statistics run as vectorized operations instead of Python loops over attributes.
+
+    The columns are the attributes :attr:`id`, :attr:`width`, :attr:`height`, :attr:`bytes`, :attr:`likes_count`,
+    :attr:`review_state` and :attr:`created_at`. Indexing a frame with a boolean mask, an array of row numbers or a
+    slice returns a new frame of those rows, and :meth:`wallpapers` returns their original objects::
+
+        >>> frame = WallpaperFrame.from_wallpapers(api.iter_user_collection('keithpitt'))
+        >>> wide = frame[(frame.width >= 2560) & frame.state_mask('safe')]
+        >>> best = wide.top_k('likes_count', 10).wallpapers()
+
+    Integer fields the server left out are stored as **-1**, and a missing upload date as ``NaT``. Both sort as the
+    smallest values: first going up, last going down and never in a :meth:`top_k`, unless there are fewer than *k*
+    other rows.
+    """
+
+    columns = ('id', 'width', 'height', 'bytes', 'likes_count', 'review_state', 'created_at')
+
+    def __init__(self, id, width, height, bytes, likes_count, review_state, created_at, objects):
+        """Frames are normally built with :meth:`from_wallpapers` or :meth:`from_pages`."""
+        self.id = id
+        """int64 array of wallpaper ids."""
+
+        self.width = width
+        """int64 array of full resolution widths."""
+
+        self.height = height
+        """int64 array of full resolution heights."""
+
+        self.bytes = bytes
+        """int64 array of full resolution file sizes."""
+
+        self.likes_count = likes_count
+        """int64 array of like counts."""
+
+        self.review_state = review_state
+        """int8 array of review state codes: indexes into :data:`REVIEW_STATES`, or -1 if unknown."""
+
+        self.created_at = created_at
+        """datetime64[s] array of upload times (UTC)."""
+
+        self._objects = objects
+
+    @classmethod
+    def from_wallpapers(cls, wallpapers):
+        """Builds a frame from :class:`~DesktopprApi.Wallpaper` objects.
+
+        :param wallpapers: Wallpapers to store. Any iterable works, including the ``iter_*`` generators and \
+            :meth:`~DesktopprApi.DesktopprAPI.fetch_all_pages` streams.
+        :type wallpapers: iterable
+        """
+        wallpapers = list(wallpapers)
+        count = len(wallpapers)
+        objects = numpy.empty(count, dtype=object)
+        objects[:] = wallpapers
+
+        def integers(field):
+            return numpy.fromiter((_or_missing(getattr(wallpaper, field)) for wallpaper in objects),
+                                  dtype=numpy.int64, count=count)
+
+        states = numpy.fromiter((_STATE_CODES.get(wallpaper.review_state, -1) for wallpaper in objects),
+                                dtype=numpy.int8, count=count)
+        created = numpy.array([_timestamp(wallpaper.created_at) for wallpaper in objects], dtype='datetime64[s]')
+        return cls(integers('id'), integers('width'), integers('height'), integers('bytes'), integers('likes_count'),
+                   states, created, objects)
+
+    @classmethod
+    def from_pages(cls, pages):
+        """Builds a frame from the wallpapers on one or more :class:`~DesktopprApi.Page` objects. Pages that are
+        None or hold users are skipped.
+
+        :param pages: Pages to read.
+        :type pages: iterable of :class:`~DesktopprApi.Page`
+        """
+        return cls.from_wallpapers(wallpaper for page in pages if page and page.wallpapers
+                                   for wallpaper in page.wallpapers)
+
+    def __len__(self):
+        return len(self.id)
+
+    def __getitem__(self, rows):
+        """Selects rows with a boolean mask, an array of row numbers or a slice."""
+        return WallpaperFrame(*(getattr(self, column)[rows] for column in self.columns), self._objects[rows])
+
+    def __repr__(self):
+        return '<WallpaperFrame of {} wallpapers>'.format(len(self))
+
+    def state_mask(self, *states):
+        """Returns a boolean mask of the rows whose review state is one of *states* (e.g. **safe**, **pending**)."""
+        return numpy.isin(self.review_state, [_STATE_CODES[state] for state in states])
+
+    def aspect_ratio(self):
+        """Returns width / height for every row as a float array (NaN where the size is unknown)."""
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            return numpy.where(self.height > 0, self.width / self.height, numpy.nan)
+
+    def megapixels(self):
+        """Returns width * height / 1,000,000 for every row as a float array (NaN where the size is unknown)."""
+        known = (self.width >= 0) & (self.height >= 0)
+        return numpy.where(known, self.width * self.height / 1e6, numpy.nan)
+
+    def sort_by(self, column, descending=False):
+        """Returns a new frame sorted by a column. The sort is stable.
+
+        :param column: Name of a column in :attr:`columns`.
+        :type column: str
+        :param descending: *Optional*, sort from the largest value down. Defaults to **False**.
+        :type descending: bool
+        """
+        values = _sortable(getattr(self, column))
+        return self[numpy.argsort(-values if descending else values, kind='stable')]
+
+    def top_k(self, column, k):
+        """Returns a new frame of the *k* rows with the largest values of a column, largest first. Only those *k*
+        rows are fully sorted.
+
+        :param column: Name of a column in :attr:`columns`, such as **likes_count**.
+        :type column: str
+        :param k: Number of rows to keep.
+        :type k: int
+        """
+        values = _sortable(getattr(self, column))
+        k = min(k, len(values))
+        if k <= 0:
+            return self[numpy.arange(0)]
+        candidates = numpy.argpartition(-values, k - 1)[:k]
+        return self[candidates[numpy.argsort(-values[candidates], kind='stable')]]
+
+    def wallpapers(self):
+        """Returns the :class:`~DesktopprApi.Wallpaper` objects of this frame's rows, in row order."""
+        return self._objects.tolist()
+
+
+def _sortable(values):
+    #Dates are compared as integer seconds, so they can be negated for descending order. NaT would become the
+    #smallest int64, whose negation overflows back to itself, so it is moved one up: it still sorts first going up
+    #and last going down, like the -1 of a missing integer field.
+    if values.dtype.kind != 'M':
+        return values
+    return numpy.where(numpy.isnat(values), numpy.iinfo(numpy.int64).min + 1, values.astype(numpy.int64))
+
+
+def _or_missing(value):
+    return -1 if value is None else value
+
+
+def _timestamp(created_at):
+    #The server sends UTC times with a trailing Z, which numpy doesn't parse.
+    return created_at[:19] if created_at else 'NaT'
@@ -0,0 +1,163 @@
+"""
+.. :platform: Unix, Windows, Mac OSX
+.. :synopsis: Aggregation and export of per-request measurements.
+"""
+import bisect
+import json
+import threading
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+"""Upper bounds, in seconds, of the latency histogram buckets. Slower requests fall in an extra ``+Inf`` bucket."""
+
+PHASES = ('connect', 'ttfb', 'body', 'decode', 'build', 'total')
+
+
+class MetricsAggregator:
+    """
+    Listener for :meth:`DesktopprApi.DesktopprAPI.add_listener` that keeps running totals per endpoint: request and
+    error counts by status, bytes received, retries, cache hits, and one latency histogram for each phase of
+    :class:`~DesktopprApi.RequestRecord` plus the total. It is thread-safe and can be shared by several API objects::
+
+        >>> metrics = MetricsAggregator()
+        >>> api.add_listener(metrics)
+        >>> api.get_user_collection('keithpitt')
+        >>> print(metrics.prometheus())
+
+    :param buckets: *Optional*, upper bounds in seconds of the histogram buckets, in increasing order. Defaults to \
+        :data:`DEFAULT_BUCKETS`.
+    :type buckets: tuple
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def __call__(self, record):
+        key = (record.endpoint, record.method)
+        with self._lock:
+            stats = self._endpoints.get(key)
+            if stats is None:
+                stats = self._endpoints[key] = _EndpointStats(len(self.buckets))
+            stats.requests += 1
+            status = str(record.status) if record.status is not None else 'error'
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            if record.error is not None or (record.status or 0) >= 400:
+                stats.errors += 1
+            stats.bytes += record.bytes
+            stats.retries += record.retries
+            stats.cached += record.cached
+            for phase in PHASES:
+                seconds = getattr(record, phase)
+                histogram = stats.histograms[phase]
+                histogram[bisect.bisect_left(self.buckets, seconds)] += 1
+                stats.sums[phase] += seconds
+
+    def reset(self):
+        """Forgets everything recorded so far."""
+        with self._lock:
+            self._endpoints.clear()
+
+    def snapshot(self):
+        """Returns the current totals as a dict that can be serialized to json.
+
+        :returns: dict keyed by ``"<method> <endpoint>"``, such as ``"GET users/{}/likes"``. Each value holds \
+            **requests**, **errors**, **statuses** (count per status, **error** for requests that got no response), \
+            **bytes**, **retries**, **cached** and **phases**: for each of connect, ttfb, body, decode, build and \
+            total, the **sum** and **mean** seconds, the **p50** and **p99** estimated from the histogram, and the \
+            **buckets** (count per upper bound, not cumulative).
+        """
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        result = {}
+        with self._lock:
+            for (endpoint, method), stats in sorted(self._endpoints.items()):
+                phases = {}
+                for phase in PHASES:
+                    histogram = stats.histograms[phase]
+                    phases[phase] = {'sum': stats.sums[phase], 'mean': stats.sums[phase] / stats.requests,
+                                     'p50': self._quantile(histogram, stats.requests, 0.5),
+                                     'p99': self._quantile(histogram, stats.requests, 0.99),
+                                     'buckets': dict(zip(bounds, histogram))}
+                result['{} {}'.format(method, endpoint)] = {
+                    'requests': stats.requests, 'errors': stats.errors, 'statuses': dict(stats.statuses),
+                    'bytes': stats.bytes, 'retries': stats.retries, 'cached': stats.cached, 'phases': phases}
+        return result
+
+    def to_json(self, **kwargs):
+        """Returns :meth:`snapshot` as a json string. Keyword arguments are passed on to :func:`json.dumps`."""
+        return json.dumps(self.snapshot(), **kwargs)
+
+    def prometheus(self, prefix='desktoppr'):
+        """Returns the totals in the Prometheus text exposition format.
+
+        :param prefix: *Optional*, prefix of every metric name. Defaults to **desktoppr**.
+        :type prefix: str
+        """
+        lines = []
+
+        def header(name, kind, text):
+            lines.append('# HELP {}_{} {}'.format(prefix, name, text))
+            lines.append('# TYPE {}_{} {}'.format(prefix, name, kind))
+
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            header('requests_total', 'counter', 'API requests by endpoint and status.')
+            for (endpoint, method), stats in endpoints:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append('{}_requests_total{{{},status="{}"}} {}'.format(
+                        prefix, _labels(endpoint, method), status, count))
+            for name, attribute, text in (('response_bytes_total', 'bytes', 'Response body bytes received.'),
+                                          ('retries_total', 'retries', 'Requests sent again after a failure.'),
+                                          ('cache_hits_total', 'cached', 'Requests answered from the cache.')):
+                header(name, 'counter', text)
+                for (endpoint, method), stats in endpoints:
+                    lines.append('{}_{}{{{}}} {}'.format(prefix, name, _labels(endpoint, method),
+                                                         getattr(stats, attribute)))
+            header('request_duration_seconds', 'histogram', 'Time spent in each phase of an API request.')
+            for (endpoint, method), stats in endpoints:
+                for phase in PHASES:
+                    labels = '{},phase="{}"'.format(_labels(endpoint, method), phase)
+                    cumulative = 0
+                    for bound, count in zip(self.buckets + (None,), stats.histograms[phase]):
+                        cumulative += count
+                        lines.append('{}_request_duration_seconds_bucket{{{},le="{}"}} {}'.format(
+                            prefix, labels, '+Inf' if bound is None else bound, cumulative))
+                    lines.append('{}_request_duration_seconds_sum{{{}}} {}'.format(prefix, labels,
+                                                                                  stats.sums[phase]))
+                    lines.append('{}_request_duration_seconds_count{{{}}} {}'.format(prefix, labels, stats.requests))
+        return '\n'.join(lines) + '\n'
+
+    def _quantile(self, histogram, count, fraction):
+        """Estimates a quantile from a histogram, interpolating linearly inside the bucket it falls in."""
+        rank = fraction * count
+        seen = 0
+        lower = 0.0
+        for bound, bucket in zip(self.buckets, histogram):
+            if bucket and seen + bucket >= rank:
+                return lower + (bound - lower) * (rank - seen) / bucket
+            seen += bucket
+            lower = bound
+        #In the +Inf bucket: the largest finite bound is the best estimate available.
+        return lower
+
+
+class _EndpointStats:
+    __slots__ = ('requests', 'errors', 'statuses', 'bytes', 'retries', 'cached', 'histograms', 'sums')
+
+    def __init__(self, buckets):
+        self.requests = 0
+        self.errors = 0
+        self.statuses = {}
+        self.bytes = 0
+        self.retries = 0
+        self.cached = 0
+        self.histograms = {phase: [0] * (buckets + 1) for phase in PHASES}
+        self.sums = dict.fromkeys(PHASES, 0.0)
+
+
+def _labels(endpoint, method):
+    return 'endpoint="{}",method="{}"'.format(_escape(endpoint), method)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,184 @@
+"""
+.. :platform: Unix, Windows, Mac OSX
+.. :synopsis: Nearest-neighbour search of wallpapers by the colours of their palette.
+
+This module needs the optional `NumPy <https://numpy.org/>`_ package.
+"""
+import numbers
+import re
+import threading
+
+import numpy
+
+BINS = (4, 6, 6)
+"""Default number of histogram bins along L*, a* and b*."""
+
+_LAB_RANGES = ((0.0, 100.0), (-96.0, 96.0), (-96.0, 96.0))
+_HEX_COLOR = re.compile('#?[0-9A-Fa-f]{6}')
+
+#sRGB (D65) to CIE XYZ, and the D65 white point.
+_RGB_TO_XYZ = numpy.array([[0.4124564, 0.3575761, 0.1804375],
+                           [0.2126729, 0.7151522, 0.0721750],
+                           [0.0193339, 0.1191920, 0.9503041]])
+_WHITE = numpy.array([0.95047, 1.0, 1.08883])
+
+
+def hex_to_lab(colors):
+    """Converts hex colours (``'3A6EA5'`` or ``'#3A6EA5'``) to CIE L*a*b*.
+
+    :param colors: Hex strings.
+    :type colors: iterable
+    :returns: float array with one (L*, a*, b*) row per colour.
+    """
+    values = numpy.array([int(color.lstrip('#'), 16) for color in colors], dtype=numpy.int64)
+    rgb = numpy.stack([(values >> 16) & 255, (values >> 8) & 255, values & 255], axis=1) / 255.0
+    linear = numpy.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+    xyz = linear @ _RGB_TO_XYZ.T / _WHITE
+    f = numpy.where(xyz > 216 / 24389, numpy.cbrt(xyz), (24389 / 27 * xyz + 16) / 116)
+    return numpy.stack([116 * f[:, 1] - 16, 500 * (f[:, 0] - f[:, 1]), 200 * (f[:, 1] - f[:, 2])], axis=1)
+
+
+class PaletteIndex:
+    """
+    Finds wallpapers whose :attr:`~DesktopprApi.Wallpaper.palette` looks like a given one, or holds a given colour::
+
+        >>> index = PaletteIndex()
+        >>> index.add(api.iter_wallpapers('all'))
+        >>> for wallpaper, distance in index.similar(some_wallpaper, k=5):
+        ...     print(wallpaper.id, distance)
+        >>> index.by_color('#1E3F66', k=5)
+
+    Each palette becomes a fixed-length vector: a soft histogram over a grid of L*a*b* cells, where every colour adds
+    weight to the cells around it (a Gaussian one cell wide), so close colours that fall on either side of a cell
+    border still match. The vectors are normalized and kept as the rows of one NumPy matrix; a query is a single
+    matrix product and a partial sort, with distances from 0 (same colours) to about 1.41 (no colour in common). Lab
+    distances follow perceived colour differences much better than RGB ones.
+
+    Wallpapers can be added at any time, for example page by page while they stream in. Adding a wallpaper that is
+    already indexed replaces it; wallpapers without a palette, or with a colour in it that isn't a six digit hex
+    code, are skipped. Adding and querying from several threads
+    is safe.
+
+    :param bins: *Optional*, number of cells along L*, a* and b*. Defaults to :data:`BINS` (144 cells).
+    :type bins: tuple
+    """
+
+    def __init__(self, bins=BINS):
+        self.bins = tuple(bins)
+        axes = [numpy.linspace(low + (high - low) / (2 * count), high - (high - low) / (2 * count), count)
+                for (low, high), count in zip(_LAB_RANGES, self.bins)]
+        grid = numpy.meshgrid(*axes, indexing='ij')
+        self._centers = numpy.stack([axis.ravel() for axis in grid], axis=1)
+        self._widths = numpy.array([(high - low) / count for (low, high), count in zip(_LAB_RANGES, self.bins)])
+        self._lock = threading.Lock()
+        self._vectors = numpy.empty((0, len(self._centers)))
+        self._ids = numpy.empty(0, dtype=numpy.int64)
+        self._objects = []
+        self._rows = {}
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def features(self, palette):
+        """Returns the normalized feature vector of a palette (a list of hex colours)."""
+        return self._features([palette])[0]
+
+    def _features(self, palettes):
+        """Feature vectors of several palettes at once: one row each."""
+        sizes = [len(palette) for palette in palettes]
+        labs = hex_to_lab([color for palette in palettes for color in palette])
+        #Distance of every colour to every cell centre, in cell widths.
+        offsets = (labs[:, None, :] - self._centers[None, :, :]) / self._widths
+        weights = numpy.exp(-0.5 * numpy.einsum('ijk,ijk->ij', offsets, offsets))
+        vectors = numpy.add.reduceat(weights, numpy.cumsum([0] + sizes[:-1]), axis=0) if labs.size else \
+            numpy.zeros((len(palettes), len(self._centers)))
+        norms = numpy.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / numpy.where(norms > 0, norms, 1.0)
+
+    def add(self, wallpapers):
+        """Indexes :class:`~DesktopprApi.Wallpaper` objects.
+
+        :param wallpapers: Wallpapers to add. Any iterable works, including a :class:`~DesktopprApi.Page`'s \
+            wallpapers and the ``iter_*`` generators.
+        :type wallpapers: iterable
+        :returns: the number of wallpapers indexed.
+        """
+        wallpapers = [wallpaper for wallpaper in wallpapers if _valid_palette(wallpaper.palette)]
+        if not wallpapers:
+            return 0
+        vectors = self._features([wallpaper.palette for wallpaper in wallpapers])
+        with self._lock:
+            for wallpaper, vector in zip(wallpapers, vectors):
+                row = self._rows.get(wallpaper.id)
+                if row is None:
+                    row = self._rows[wallpaper.id] = self._count
+                    self._count += 1
+                    self._grow(self._count)
+                    self._objects.append(wallpaper)
+                else:
+                    self._objects[row] = wallpaper
+                self._vectors[row] = vector
+                self._ids[row] = wallpaper.id
+        return len(wallpapers)
+
+    def _grow(self, count):
+        """Makes room for *count* rows, doubling the capacity so adding one at a time stays cheap."""
+        capacity = len(self._vectors)
+        if count > capacity:
+            capacity = max(count, 2 * capacity, 64)
+            vectors = numpy.empty((capacity, self._vectors.shape[1]))
+            vectors[:self._count - 1] = self._vectors[:self._count - 1]
+            ids = numpy.empty(capacity, dtype=numpy.int64)
+            ids[:self._count - 1] = self._ids[:self._count - 1]
+            self._vectors, self._ids = vectors, ids
+
+    def by_palette(self, palette, k=10, exclude=()):
+        """Returns the *k* wallpapers whose palettes are closest to a palette.
+
+        :param palette: Hex colours.
+        :type palette: list
+        :param k: *Optional*, number of results. Defaults to **10**.
+        :type k: int
+        :param exclude: *Optional*, wallpaper ids to leave out of the results.
+        :type exclude: iterable
+        :returns: list of (:class:`~DesktopprApi.Wallpaper`, distance) tuples, closest first.
+        """
+        return self._nearest(self.features(palette), k, exclude)
+
+    def by_color(self, color, k=10, exclude=()):
+        """Returns the *k* wallpapers whose palettes are most made of a colour. Takes the same arguments as
+        :meth:`by_palette`, with one hex colour instead of a palette."""
+        return self._nearest(self.features([color]), k, exclude)
+
+    def similar(self, wallpaper, k=10):
+        """Returns the *k* wallpapers whose colours are closest to a wallpaper's, not counting that wallpaper.
+
+        :param wallpaper: :class:`~DesktopprApi.Wallpaper` with a palette, or the id of an indexed wallpaper.
+        :returns: list of (:class:`~DesktopprApi.Wallpaper`, distance) tuples, closest first.
+        :raises KeyError: if an id is given that isn't indexed.
+        """
+        if isinstance(wallpaper, numbers.Integral):
+            with self._lock:
+                wallpaper = self._objects[self._rows[wallpaper]]
+        return self.by_palette(wallpaper.palette, k, exclude=(wallpaper.id,))
+
+    def _nearest(self, vector, k, exclude):
+        with self._lock:
+            count = self._count
+            vectors, ids, objects = self._vectors[:count], self._ids[:count], self._objects[:count]
+        if not count:
+            return []
+        #Both sides have unit length, so the squared euclidean distance is 2 - 2 * cosine similarity.
+        distances = numpy.maximum(2.0 - 2.0 * (vectors @ vector), 0.0)
+        if exclude:
+            distances[numpy.isin(ids, list(exclude))] = numpy.inf
+        k = min(k, count)
+        nearest = numpy.argpartition(distances, k - 1)[:k] if k < count else numpy.arange(count)
+        nearest = nearest[numpy.argsort(distances[nearest], kind='stable')]
+        return [(objects[row], float(numpy.sqrt(distances[row]))) for row in nearest if numpy.isfinite(distances[row])]
+
+
+def _valid_palette(palette):
+    """Returns **True** if a palette is a non-empty list of hex colours that :func:`hex_to_lab` can convert."""
+    return bool(palette) and all(isinstance(color, str) and _HEX_COLOR.fullmatch(color) for color in palette)
@@ -0,0 +1,245 @@
+"""
+.. :platform: Unix, Windows, Mac OSX
+.. :synopsis: Pool of random wallpapers fetched ahead of time, so they can be handed out without a round trip.
+"""
+import collections
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RandomWallpaperPool:
+    """
+    Keeps buffers of random wallpapers filled in the background, one per safefilter of
+    :meth:`~DesktopprApi.DesktopprAPI.get_random_wallpaper` and one per username of
+    :meth:`~DesktopprApi.DesktopprAPI.get_user_randomwallpaper`::
+
+        >>> pool = RandomWallpaperPool(api, depth=16)
+        >>> pool.warm(safefilters=['safe'], users=['keithpitt'])
+        >>> wallpaper = pool.pop('safe')
+        >>> wallpaper = pool.pop_user('keithpitt')
+
+    :meth:`pop` and :meth:`pop_user` return the oldest buffered wallpaper at once and ask the workers for a
+    replacement, so each buffer is kept at *depth*. A buffer is created the first time it is used; when it is empty
+    (a miss), the wallpaper is fetched right away instead. Wallpapers that were among the last *recent* handed out
+    from a buffer, or that are already in it, are dropped when fetched, so the same one isn't seen twice in a row.
+    A buffer that keeps getting repeats (a user with only a few wallpapers) stops being refilled after *max_repeats*
+    of them in a row, until its next pop. At most *max_buffers* buffers are kept: when a new one is needed, the least
+    recently used is dropped, with its wallpapers and the fetches it still had queued, so a long running service that
+    pops for many users doesn't grow without bound.
+
+    :param api: :class:`DesktopprApi.DesktopprAPI` to fetch with. Its ``pool_maxsize`` should be at least *workers*.
+    :type api: DesktopprApi.DesktopprAPI
+    :param depth: *Optional*, wallpapers kept in each buffer. Defaults to **8**.
+    :type depth: int
+    :param workers: *Optional*, random wallpapers fetched at the same time, over every buffer. Defaults to **4**.
+    :type workers: int
+    :param recent: *Optional*, wallpaper ids remembered per buffer to avoid repeats; **0** turns that off. Defaults \
+        to **256**.
+    :type recent: int
+    :param max_repeats: *Optional*, repeats in a row after which a buffer is left alone until its next pop. \
+        Defaults to **5**.
+    :type max_repeats: int
+    :param max_buffers: *Optional*, most buffers kept at once. Defaults to **64**.
+    :type max_buffers: int
+    """
+
+    def __init__(self, api, depth=8, workers=4, recent=256, max_repeats=5, max_buffers=64):
+        if max_buffers < 1:
+            raise ValueError('max_buffers must be at least 1, got {}'.format(max_buffers))
+        self.api = api
+        self.depth = depth
+        self.recent = recent
+        self.max_repeats = max_repeats
+        self.max_buffers = max_buffers
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='desktoppr-prefetch')
+        self._buffers = collections.OrderedDict()
+        self._closed = False
+        self.hits = 0
+        self.misses = 0
+        self.fetched = 0
+        self.repeats = 0
+        self.errors = 0
+        self.evicted = 0
+        self._latencies = collections.deque(maxlen=1024)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Stops the workers. Fetches already under way are abandoned and buffered wallpapers are dropped."""
+        with self._lock:
+            self._closed = True
+            self._buffers.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def warm(self, safefilters=(), users=()):
+        """Creates the buffers of these safefilters and usernames and starts filling them, so the first pops are
+        hits too."""
+        for safefilter in safefilters:
+            self._buffer(('safefilter', safefilter))
+        for username in users:
+            self._buffer(('user', username))
+
+    def pop(self, safefilter='safe'):
+        """Returns a random wallpaper, like :meth:`~DesktopprApi.DesktopprAPI.get_random_wallpaper`.
+
+        :param safefilter: *Optional*, **safe**, **include_pending** or **all**. Defaults to **safe**.
+        :type safefilter: str
+        :returns: :class:`~DesktopprApi.Wallpaper` object, or None if the buffer was empty and fetching failed.
+        """
+        if safefilter not in self.api.safefilters:
+            raise ValueError('Unknown filter: {}. Valid options are safe, include_pending, all'.format(safefilter))
+        return self._pop(('safefilter', safefilter))
+
+    def pop_user(self, username):
+        """Returns a random wallpaper from a user's collection, like
+        :meth:`~DesktopprApi.DesktopprAPI.get_user_randomwallpaper`.
+
+        :returns: :class:`~DesktopprApi.Wallpaper` object, or None if the buffer was empty and fetching failed.
+        """
+        return self._pop(('user', username))
+
+    def _pop(self, key):
+        buffer = self._buffer(key)
+        with self._lock:
+            buffer.repeats = 0
+            if buffer.wallpapers:
+                self.hits += 1
+                wallpaper = buffer.wallpapers.popleft()
+                buffer.remember(wallpaper.id)
+            else:
+                self.misses += 1
+                wallpaper = None
+            self._refill(key, buffer)
+        if wallpaper is not None:
+            return wallpaper
+        for _ in range(self.max_repeats):
+            wallpaper = self._fetch(key)[0]
+            if wallpaper is None:
+                return None
+            with self._lock:
+                if wallpaper.id not in buffer.recent and wallpaper.id not in buffer.buffered:
+                    buffer.remember(wallpaper.id)
+                    return wallpaper
+        #Every try was a repeat: one is better than nothing.
+        return wallpaper
+
+    def _buffer(self, key):
+        with self._lock:
+            buffer = self._buffers.get(key)
+            if buffer is None:
+                while len(self._buffers) >= self.max_buffers:
+                    self._evict()
+                buffer = self._buffers[key] = _Buffer(self.recent)
+                self._refill(key, buffer)
+            else:
+                self._buffers.move_to_end(key)
+            return buffer
+
+    def _evict(self):
+        """Drops the least recently used buffer and cancels its queued fetches. Called with the lock held."""
+        _, buffer = self._buffers.popitem(last=False)
+        buffer.evicted = True
+        buffer.wallpapers.clear()
+        for future in list(buffer.futures):
+            future.cancel()
+        self.evicted += 1
+
+    def _refill(self, key, buffer):
+        """Submits fetches until the buffer plus the fetches under way reach the depth. Called with the lock held."""
+        while (not self._closed and not buffer.evicted and buffer.repeats < self.max_repeats
+               and len(buffer.wallpapers) + buffer.pending < self.depth):
+            buffer.pending += 1
+            future = self._executor.submit(self._fill, key, buffer)
+            buffer.futures.add(future)
+            #Runs in the worker thread, or right here if the fetch is already over, so it must not take the lock.
+            future.add_done_callback(buffer.futures.discard)
+
+    def _fill(self, key, buffer):
+        if buffer.evicted:
+            #Started just before its buffer was dropped.
+            return
+        wallpaper, latency = self._fetch(key)
+        with self._lock:
+            buffer.pending -= 1
+            if self._closed or buffer.evicted or wallpaper is None:
+                return
+            self._latencies.append(latency)
+            if wallpaper.id in buffer.recent or wallpaper.id in buffer.buffered:
+                self.repeats += 1
+                buffer.repeats += 1
+            else:
+                buffer.repeats = 0
+                buffer.wallpapers.append(wallpaper)
+            self._refill(key, buffer)
+
+    def _fetch(self, key):
+        """Fetches one random wallpaper for a buffer. Returns it (or None) and the seconds it took."""
+        kind, name = key
+        started = time.perf_counter()
+        try:
+            if kind == 'safefilter':
+                wallpaper = self.api.get_random_wallpaper(name)
+            else:
+                wallpaper = self.api.get_user_randomwallpaper(name)
+        except Exception as e:
+            self.api.logger.info('Could not prefetch a random wallpaper for {} {}: {}'.format(kind, name, e))
+            wallpaper = None
+        latency = time.perf_counter() - started
+        with self._lock:
+            if wallpaper is None:
+                self.errors += 1
+            else:
+                self.fetched += 1
+        return wallpaper, latency
+
+    def stats(self):
+        """Reports how well the pool keeps up.
+
+        :returns: dict with the keys **hits** and **misses** (pops served from a buffer or not), **hit_ratio**,
+            **fetched**, **repeats** (fetched wallpapers dropped as repeats), **errors**, **evicted** (buffers dropped
+            to stay within *max_buffers*), **refill_latency** (mean,
+            p50 and p99 seconds of the last 1024 background fetches) and **buffers** (wallpapers held per buffer,
+            keyed ``safefilter:<filter>`` or ``user:<username>``).
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+            pops = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'hit_ratio': self.hits / pops if pops else 0.0,
+                    'fetched': self.fetched, 'repeats': self.repeats, 'errors': self.errors, 'evicted': self.evicted,
+                    'refill_latency': {
+                        'mean': sum(latencies) / len(latencies) if latencies else 0.0,
+                        'p50': latencies[int(len(latencies) * 0.5)] if latencies else 0.0,
+                        'p99': latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] if latencies else 0.0},
+                    'buffers': {'{}:{}'.format(*key): len(buffer.wallpapers) for key, buffer in self._buffers.items()}}
+
+
+class _Buffer:
+    __slots__ = ('wallpapers', 'pending', 'repeats', 'futures', 'evicted', 'recent', '_recent_order')
+
+    def __init__(self, recent):
+        self.wallpapers = collections.deque()
+        self.pending = 0
+        self.repeats = 0
+        self.futures = set()
+        self.evicted = False
+        self.recent = set()
+        self._recent_order = collections.deque(maxlen=recent)
+
+    @property
+    def buffered(self):
+        return {wallpaper.id for wallpaper in self.wallpapers}
+
+    def remember(self, wallpaper_id):
+        """Adds an id handed out to the recent ones, forgetting the oldest past the limit."""
+        if wallpaper_id in self.recent or not self._recent_order.maxlen:
+            return
+        if len(self._recent_order) == self._recent_order.maxlen:
+            self.recent.discard(self._recent_order[0])
+        self._recent_order.append(wallpaper_id)
+        self.recent.add(wallpaper_id)
@@ -0,0 +1,203 @@
+"""
+.. :platform: Unix, Windows, Mac OSX
+.. :synopsis: Process-wide request rate limiting with backoff on throttling responses.
+"""
+import collections
+import datetime
+import email.utils
+import threading
+import time
+
+KINDS = ('read', 'write')
+"""Request classes with their own rate: **read** for GET requests, **write** for everything that changes data."""
+
+THROTTLE_STATUSES = (429, 503)
+"""Statuses that mean the server is throttling us. The request is retried once the limiter lets it through again."""
+
+_HISTORY = 60.0
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_limiter():
+    """Returns the process-wide :class:`RateLimiter`, creating it with the default settings on first use. Every
+    :class:`DesktopprApi.DesktopprAPI` created with ``rate_limit=True`` sends its requests through it."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = RateLimiter()
+        return _shared
+
+
+class RateLimiter:
+    """
+    Token bucket limiter for API requests, safe to share between threads and between API objects.
+
+    Each request class in :data:`KINDS` has a bucket that refills at *rate* requests per second and holds up to
+    *burst* requests, so short bursts go out immediately and sustained traffic is spread out evenly. Callers that
+    would exceed the rate wait their turn, first come first served.
+
+    When the server answers 429 or 503, :meth:`throttled` pauses every bucket: until the time given by the response's
+    ``Retry-After`` header, or for an exponential backoff when it has none. All threads using the limiter back off
+    together instead of each one hammering the server with its own retry.
+
+    :param read_rate: *Optional*, GET requests per second. Defaults to **10**.
+    :type read_rate: float
+    :param write_rate: *Optional*, mutating (POST and DELETE) requests per second. Defaults to **2**.
+    :type write_rate: float
+    :param burst: *Optional*, requests of each class that can go out at once after a quiet period. Defaults to **5**.
+    :type burst: int
+    :param max_retries: *Optional*, times a throttled request is retried before \
+        :class:`DesktopprApi.RateLimitedError` is raised. Defaults to **3**.
+    :type max_retries: int
+    :param backoff: *Optional*, seconds to pause after the first throttled response without a ``Retry-After``. It \
+        doubles with every retry of the same request. Defaults to **1**.
+    :type backoff: float
+    :param max_backoff: *Optional*, the longest pause, whatever the server asks for. Defaults to **60**.
+    :type max_backoff: float
+    """
+
+    def __init__(self, read_rate=10.0, write_rate=2.0, burst=5, max_retries=3, backoff=1.0, max_backoff=60.0):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._buckets = {'read': _Bucket(read_rate, burst), 'write': _Bucket(write_rate, burst)}
+        self._paused_until = 0.0
+        self._throttles = 0
+
+    @staticmethod
+    def kind_for(method):
+        """Returns the request class of an HTTP method: **read** for GET, **write** otherwise."""
+        return 'read' if method == 'GET' else 'write'
+
+    def set_rate(self, kind, rate, burst=None):
+        """Changes the rate (and optionally the burst) of a request class. Requests already waiting keep their turn.
+
+        :param kind: **read** or **write**.
+        :type kind: str
+        :param rate: Requests per second.
+        :type rate: float
+        :param burst: *Optional*, requests that can go out at once. Unchanged if it isn't given.
+        :type burst: int
+        """
+        with self._lock:
+            bucket = self._buckets[kind]
+            bucket.rate = rate
+            if burst is not None:
+                bucket.burst = burst
+
+    def reserve(self, kind):
+        """Takes a turn for one request without waiting, and returns the number of seconds the caller must wait
+        before sending it. :meth:`acquire` is the blocking version."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets[kind]
+            interval = 1.0 / bucket.rate
+            start = max(now, self._paused_until, bucket.next_free - (bucket.burst - 1) * interval)
+            bucket.next_free = max(bucket.next_free, start) + interval
+            while bucket.sent and bucket.sent[0] < now - _HISTORY:
+                bucket.sent.popleft()
+            bucket.sent.append(start)
+            return start - now
+
+    def acquire(self, kind):
+        """Blocks until one request of class *kind* may be sent."""
+        delay = self.reserve(kind)
+        if delay > 0:
+            bucket = self._buckets[kind]
+            self._count_waiting(bucket, 1, delay)
+            try:
+                time.sleep(delay)
+            finally:
+                self._count_waiting(bucket, -1)
+
+    async def acquire_async(self, kind):
+        """Coroutine version of :meth:`acquire`, which waits without blocking the event loop."""
+        import asyncio
+        delay = self.reserve(kind)
+        if delay > 0:
+            bucket = self._buckets[kind]
+            self._count_waiting(bucket, 1, delay)
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self._count_waiting(bucket, -1)
+
+    def _count_waiting(self, bucket, change, delay=0.0):
+        with self._lock:
+            bucket.waiting += change
+            bucket.waited += delay
+
+    def throttled(self, retry_after=None, attempt=0):
+        """Pauses every request class after the server answered with a throttling status.
+
+        :param retry_after: *Optional*, value of the response's ``Retry-After`` header: seconds, or an HTTP date.
+        :type retry_after: str
+        :param attempt: *Optional*, how many times this request was already retried, for the exponential backoff \
+            used when there is no *retry_after*. Defaults to **0**.
+        :type attempt: int
+        :returns: the number of seconds requests are paused for.
+        """
+        delay = _parse_retry_after(retry_after)
+        if delay is None:
+            delay = self.backoff * 2 ** attempt
+        delay = min(max(delay, 0.0), self.max_backoff)
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._throttles += 1
+        return delay
+
+    def stats(self, window=10.0):
+        """Reports the state of the limiter.
+
+        :param window: *Optional*, seconds over which the current rate is measured, up to 60. Defaults to **10**.
+        :type window: float
+        :returns: dict with one entry per request class (**read**, **write**), each a dict with the keys **rate** \
+            (configured requests per second), **current_rate** (requests let through per second over the last \
+            *window*), **queue_depth** (callers waiting for their turn right now) and **waited** (total seconds \
+            callers were asked to wait), plus **throttled** (throttling responses seen) and **paused_for** (seconds \
+            until requests resume after one, or 0).
+        """
+        now = time.monotonic()
+        with self._lock:
+            result = {}
+            for kind, bucket in self._buckets.items():
+                recent = sum(1 for start in bucket.sent if now - window <= start <= now)
+                result[kind] = {'rate': bucket.rate, 'current_rate': recent / window, 'queue_depth': bucket.waiting,
+                                'waited': bucket.waited}
+            result['throttled'] = self._throttles
+            result['paused_for'] = max(self._paused_until - now, 0.0)
+            return result
+
+
+class _Bucket:
+    """Rate settings and counters of one request class. ``next_free`` is when the bucket would next be empty if no
+    burst were allowed, so a request may go out at ``next_free - (burst - 1) / rate``."""
+    __slots__ = ('rate', 'burst', 'next_free', 'waiting', 'waited', 'sent')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.next_free = 0.0
+        self.waiting = 0
+        self.waited = 0.0
+        self.sent = collections.deque()
+
+
+def _parse_retry_after(value):
+    """Returns the seconds a ``Retry-After`` header asks for, or None if it is missing or unreadable."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    #HTTP dates are always UTC; a date without a zone (or with -0000) would otherwise be read as local time.
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
@@ -0,0 +1,215 @@
+"""
+.. :platform: Unix, Windows, Mac OSX
+.. :synopsis: Retry policy and circuit breaker for transient network and server failures.
+"""
+import collections
+import random
+import threading
+import time
+
+CLOSED = 'closed'
+"""Breaker state: requests flow normally."""
+
+OPEN = 'open'
+"""Breaker state: requests fail fast with :class:`DesktopprApi.CircuitOpenError` until the cool-down is over."""
+
+HALF_OPEN = 'half_open'
+"""Breaker state: the cool-down is over and a few probe requests are let through to test the server."""
+
+
+class RetryPolicy:
+    """
+    Decides which failed requests are sent again and how long to wait before each attempt.
+
+    The wait grows exponentially with the attempt number, up to *max_backoff*. With *jitter*, each wait is a random
+    time between 0 and that limit ("full jitter"), so many workers that failed at the same moment don't all retry at
+    the same moment too. Only requests whose method is in *methods* are retried, which by default means the
+    idempotent GET requests: a POST that timed out may still have been applied.
+
+    :param retries: *Optional*, attempts after the first one. Defaults to **3**.
+    :type retries: int
+    :param backoff: *Optional*, seconds to wait before the first retry (the upper limit, with jitter). It doubles \
+        with every attempt. Defaults to **0.5**.
+    :type backoff: float
+    :param max_backoff: *Optional*, the longest wait between two attempts. Defaults to **30**.
+    :type max_backoff: float
+    :param jitter: *Optional*, randomize the waits. Defaults to **True**.
+    :type jitter: bool
+    :param methods: *Optional*, HTTP methods that may be retried. Defaults to **('GET',)**.
+    :type methods: tuple
+    :param statuses: *Optional*, response statuses that are retried. Defaults to **(500, 502, 503, 504)**.
+    :type statuses: tuple
+    :param exceptions: *Optional*, exception classes that are retried. Defaults to **(OSError,)**, which covers \
+        every :mod:`requests` error as well as connection resets and timeouts, including the :class:`requests.Timeout` \
+        raised once the API object's ``timeout`` runs out.
+    :type exceptions: tuple
+    """
+
+    def __init__(self, retries=3, backoff=0.5, max_backoff=30.0, jitter=True, methods=('GET',),
+                 statuses=(500, 502, 503, 504), exceptions=(OSError,)):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.methods = frozenset(methods)
+        self.statuses = frozenset(statuses)
+        self.exceptions = tuple(exceptions)
+
+    def should_retry(self, method, attempt, status=None, error=None):
+        """Returns **True** if a request should be sent again.
+
+        :param method: HTTP method of the request.
+        :type method: str
+        :param attempt: Number of retries already made for it (0 after the first attempt).
+        :type attempt: int
+        :param status: *Optional*, status of the response, if there was one.
+        :type status: int
+        :param error: *Optional*, exception raised instead of a response.
+        :type error: Exception
+        """
+        if attempt >= self.retries or method not in self.methods:
+            return False
+        if error is not None:
+            return isinstance(error, self.exceptions)
+        return status in self.statuses
+
+    def delay(self, attempt):
+        """Returns the seconds to wait before retry number *attempt* + 1."""
+        limit = min(self.backoff * 2 ** attempt, self.max_backoff)
+        return random.uniform(0, limit) if self.jitter else limit
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a server that is mostly failing, so a bad minute upstream doesn't turn into thousands
+    of slow timeouts.
+
+    The breaker watches the outcome of every request over the last *window* seconds. Once at least *min_requests*
+    were made and the share that failed (network errors and 5xx statuses) reaches *failure_threshold*, it opens:
+    requests fail at once with :class:`DesktopprApi.CircuitOpenError` for *cooldown* seconds. It then goes half open
+    and lets up to *probes* requests through at a time. A successful probe closes it again; a failed one reopens it
+    for another cool-down.
+
+    One breaker can be shared by several API objects talking to the same server.
+
+    :param failure_threshold: *Optional*, share of failed requests (0 to 1) that opens the breaker. Defaults to \
+        **0.5**.
+    :type failure_threshold: float
+    :param min_requests: *Optional*, requests needed in the window before the breaker can open. Defaults to **20**.
+    :type min_requests: int
+    :param window: *Optional*, seconds of history the failure rate is measured over. Defaults to **30**.
+    :type window: float
+    :param cooldown: *Optional*, seconds the breaker stays open before probing. Defaults to **30**.
+    :type cooldown: float
+    :param probes: *Optional*, probe requests allowed in flight while half open. Defaults to **1**.
+    :type probes: int
+    """
+
+    def __init__(self, failure_threshold=0.5, min_requests=20, window=30.0, cooldown=30.0, probes=1):
+        self.failure_threshold = failure_threshold
+        self.min_requests = min_requests
+        self.window = window
+        self.cooldown = cooldown
+        self.probes = probes
+        self._lock = threading.Lock()
+        self._outcomes = collections.deque()
+        self._failures = 0
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self):
+        """**closed**, **open** or **half_open**."""
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now):
+        if self._state == OPEN and now - self._opened_at >= self.cooldown:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+        return self._state
+
+    def allow(self):
+        """Returns **True** if a request may be sent now, taking a probe slot if the breaker is half open. Every
+        allowed request must be followed by a call to :meth:`record`."""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probes_in_flight < self.probes:
+                self._probes_in_flight += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def retry_in(self):
+        """Returns the seconds until the breaker starts probing again, or 0 if it isn't open."""
+        with self._lock:
+            if self._current_state(time.monotonic()) != OPEN:
+                return 0.0
+            return max(self._opened_at + self.cooldown - time.monotonic(), 0.0)
+
+    def record(self, success):
+        """Records the outcome of a request that :meth:`allow` let through."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state(now)
+            if state == HALF_OPEN:
+                self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+                if success:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                    self._failures = 0
+                else:
+                    self._open(now)
+                return
+            if state == OPEN:
+                #A request that started before the breaker opened.
+                return
+            self._outcomes.append((now, success))
+            if not success:
+                self._failures += 1
+            self._expire(now)
+            if (len(self._outcomes) >= self.min_requests
+                    and self._failures >= self.failure_threshold * len(self._outcomes)):
+                self._open(now)
+
+    def _open(self, now):
+        self._state = OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self._failures = 0
+        self.times_opened += 1
+
+    def _expire(self, now):
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            if not self._outcomes.popleft()[1]:
+                self._failures -= 1
+
+    def reset(self):
+        """Closes the breaker and forgets the recorded outcomes. The counters are kept."""
+        with self._lock:
+            self._state = CLOSED
+            self._outcomes.clear()
+            self._failures = 0
+            self._probes_in_flight = 0
+
+    def stats(self):
+        """Reports the state of the breaker.
+
+        :returns: dict with the keys **state**, **requests** and **failures** (recorded in the current window), \
+            **failure_rate**, **times_opened**, **rejected** (requests failed fast while open) and **retry_in** \
+            (seconds until probing starts, or 0).
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state(now)
+            self._expire(now)
+            requests = len(self._outcomes)
+            return {'state': state, 'requests': requests, 'failures': self._failures,
+                    'failure_rate': self._failures / requests if requests else 0.0,
+                    'times_opened': self.times_opened, 'rejected': self.rejected,
+                    'retry_in': max(self._opened_at + self.cooldown - now, 0.0) if state == OPEN else 0.0}
@@ -0,0 +1,233 @@
+"""
+.. :platform: Unix, Windows, Mac OSX
+.. :synopsis: Index of wallpapers by resolution and aspect ratio, to find the best ones for a screen.
+"""
+import bisect
+import heapq
+import math
+import threading
+
+BLOCK_SIZE = 128
+"""Entries per block of an aspect bucket. Blocks are split when they grow to twice this size."""
+
+
+class ScreenFitIndex:
+    """
+    Finds the most liked wallpapers that fill a screen: at least as wide and as tall as it, with nearly the same
+    aspect ratio::
+
+        >>> index = ScreenFitIndex()
+        >>> index.add(api.iter_wallpapers('all'))
+        >>> index.best_for(2560, 1440, k=5)
+        [<DesktopprApi.Wallpaper object at 0x...>, ...]
+
+    Wallpapers are grouped in buckets by the logarithm of their aspect ratio, *step* wide (0.01 is about 1%), so a
+    query only looks at the few buckets its tolerance covers. Each bucket is a list of blocks ordered by pixel count,
+    and each block also keeps its wallpapers ordered by likes. A query finds the first block with enough pixels by
+    bisection and sorts the part of that block above the threshold by likes. It then merges that with the like orders
+    of every larger block with a heap, stopping after *k* matches. So a query costs a sort of at most one block, one
+    heap source per larger block in the buckets its tolerance covers, and the near misses (large enough in pixels but
+    too narrow or too short) it has to skip. It doesn't visit every wallpaper of those buckets, but for a screen
+    smaller than most wallpapers it adds a heap source for nearly every one of their blocks.
+
+    Wallpapers can be added at any time, for example page by page as they arrive. Adding one that is already
+    indexed replaces it, so updated like counts are taken into account. Wallpapers without a size are skipped, and
+    adding one that lost its size drops the indexed copy.
+    Adding and querying from several threads is safe.
+
+    :param step: *Optional*, width of an aspect bucket in natural log units. Defaults to **0.01**.
+    :type step: float
+    """
+
+    def __init__(self, step=0.01):
+        self.step = step
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, wallpapers):
+        """Indexes :class:`~DesktopprApi.Wallpaper` objects.
+
+        :param wallpapers: Wallpapers to add. Any iterable works, including the ``iter_*`` generators.
+        :type wallpapers: iterable
+        :returns: the number of wallpapers indexed.
+        """
+        added = 0
+        with self._lock:
+            for wallpaper in wallpapers:
+                old = self._entries.pop(wallpaper.id, None)
+                if old is not None:
+                    self._discard(old)
+                if not wallpaper.width or not wallpaper.height:
+                    continue
+                entry = _Entry(wallpaper, self.step)
+                self._entries[wallpaper.id] = entry
+                bucket = self._buckets.get(entry.bucket)
+                if bucket is None:
+                    bucket = self._buckets[entry.bucket] = _Bucket()
+                bucket.insert(entry)
+                added += 1
+        return added
+
+    def remove(self, wallpaper_id):
+        """Removes a wallpaper from the index. Returns **True** if it was indexed."""
+        with self._lock:
+            entry = self._entries.pop(wallpaper_id, None)
+            if entry is None:
+                return False
+            self._discard(entry)
+            return True
+
+    def _discard(self, entry):
+        """Internal method that takes an entry out of its bucket, dropping the bucket once it is empty. Call it with
+        the lock held."""
+        bucket = self._buckets[entry.bucket]
+        bucket.remove(entry)
+        if not bucket.blocks:
+            del self._buckets[entry.bucket]
+
+    def best_for(self, width, height, tolerance=0.05, k=10, review_states=None):
+        """Returns the most liked wallpapers that fit a screen.
+
+        :param width: Width of the screen. Wallpapers must be at least this wide.
+        :type width: int
+        :param height: Height of the screen. Wallpapers must be at least this tall.
+        :type height: int
+        :param tolerance: *Optional*, how far a wallpaper's aspect ratio may be from the screen's, as a fraction: \
+            **0.05** allows ratios from 5% narrower to 5% wider. Defaults to **0.05**.
+        :type tolerance: float
+        :param k: *Optional*, most wallpapers to return. Defaults to **10**.
+        :type k: int
+        :param review_states: *Optional*, review states to keep, such as **('safe',)**. Defaults to **None** (any).
+        :type review_states: tuple
+        :returns: list of :class:`~DesktopprApi.Wallpaper` objects, most liked first (ties by id).
+        :raises ValueError: if the width or height isn't positive, or the tolerance is negative.
+        """
+        if not (width > 0 and height > 0):
+            raise ValueError('Screen size must be positive, got {}x{}'.format(width, height))
+        if not tolerance >= 0:
+            raise ValueError('Tolerance must be 0 or more, got {}'.format(tolerance))
+        aspect = math.log(width / height)
+        spread = math.log1p(tolerance)
+        low, high = aspect - spread, aspect + spread
+        pixels = width * height
+        with self._lock:
+            sources = []
+            for bucket_number in range(math.floor(low / self.step), math.floor(high / self.step) + 1):
+                bucket = self._buckets.get(bucket_number)
+                if bucket is not None:
+                    sources.extend(bucket.by_likes_from(pixels))
+            results = []
+            heap = [(source[0].rank, number, 0) for number, source in enumerate(sources) if source]
+            heapq.heapify(heap)
+            while heap and len(results) < k:
+                _, number, position = heapq.heappop(heap)
+                source = sources[number]
+                entry = source[position]
+                if (entry.width >= width and entry.height >= height and low <= entry.aspect <= high
+                        and (review_states is None or entry.wallpaper.review_state in review_states)):
+                    results.append(entry.wallpaper)
+                if position + 1 < len(source):
+                    heapq.heappush(heap, (source[position + 1].rank, number, position + 1))
+        return results
+
+
+class _Entry:
+    __slots__ = ('wallpaper', 'width', 'height', 'pixels', 'aspect', 'bucket', 'rank')
+
+    def __init__(self, wallpaper, step):
+        self.wallpaper = wallpaper
+        self.width = wallpaper.width
+        self.height = wallpaper.height
+        self.pixels = wallpaper.width * wallpaper.height
+        self.aspect = math.log(wallpaper.width / wallpaper.height)
+        self.bucket = math.floor(self.aspect / step)
+        #Sorts most liked first, then by id.
+        self.rank = (-(wallpaper.likes_count or 0), wallpaper.id)
+
+
+class _Bucket:
+    """Entries of one aspect bucket, as blocks ordered by pixel count. Each block keeps its entries both by pixel
+    count and by rank."""
+    __slots__ = ('blocks', 'maxima')
+
+    def __init__(self):
+        self.blocks = []
+        self.maxima = []
+
+    def insert(self, entry):
+        key = (entry.pixels, entry.rank)
+        number = min(bisect.bisect_left(self.maxima, key), len(self.blocks) - 1)
+        if number < 0:
+            self.blocks.append(_Block())
+            self.maxima.append(key)
+            number = 0
+        block = self.blocks[number]
+        block.insert(entry)
+        self.maxima[number] = block.keys[-1]
+        if len(block.keys) >= 2 * BLOCK_SIZE:
+            upper = block.split()
+            self.blocks.insert(number + 1, upper)
+            self.maxima[number] = block.keys[-1]
+            self.maxima.insert(number + 1, upper.keys[-1])
+
+    def remove(self, entry):
+        key = (entry.pixels, entry.rank)
+        number = bisect.bisect_left(self.maxima, key)
+        block = self.blocks[number]
+        block.remove(entry)
+        if block.keys:
+            self.maxima[number] = block.keys[-1]
+        else:
+            del self.blocks[number]
+            del self.maxima[number]
+
+    def by_likes_from(self, pixels):
+        """Lists of the entries with at least *pixels* pixels, each ordered by rank: one per block."""
+        number = bisect.bisect_left(self.maxima, (pixels,))
+        if number >= len(self.blocks):
+            return []
+        first = self.blocks[number]
+        start = bisect.bisect_left(first.keys, (pixels,))
+        head = first.by_rank if start == 0 else sorted(first.entries[start:], key=_rank)
+        return [head] + [block.by_rank for block in self.blocks[number + 1:]]
+
+
+class _Block:
+    __slots__ = ('keys', 'entries', 'ranks', 'by_rank')
+
+    def __init__(self, entries=()):
+        self.entries = list(entries)
+        self.keys = [(entry.pixels, entry.rank) for entry in self.entries]
+        self.by_rank = sorted(self.entries, key=_rank)
+        self.ranks = [entry.rank for entry in self.by_rank]
+
+    def insert(self, entry):
+        position = bisect.bisect_left(self.keys, (entry.pixels, entry.rank))
+        self.keys.insert(position, (entry.pixels, entry.rank))
+        self.entries.insert(position, entry)
+        position = bisect.bisect_left(self.ranks, entry.rank)
+        self.ranks.insert(position, entry.rank)
+        self.by_rank.insert(position, entry)
+
+    def remove(self, entry):
+        position = bisect.bisect_left(self.keys, (entry.pixels, entry.rank))
+        del self.keys[position]
+        del self.entries[position]
+        position = bisect.bisect_left(self.ranks, entry.rank)
+        del self.ranks[position]
+        del self.by_rank[position]
+
+    def split(self):
+        """Keeps the lower half of the entries by pixel count and returns a new block with the upper half."""
+        middle = len(self.entries) // 2
+        upper = _Block(self.entries[middle:])
+        self.__init__(self.entries[:middle])
+        return upper
+
+
+def _rank(entry):
+    return entry.rank
@@ -0,0 +1,181 @@
+"""
+.. :platform: Unix, Windows, Mac OSX
+.. :synopsis: Content-addressed local store of wallpaper images, with deduplication.
+"""
+import hashlib
+import os
+import shutil
+import struct
+import threading
+
+VARIANT_CODES = {'full': 0, 'preview': 1, 'thumb': 2}
+_VARIANTS = {code: variant for variant, code in VARIANT_CODES.items()}
+
+_RECORD = struct.Struct('<QB32sQ')
+"""One index record: wallpaper id, variant code, SHA-256 digest of the content, size in bytes."""
+
+
+class WallpaperStore:
+    """
+    Local store of wallpaper images, keyed by wallpaper id (and variant) with the SHA-256 of the content as a
+    secondary key. Each distinct image is kept once, under ``objects/<2 hex digits>/<digest>``. Ids whose images
+    have the same content share that one object.
+
+    The index is an append-only file of fixed-size binary records (49 bytes each). It is read into memory once when
+    the store is opened, so :meth:`has` is a dict lookup and never touches the object folders. Pass a store to
+    :func:`DesktopprDownload.download_wallpapers` to skip network fetches for images it already holds.
+
+    :param root: Folder of the store. It is created if it doesn't exist.
+    :type root: str
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._objects = os.path.join(root, 'objects')
+        self._index_path = os.path.join(root, 'index.bin')
+        os.makedirs(self._objects, exist_ok=True)
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._digests = {}
+        self._load()
+        self._index = open(self._index_path, 'ab')
+
+    def close(self):
+        """Closes the index file."""
+        with self._lock:
+            self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _load(self):
+        if not os.path.exists(self._index_path):
+            return
+        with open(self._index_path, 'rb') as f:
+            data = f.read()
+        #A torn final record (from a crash mid-write) is ignored.
+        usable = len(data) - len(data) % _RECORD.size
+        for wallpaper_id, code, digest, size in _RECORD.iter_unpack(data[:usable]):
+            self._remember(wallpaper_id, code, digest, size)
+
+    def _remember(self, wallpaper_id, code, digest, size):
+        previous = self._entries.get((wallpaper_id, code))
+        if previous is not None:
+            self._release(previous[0])
+        self._entries[(wallpaper_id, code)] = (digest, size)
+        self._digests[digest] = self._digests.get(digest, 0) + 1
+
+    def _release(self, digest):
+        count = self._digests[digest] - 1
+        if count:
+            self._digests[digest] = count
+        else:
+            del self._digests[digest]
+
+    def has(self, wallpaper_id, variant='full'):
+        """Returns **True** if the store holds this image of a wallpaper."""
+        return (int(wallpaper_id), VARIANT_CODES[variant]) in self._entries
+
+    def has_digest(self, digest):
+        """Returns **True** if the store holds content with this SHA-256 (hex string or raw bytes)."""
+        return _raw_digest(digest) in self._digests
+
+    def digest(self, wallpaper_id, variant='full'):
+        """Returns the SHA-256 hex digest of a stored image, or None if it isn't stored."""
+        entry = self._entries.get((int(wallpaper_id), VARIANT_CODES[variant]))
+        return entry[0].hex() if entry else None
+
+    def path(self, wallpaper_id, variant='full'):
+        """Returns the path of a stored image's object file, or None if it isn't stored. Treat it as read-only: it
+        may be shared with other wallpapers."""
+        entry = self._entries.get((int(wallpaper_id), VARIANT_CODES[variant]))
+        return self._object_path(entry[0]) if entry else None
+
+    def _object_path(self, digest):
+        name = digest.hex()
+        return os.path.join(self._objects, name[:2], name)
+
+    def add(self, wallpaper_id, variant, source, digest=None):
+        """Moves a downloaded image file into the store. If the store already has the same content, the file is
+        deleted and the existing object is referenced instead.
+
+        :param wallpaper_id: Wallpaper the image belongs to.
+        :type wallpaper_id: int
+        :param variant: **full**, **preview** or **thumb**.
+        :type variant: str
+        :param source: Path of the image file. It no longer exists afterwards.
+        :type source: str
+        :param digest: *Optional*, the SHA-256 of the file if it is already known, to avoid reading it again.
+        :type digest: bytes
+        :returns: path of the object file.
+        """
+        digest = _raw_digest(digest) if digest else _hash_file(source)
+        size = os.path.getsize(source)
+        target = self._object_path(digest)
+        with self._lock:
+            if digest in self._digests or os.path.exists(target):
+                os.remove(source)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(source, target)
+            code = VARIANT_CODES[variant]
+            self._index.write(_RECORD.pack(int(wallpaper_id), code, digest, size))
+            self._index.flush()
+            self._remember(int(wallpaper_id), code, digest, size)
+        return target
+
+    def link(self, wallpaper_id, variant, dest):
+        """Makes a stored image appear at *dest* without copying it: a hard link, or a symbolic link where hard
+        links aren't possible. It is only copied as a last resort.
+
+        :returns: **True** if the image was stored and linked, **False** if it isn't stored.
+        """
+        source = self.path(wallpaper_id, variant)
+        if source is None:
+            return False
+        if os.path.lexists(dest):
+            os.remove(dest)
+        try:
+            os.link(source, dest)
+        except OSError:
+            try:
+                os.symlink(os.path.abspath(source), dest)
+            except OSError:
+                shutil.copyfile(source, dest)
+        return True
+
+    def compact(self):
+        """Rewrites the index with one record per stored image, dropping records that were later replaced."""
+        with self._lock:
+            temporary = self._index_path + '.tmp'
+            with open(temporary, 'wb') as f:
+                for (wallpaper_id, code), (digest, size) in self._entries.items():
+                    f.write(_RECORD.pack(wallpaper_id, code, digest, size))
+            self._index.close()
+            os.replace(temporary, self._index_path)
+            self._index = open(self._index_path, 'ab')
+
+    def stats(self):
+        """Returns a dict with the number of stored **images**, distinct **objects** and **duplicates** (images
+        served by an object another image already uses)."""
+        with self._lock:
+            return {'images': len(self._entries), 'objects': len(self._digests),
+                    'duplicates': len(self._entries) - len(self._digests)}
+
+
+def _raw_digest(digest):
+    return bytes.fromhex(digest) if isinstance(digest, str) else digest
+
+
+def _hash_file(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.digest()
@@ -0,0 +1,191 @@
+"""
+.. :platform: Unix, Windows, Mac OSX
+.. :synopsis: Incremental refresh of users' collections and likes, fetching only the pages that changed.
+"""
+import json
+import os
+import threading
+import time
+
+from DesktopprApi import _LIST_PATHS, PageFetchError
+
+KINDS = tuple(_LIST_PATHS)
+"""Lists that can be synced: the ones :meth:`DesktopprApi.DesktopprAPI.get_list_page` reads."""
+
+
+class SyncDelta:
+    """What changed in a list since the previous :meth:`IncrementalSync.refresh`."""
+    __slots__ = ('username', 'kind', 'added', 'removed', 'total', 'pages', 'full')
+
+    def __init__(self, username, kind, added, removed, total, pages, full):
+        self.username = username
+        """User whose list was refreshed."""
+
+        self.kind = kind
+        """**collection** or **likes**."""
+
+        self.added = added
+        """:class:`~DesktopprApi.Wallpaper` objects that are new in the list, newest first."""
+
+        self.removed = removed
+        """Ids of the wallpapers that left the list."""
+
+        self.total = total
+        """Number of wallpapers in the list now."""
+
+        self.pages = pages
+        """Number of pages fetched for this refresh."""
+
+        self.full = full
+        """**True** if every page was walked: on the first refresh, or when an early stop could not be trusted."""
+
+    def __bool__(self):
+        return bool(self.added or self.removed)
+
+    def __str__(self):
+        return '{} of {}: +{} -{}, {} in total, {} page{}{}'.format(
+            self.kind, self.username, len(self.added), len(self.removed), self.total, self.pages,
+            '' if self.pages == 1 else 's', ' (full walk)' if self.full else '')
+
+
+class IncrementalSync:
+    """
+    Keeps the ids of users' collections and likes, newest first, and refreshes them by reading only the pages that
+    changed::
+
+        >>> sync = IncrementalSync(api, 'known.json')
+        >>> delta = sync.refresh('keithpitt', 'likes')
+        >>> for wallpaper in delta.added:
+        ...     print('new:', wallpaper.id)
+
+    The server lists the most recently added wallpapers first, so :meth:`refresh` fetches from page 1 and stops
+    after the first page on which every wallpaper is already known: whatever follows was seen before. Wallpapers
+    removed from the part of the list that was read are found by comparing it with the stored ids. A removal
+    further down can't be seen that way, so the page count of the response is checked against the size the list
+    should now have; if they disagree, the remaining pages are walked as well. A refresh therefore costs about one
+    page more than the pages holding new wallpapers. With *full_every*, every n-th refresh of a list walks all of
+    it, to catch removals the page count doesn't reveal.
+
+    Pages are read with :meth:`DesktopprApi.DesktopprAPI.get_list_page`, revalidating any copy in the API's cache, so
+    a cache never hides changes from a refresh; a page that didn't change costs a ``304 Not Modified`` answer.
+
+    The known ids and a watermark per list (newest id, size and time of the last refresh) are kept in memory and,
+    with a *path*, in a json file that is replaced atomically after every refresh.
+
+    :param api: :class:`DesktopprApi.DesktopprAPI` to fetch with.
+    :type api: DesktopprApi.DesktopprAPI
+    :param path: *Optional*, json file the state is loaded from and saved to. Defaults to **None** (memory only).
+    :type path: str
+    :param full_every: *Optional*, walk the whole list on every n-th refresh of it. Defaults to **None** (only \
+        when needed).
+    :type full_every: int
+    """
+
+    def __init__(self, api, path=None, full_every=None):
+        self.api = api
+        self.path = path
+        self.full_every = full_every
+        self._lock = threading.Lock()
+        self._lists = {}
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self._lists = json.load(f)['lists']
+
+    def refresh(self, username, kind='collection'):
+        """Fetches what changed in a list since the last refresh and records it. The first refresh of a list
+        walks every page and reports all of it as added.
+
+        :param username: User whose list should be refreshed.
+        :type username: str
+        :param kind: *Optional*, **collection** (synced wallpapers) or **likes**. Defaults to **collection**.
+        :type kind: str
+        :returns: :class:`SyncDelta`.
+        :raises PageFetchError: if a page could not be fetched. Nothing is recorded then.
+        """
+        if kind not in KINDS:
+            raise ValueError('Unknown kind: {}. Valid options are {}'.format(kind, ', '.join(KINDS)))
+        key = '{}:{}'.format(kind, username)
+        with self._lock:
+            state = self._lists.get(key)
+        known = state['ids'] if state else None
+        refreshes = state['refreshes'] + 1 if state else 1
+        full = known is None or (self.full_every is not None and refreshes % self.full_every == 0)
+        known_set = set(known or ())
+
+        fetched = []
+        page, number = None, 1
+        while True:
+            page = self._page(username, kind, number)
+            ids = [wallpaper.id for wallpaper in page.wallpapers]
+            fetched.extend(page.wallpapers)
+            if not page.next_page or not ids or (not full and known_set.issuperset(ids)):
+                break
+            number = page.next_page
+        pages = number
+
+        current = list(dict.fromkeys(wallpaper.id for wallpaper in fetched))
+        #An id read twice means the list shifted while its pages were being read.
+        shifted = len(current) != len(fetched)
+        if not full and page.next_page:
+            #Wallpapers are only added (or moved) to the top, so the known ids before the last one read should all
+            #have been read too; the ones that weren't are gone. After it, the stored ids are assumed unchanged.
+            last = current[-1] if current else None
+            depth = known.index(last) if last in known_set else -1
+            read = set(current)
+            current.extend(wallpaper_id for wallpaper_id in known[depth + 1:] if wallpaper_id not in read)
+            expected_pages = max(-(-len(current) // page.per_page), 1)
+            if depth < 0 or shifted or expected_pages != page.pages_count:
+                self.api.logger.info('{} of {} changed below page {}, walking the rest'.format(kind, username, number))
+                full = True
+                while page.next_page:
+                    number = page.next_page
+                    page = self._page(username, kind, number)
+                    fetched.extend(page.wallpapers)
+                pages = number
+                current = list(dict.fromkeys(wallpaper.id for wallpaper in fetched))
+
+        current_set = set(current)
+        added, added_ids = [], set()
+        for wallpaper in fetched:
+            if wallpaper.id not in known_set and wallpaper.id not in added_ids:
+                added_ids.add(wallpaper.id)
+                added.append(wallpaper)
+        removed = [wallpaper_id for wallpaper_id in known or () if wallpaper_id not in current_set]
+        with self._lock:
+            self._lists[key] = {'ids': current, 'newest': current[0] if current else None, 'count': len(current),
+                                'synced': time.time(), 'refreshes': refreshes}
+            self._save()
+        return SyncDelta(username, kind, added, removed, len(current), pages, full)
+
+    def _page(self, username, kind, number):
+        page = self.api.get_list_page(username, kind, number, revalidate=True)
+        if page is None:
+            raise PageFetchError(number)
+        return page
+
+    def known(self, username, kind='collection'):
+        """Returns the stored ids of a list, newest first, or None if it was never refreshed."""
+        with self._lock:
+            state = self._lists.get('{}:{}'.format(kind, username))
+            return list(state['ids']) if state else None
+
+    def watermark(self, username, kind='collection'):
+        """Returns a dict with the **newest** id, the **count** of wallpapers and the time the list was **synced**
+        (seconds since the epoch), or None if it was never refreshed."""
+        with self._lock:
+            state = self._lists.get('{}:{}'.format(kind, username))
+            return {name: state[name] for name in ('newest', 'count', 'synced')} if state else None
+
+    def forget(self, username, kind='collection'):
+        """Drops a list, so its next refresh starts over with a full walk."""
+        with self._lock:
+            if self._lists.pop('{}:{}'.format(kind, username), None) is not None:
+                self._save()
+
+    def _save(self):
+        if not self.path:
+            return
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'lists': self._lists}, f)
+        os.replace(temporary, self.path)
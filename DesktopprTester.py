@@ -3,12 +3,46 @@ Created on Jan 15, 2014
 
 @author: Mgamerz
 '''
+import asyncio
+import email.utils
+import hashlib
+import json
+import math
 import unittest
 import time
+import subprocess
 import sys
 import logging
 import random
+import sqlite3
+import os
+import pickle
+import tempfile
+import threading
 import DesktopprApi
+try:
+    import DesktopprAsync
+except ImportError:
+    #aiohttp is optional.
+    DesktopprAsync = None
+import DesktopprCache
+import DesktopprCatalog
+import DesktopprCodec
+import DesktopprCrawler
+import DesktopprFakeServer
+import DesktopprMetrics
+import DesktopprPrefetch
+import DesktopprRateLimit
+import DesktopprRetry
+import DesktopprScreenFit
+import DesktopprStore
+try:
+    import DesktopprFrame
+    import DesktopprPalette
+except ImportError:
+    #NumPy is optional.
+    DesktopprFrame = DesktopprPalette = None
+import DesktopprSync
 import requests
 
 testing_apikey = 'HCsYzq284U11q7ZfiH-s'
@@ -378,5 +412,920 @@ class Test(unittest.TestCase):
 
         #If wallpapers was false, there are no wallpapers in the collection.
 
+
+class OfflineTest(unittest.TestCase):
+    """Runs against a local DesktopprFakeServer, so it needs no network access or real account."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = DesktopprFakeServer.FakeDesktopprServer().start()
+        cls.data = cls.server.data
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def api(self, authorize=True, **kwargs):
+        api = DesktopprApi.DesktopprAPI(**kwargs)
+        api.baseurl = self.server.baseurl
+        if authorize:
+            self.assertTrue(api.authorize_API(self.data.apikey))
+        return api
+
+    def testAuthorization(self):
+        api = self.api(authorize=False)
+        self.assertFalse(api.authorize_API('TESTING_API_AUTHORIZATION'))
+        self.assertFalse(api.authorize_user_pass(self.data.authed_user, 'wrong'))
+        self.assertIsNone(api.like_wallpaper(1))
+        self.assertTrue(api.authorize_user_pass(self.data.authed_user, self.data.password))
+        self.assertEqual(api.apikey, self.data.apikey)
+
+    def testUserInfo(self):
+        api = self.api(authorize=False)
+        user = api.get_user_info('user3')
+        self.assertTrue(isinstance(user, DesktopprApi.User))
+        self.assertEqual(user.wallpapers_count, len(self.data.collections['user3']))
+        self.assertIsNone(api.get_user_info('HERPA_DERPA_HERP_DERP2'))
+
+    def testPagination(self):
+        api = self.api(authorize=False)
+        name = max(self.data.collections, key=lambda user: len(self.data.collections[user]))
+        page = api.get_user_collection(name)
+        self.assertTrue(isinstance(page, DesktopprApi.Page))
+        self.assertEqual(page.next_page, 2)
+        ids = [wallpaper.id for wallpaper in api.iter_user_collection(name)]
+        self.assertEqual(ids, self.data.collections[name])
+        streamed = [wallpaper.id for wallpaper in api.fetch_all_pages('get_user_collection', name, stream=True)]
+        self.assertEqual(streamed, ids)
+
+    def testIterPages(self):
+        api = self.api(authorize=False)
+        name = max(self.data.collections, key=lambda user: len(self.data.collections[user]))
+        expected = self.data.collections[name]
+        self.assertGreater(len(expected), 25)
+        walk = lambda **kwargs: [wallpaper.id for wallpaper in api.iter_user_collection(name, **kwargs)]
+        self.assertEqual(walk(prefetch=False), expected)
+        self.assertEqual(walk(start_page=2), expected[10:])
+        self.assertEqual(walk(max_items=15), expected[:15])
+        self.assertEqual(walk(max_items=15, prefetch=False), expected[:15])
+        self.assertEqual(walk(max_items=0), [])
+        self.assertEqual(walk(start_page=1000), [])
+        #No page past the last one needed is requested.
+        before = self.server.requests_served
+        self.assertEqual(walk(max_items=10), expected[:10])
+        self.assertEqual(self.server.requests_served - before, 1)
+
+        #A later page that fails once is requested again; one that keeps failing raises instead of ending the walk.
+        with DesktopprFakeServer.FakeDesktopprServer() as server:
+            expected = server.data.collections[name]
+            api = DesktopprApi.DesktopprAPI()
+            api.baseurl = server.baseurl
+            walk = iter(api.iter_user_collection(name, prefetch=False))
+            self.assertEqual([next(walk).id for _ in range(10)], expected[:10])
+            server.error_rate = 1.0
+            with self.assertRaises(DesktopprApi.PageFetchError) as raised:
+                next(walk)
+            self.assertEqual(raised.exception.page, 2)
+            server.error_rate = 0.0
+            requested = []
+
+            def flaky(page):
+                requested.append(page)
+                return None if requested.count(2) == 1 and page == 2 else api.get_user_collection(name, page)
+
+            ids = [wallpaper.id for wallpaper in api._iter_pages(flaky, 'wallpapers', 1, 25, True, retry_delay=0)]
+            self.assertEqual(ids, expected[:25])
+            self.assertEqual(requested, [1, 2, 2, 3])
+
+    def testLikes(self):
+        api = self.api()
+        me = api.authed_user
+        wallpaper_id = next(i for i in self.data.wallpapers if i not in self.data.likes[me])
+        self.assertFalse(api.check_if_liked(me, wallpaper_id))
+        self.assertTrue(api.like_wallpaper(wallpaper_id))
+        self.assertTrue(api.check_if_liked(me, wallpaper_id))
+        self.assertTrue(api.like_wallpaper(wallpaper_id))
+        self.assertTrue(api.unlike_wallpaper(wallpaper_id))
+        self.assertFalse(api.check_if_liked(me, wallpaper_id))
+        self.assertFalse(api.like_wallpaper('basdfasd'))
+
+    def testSyncAndFollow(self):
+        api = self.api()
+        me = api.authed_user
+        wallpaper_id = next(i for i in self.data.wallpapers if i not in self.data.collections[me])
+        self.assertTrue(api.sync_wallpaper(wallpaper_id))
+        self.assertTrue(api.check_if_synced(me, wallpaper_id))
+        self.assertTrue(api.unsync_wallpaper(wallpaper_id))
+        self.assertFalse(api.check_if_synced(me, wallpaper_id))
+        self.assertTrue(api.follow_user('user7'))
+        self.assertIn('user7', [user.username for user in api.iter_followed_users(me)])
+        self.assertTrue(api.unfollow_user('user7'))
+        self.assertFalse(api.follow_user('NON_EXISTENT_ACCOUNTX'))
+
+    def testFlagging(self):
+        api = self.api()
+        self.assertTrue(api.flag_wallpaper(5, 'flag_safe'))
+        self.assertIsNone(api.flag_wallpaper(5, 'flag_failure'))
+        self.assertFalse(api.flag_wallpaper(90000000, 'flag_safe'))
+
+    def testBulk(self):
+        api = self.api()
+        ids = [1, 2, 3, 90000000]
+        api.unlike_wallpapers(ids)
+        report = api.like_wallpapers(ids, workers=2)
+        self.assertEqual([result.status for result in report], ['ok', 'ok', 'ok', 'failed'])
+        self.assertEqual(report.failed[0].status_code, 404)
+        self.assertEqual(len(api.like_wallpapers(ids[:3]).already), 3)
+        self.assertEqual(api.check_liked_many(api.authed_user, ids[:3]), {1: True, 2: True, 3: True})
+
+    @unittest.skipIf(DesktopprAsync is None, 'needs aiohttp')
+    def testAsyncClient(self):
+        api = self.api()
+        name = api.authed_user
+        wallpaper_id = self.data.likes[name][0]
+
+        async def run():
+            async with DesktopprAsync.AsyncDesktopprAPI(max_concurrency=4) as client:
+                client.baseurl = self.server.baseurl
+                self.assertTrue(await client.authorize_API(self.data.apikey))
+                self.assertEqual(client.authed_user, name)
+                return await asyncio.gather(
+                    client.get_user_info('user3'), client.get_user_collection('user3', 2),
+                    client.get_wallpapers(3, 'all'), client.get_user_followers('user3'),
+                    client.get_followed_users('user3'), client.get_userlikes(name),
+                    client.check_if_liked(name, wallpaper_id), client.check_if_synced(name, 900000),
+                    client.get_user_info('HERPA_DERPA_HERP_DERP2'))
+
+        results = asyncio.run(run())
+        expected = [api.get_user_info('user3'), api.get_user_collection('user3', 2), api.get_wallpapers(3, 'all'),
+                    api.get_user_followers('user3'), api.get_followed_users('user3'), api.get_userlikes(name),
+                    api.check_if_liked(name, wallpaper_id), api.check_if_synced(name, 900000),
+                    api.get_user_info('HERPA_DERPA_HERP_DERP2')]
+        as_data = lambda result: ([item.to_dict() for item in result] if isinstance(result, list) else
+                                  result.to_dict() if isinstance(result, DesktopprApi._Model) else result)
+        self.assertEqual([as_data(result) for result in results], [as_data(result) for result in expected])
+
+    @unittest.skipIf(DesktopprAsync is None, 'needs aiohttp')
+    def testAsyncConcurrencyCap(self):
+        with DesktopprFakeServer.FakeDesktopprServer(latency=0.1) as server:
+            async def run():
+                async with DesktopprAsync.AsyncDesktopprAPI(max_concurrency=3) as client:
+                    client.baseurl = server.baseurl
+                    started = time.monotonic()
+                    users = await asyncio.gather(*(client.get_user_info('user{}'.format(i)) for i in range(12)))
+                    return users, time.monotonic() - started
+
+            users, elapsed = asyncio.run(run())
+            self.assertEqual([user.username for user in users], ['user{}'.format(i) for i in range(12)])
+            #12 requests of 0.1 s, 3 at a time: at least 4 rounds, and clearly not one after the other.
+            self.assertGreaterEqual(elapsed, 0.4)
+            self.assertLess(elapsed, 1.0)
+
+    @unittest.skipIf(DesktopprAsync is None, 'needs aiohttp')
+    def testAsyncTimeout(self):
+        with DesktopprFakeServer.FakeDesktopprServer(latency=0.5) as server:
+            async def run(**kwargs):
+                async with DesktopprAsync.AsyncDesktopprAPI(**kwargs) as client:
+                    client.baseurl = server.baseurl
+                    started = time.monotonic()
+                    user = await client.get_user_info('user1')
+                    return user, time.monotonic() - started
+
+            #A server slower than the timeout is given up on, not waited for.
+            user, elapsed = asyncio.run(run(timeout=0.1))
+            self.assertIsNone(user)
+            self.assertLess(elapsed, 0.4)
+            user, elapsed = asyncio.run(run(timeout=(1, 2)))
+            self.assertEqual(user.username, 'user1')
+
+    def testMembershipRequests(self):
+        api = self.api(authorize=False, membership_ttl=60)
+        records = []
+        api.add_listener(records.append)
+        name = next(name for name, likes in sorted(self.data.likes.items()) if len(likes) > 4 * self.data.per_page)
+        likes = self.data.likes[name]
+        pages = -(-len(likes) // self.data.per_page)
+        later = likes[self.data.per_page:]
+        #As many ids past page 1 as there are pages after it: the index costs no more, so it is built.
+        ids = later[:pages - 1]
+        self.assertEqual(api.check_liked_many(name, ids), {wallpaper_id: True for wallpaper_id in ids})
+        self.assertEqual(len(records), pages)
+        #Answered from the index.
+        self.assertEqual(api.check_liked_many(name, likes[:3] + [900000]), {likes[0]: True, likes[1]: True,
+                                                                            likes[2]: True, 900000: False})
+        self.assertEqual(len(records), pages)
+        #One fewer: page 1 and the single checks are cheaper.
+        api.forget_membership(name)
+        del records[:]
+        ids = likes[:2] + later[:pages - 2]
+        self.assertEqual(api.check_liked_many(name, ids), {wallpaper_id: True for wallpaper_id in ids})
+        self.assertEqual(len(records), 1 + pages - 2)
+
+        #Indexes of users other than the authorized one expire.
+        api.check_liked_many(name, later[:pages - 1])
+        del records[:]
+        api.membership_ttl = 0
+        api.check_liked_many(name, later[:pages - 1])
+        self.assertEqual(len(records), pages)
+
+    def testRetryPolicy(self):
+        with DesktopprFakeServer.FakeDesktopprServer(error_rate=1.0, error_status=503) as server:
+            policy = DesktopprRetry.RetryPolicy(retries=2, backoff=0.05, jitter=False)
+            api = DesktopprApi.DesktopprAPI(retry=policy)
+            api.baseurl = server.baseurl
+            started = time.monotonic()
+            self.assertIsNone(api.get_user_info('user1'))
+            #Gave up after the first attempt and 2 retries, waiting 0.05 then 0.1 seconds.
+            self.assertEqual(server.requests_served, 3)
+            self.assertGreaterEqual(time.monotonic() - started, 0.15)
+            self.assertEqual([policy.delay(attempt) for attempt in range(4)], [0.05, 0.1, 0.2, 0.4])
+            #POSTs aren't retried.
+            server.error_rate = 0.0
+            api.authorize_API(server.data.apikey)
+            server.error_rate = 1.0
+            server.requests_served = 0
+            api.like_wallpaper(1)
+            self.assertEqual(server.requests_served, 1)
+
+            #A hung server times out, and timeouts are retried.
+            server.error_rate = 0.0
+            server.latency = 0.5
+            api.timeout = 0.1
+            server.requests_served = 0
+            records = []
+            api.add_listener(records.append)
+            self.assertIsNone(api.get_user_info('user1'))
+            self.assertIsInstance(records[0].error, requests.Timeout)
+            self.assertEqual(records[0].retries, 2)
+            #The server counts a request once its delay is over.
+            time.sleep(0.5)
+            self.assertEqual(server.requests_served, 3)
+            server.latency = 0.0
+            api.timeout = 5
+            self.assertEqual(api.get_user_info('user1').username, 'user1')
+
+    def testRateLimiter(self):
+        limiter = DesktopprRateLimit.RateLimiter(read_rate=20, write_rate=2, burst=2)
+        #Two requests go out at once, then one every 1/20 s. Writes have their own bucket.
+        delays = [limiter.reserve('read') for _ in range(5)]
+        for delay, expected in zip(delays, (0.0, 0.0, 0.05, 0.1, 0.15)):
+            self.assertAlmostEqual(delay, expected, delta=0.01)
+        self.assertAlmostEqual(limiter.reserve('write'), 0.0, delta=0.01)
+        started = time.monotonic()
+        limiter.acquire('read')
+        self.assertAlmostEqual(time.monotonic() - started, 0.2, delta=0.05)
+        self.assertAlmostEqual(limiter.stats()['read']['waited'], 0.2, delta=0.02)
+
+        #Throttling pauses every class: for Retry-After seconds or an HTTP date, else with a doubling backoff.
+        limiter = DesktopprRateLimit.RateLimiter(burst=1, backoff=0.5, max_backoff=4)
+        self.assertAlmostEqual(limiter.throttled('0.3'), 0.3)
+        self.assertGreater(limiter.reserve('write'), 0.25)
+        self.assertEqual([limiter.throttled(None, attempt) for attempt in range(5)], [0.5, 1.0, 2.0, 4.0, 4.0])
+        self.assertEqual(limiter.throttled('garbage', 1), 1.0)
+        self.assertEqual(limiter.stats()['throttled'], 7)
+        timezone = os.environ.get('TZ')
+        try:
+            #HTTP dates are UTC whatever the local time zone, including dates written with -0000.
+            os.environ['TZ'] = 'Asia/Tokyo'
+            time.tzset()
+            for usegmt in (True, False):
+                retry_after = email.utils.formatdate(time.time() + 30, usegmt=usegmt)
+                self.assertAlmostEqual(DesktopprRateLimit._parse_retry_after(retry_after), 30, delta=1.5)
+        finally:
+            if timezone is None:
+                del os.environ['TZ']
+            else:
+                os.environ['TZ'] = timezone
+            time.tzset()
+
+    def testRateLimitedRequests(self):
+        with DesktopprFakeServer.FakeDesktopprServer(error_rate=1.0, error_status=429, retry_after=0.2) as server:
+            limiter = DesktopprRateLimit.RateLimiter(max_retries=2)
+            api = DesktopprApi.DesktopprAPI(rate_limit=limiter)
+            api.baseurl = server.baseurl
+            started = time.monotonic()
+            with self.assertRaises(DesktopprApi.RateLimitedError) as raised:
+                api.get_user_info('user1')
+            #The first attempt and 2 retries, each retry waiting the 0.2 seconds the server asked for.
+            self.assertEqual((raised.exception.status_code, server.requests_served), (429, 3))
+            self.assertGreaterEqual(time.monotonic() - started, 0.4)
+            self.assertEqual(limiter.stats()['throttled'], 2)
+
+            #A throttled request that is let through on a retry succeeds.
+            server.error_rate = 0.5
+            server.retry_after = 0
+            limiter.max_retries = 20
+            for _ in range(10):
+                self.assertEqual(api.get_user_info('user1').username, 'user1')
+
+    def testCircuitBreaker(self):
+        with DesktopprFakeServer.FakeDesktopprServer(error_rate=1.0, latency=0.3) as server:
+            breaker = DesktopprRetry.CircuitBreaker(min_requests=2, cooldown=0.3)
+            api = DesktopprApi.DesktopprAPI(circuit_breaker=breaker, timeout=0.1)
+            api.baseurl = server.baseurl
+            records = []
+            api.add_listener(records.append)
+            #A timeout and a 500 open it.
+            self.assertIsNone(api.get_user_info('user1'))
+            self.assertIsInstance(records[0].error, requests.Timeout)
+            self.assertEqual(breaker.stats()['failures'], 1)
+            self.assertEqual(breaker.state, DesktopprRetry.CLOSED)
+            server.latency = 0.0
+            api.timeout = 5
+            self.assertIsNone(api.get_user_info('user1'))
+            self.assertEqual(breaker.state, DesktopprRetry.OPEN)
+            served = server.requests_served
+            self.assertRaises(DesktopprApi.CircuitOpenError, api.get_user_info, 'user1')
+            self.assertEqual(server.requests_served, served)
+            self.assertEqual(breaker.stats()['rejected'], 1)
+
+            #After the cool-down, a failed probe reopens it and a good one closes it.
+            time.sleep(0.35)
+            self.assertEqual(breaker.state, DesktopprRetry.HALF_OPEN)
+            self.assertIsNone(api.get_user_info('user1'))
+            self.assertEqual(breaker.state, DesktopprRetry.OPEN)
+            time.sleep(0.35)
+            server.error_rate = 0.0
+            self.assertEqual(api.get_user_info('user1').username, 'user1')
+            self.assertEqual(breaker.state, DesktopprRetry.CLOSED)
+            self.assertEqual(breaker.stats()['times_opened'], 2)
+
+    def testCacheInvalidation(self):
+        api = self.api(cache=True)
+        me = api.authed_user
+        first = api.get_userlikes(me)
+        self.assertEqual(api.get_userlikes(me).wallpapers[0].id, first.wallpapers[0].id)
+        self.assertEqual(api.cache.stats()['hits'], 1)
+        wallpaper_id = next(i for i in self.data.wallpapers if i not in self.data.likes[me])
+        api.like_wallpaper(wallpaper_id)
+        self.assertEqual(api.get_userlikes(me).wallpapers[0].id, wallpaper_id)
+
+    def testCacheExactInvalidation(self):
+        api = self.api(cache=True)
+        me = api.authed_user
+        records = []
+        api.add_listener(records.append)
+        reads = (lambda: api.get_user_info(me), lambda: api.get_user_collection(me), lambda: api.get_userlikes(me),
+                 lambda: api.get_user_followers(me), lambda: api.get_followed_users(me))
+        for read in reads:
+            read()
+        wallpaper_id = next(i for i in self.data.wallpapers if i not in self.data.collections[me])
+        api.sync_wallpaper(wallpaper_id)
+        del records[:]
+        for read in reads:
+            read()
+        #Only the profile and the collection changed; likes and follows are still served from the cache.
+        self.assertEqual([(record.endpoint, record.cached) for record in records],
+                         [('users/{}', False), ('users/{}/wallpapers', False), ('users/{}/likes', True),
+                          ('users/{}/followers', True), ('users/{}/following', True)])
+        self.assertEqual(api.get_user_collection(me).wallpapers[0].id, wallpaper_id)
+
+    def testCacheExpiry(self):
+        cache = DesktopprCache.ResponseCache(ttls={'users/{}': 0.2})
+        api = self.api(authorize=False, cache=cache)
+        before = self.server.requests_served
+        self.assertEqual(api.get_user_info('user1').username, 'user1')
+        self.assertEqual(api.get_user_info('user1').username, 'user1')
+        self.assertEqual(cache.stats()['hits'], 1)
+        time.sleep(0.3)
+        #The stale entry is sent with If-None-Match, and the server's 304 renews it without a body.
+        self.assertEqual(api.get_user_info('user1').username, 'user1')
+        stats = cache.stats()
+        self.assertEqual((stats['misses'], stats['revalidations']), (2, 1))
+        self.assertEqual(self.server.requests_served - before, 2)
+        self.assertEqual(api.get_user_info('user1').username, 'user1')
+        self.assertEqual(cache.stats()['hits'], 2)
+
+    def testCacheEviction(self):
+        cache = DesktopprCache.ResponseCache(max_entries=2)
+        api = self.api(authorize=False, cache=cache)
+        api.get_user_info('user1')
+        api.get_user_info('user2')
+        #Reading user1 again makes user2 the least recently used entry.
+        api.get_user_info('user1')
+        api.get_user_info('user3')
+        stats = cache.stats()
+        self.assertEqual((stats['evictions'], stats['size']), (1, 2))
+        self.assertIsNotNone(cache.lookup(cache.key('users/user1')))
+        self.assertIsNone(cache.lookup(cache.key('users/user2')))
+        self.assertIsNotNone(cache.lookup(cache.key('users/user3')))
+
+    def testDownloadResume(self):
+        api = self.api(authorize=False)
+        wallpaper = DesktopprApi.Wallpaper(self.data.wallpapers[1])
+        with tempfile.TemporaryDirectory() as directory:
+            report = api.download_wallpapers([wallpaper], os.path.join(directory, 'complete'))
+            self.assertEqual(report.results[0].status, 'downloaded')
+            with open(report.results[0].path, 'rb') as f:
+                content = f.read()
+            self.assertEqual(len(content), wallpaper.bytes)
+            self.assertEqual(api.download_wallpapers([wallpaper], os.path.join(directory, 'complete'))
+                             .results[0].status, 'skipped')
+
+            half = len(content) // 2
+            partial = os.path.join(directory, 'partial', '1.jpg.part')
+            for validator, status, received in (('"1-full-{}"'.format(wallpaper.bytes), 'resumed', len(content) - half),
+                                                ('"changed"', 'downloaded', len(content))):
+                #A partial file left by an interrupted run, with the ETag the server sent when it began.
+                os.makedirs(os.path.dirname(partial), exist_ok=True)
+                with open(partial, 'wb') as f:
+                    f.write(content[:half])
+                with open(partial + '.validator', 'w') as f:
+                    f.write(validator)
+                result = api.download_wallpapers([wallpaper], os.path.dirname(partial)).results[0]
+                self.assertEqual((result.status, result.received), (status, received))
+                with open(result.path, 'rb') as f:
+                    self.assertEqual(f.read(), content)
+                self.assertFalse(os.path.exists(partial) or os.path.exists(partial + '.validator'))
+                os.remove(result.path)
+
+            #The server's image isn't the size the wallpaper's info says.
+            wrong = DesktopprApi.Wallpaper(dict(self.data.wallpapers[2], bytes=self.data.wallpapers[2]['bytes'] + 1))
+            result = api.download_wallpapers([wrong], os.path.join(directory, 'wrong')).results[0]
+            self.assertEqual(result.status, 'failed')
+            self.assertTrue(result.error.startswith('size mismatch'))
+            self.assertEqual(os.listdir(os.path.join(directory, 'wrong')), [])
+
+    def testWallpaperStore(self):
+        api = self.api(authorize=False)
+        wallpapers = [DesktopprApi.Wallpaper(self.data.wallpapers[i]) for i in (3, 4)]
+        with tempfile.TemporaryDirectory() as directory:
+            root = os.path.join(directory, 'store')
+            with DesktopprStore.WallpaperStore(root) as store:
+                sources = []
+                for name in ('a', 'b', 'c'):
+                    sources.append(os.path.join(directory, name))
+                    with open(sources[-1], 'wb') as f:
+                        f.write(b'same' if name != 'c' else b'other')
+                first = store.add(10, 'full', sources[0])
+                #Equal content is kept once, whatever the id or variant.
+                self.assertEqual(store.add(11, 'thumb', sources[1]), first)
+                self.assertNotEqual(store.add(12, 'full', sources[2]), first)
+                self.assertFalse(any(os.path.exists(source) for source in sources))
+                self.assertEqual(store.stats(), {'images': 3, 'objects': 2, 'duplicates': 1})
+                self.assertEqual(store.digest(11, 'thumb'), hashlib.sha256(b'same').hexdigest())
+                self.assertTrue(store.has_digest(hashlib.sha256(b'other').hexdigest()))
+                self.assertFalse(store.has(11))
+
+                report = api.download_wallpapers(wallpapers, os.path.join(directory, 'first'), store=store)
+                self.assertEqual([result.status for result in report.results], ['downloaded', 'downloaded'])
+                before = self.server.requests_served
+                report = api.download_wallpapers(wallpapers, os.path.join(directory, 'second'), store=store)
+                self.assertEqual([result.status for result in report.results], ['stored', 'stored'])
+                self.assertEqual((report.bytes_received, self.server.requests_served), (0, before))
+                for result, wallpaper in zip(report.results, wallpapers):
+                    self.assertEqual(os.path.getsize(result.path), wallpaper.bytes)
+            #The index is read back when the store is opened again.
+            with DesktopprStore.WallpaperStore(root) as store:
+                self.assertEqual(store.stats(), {'images': 5, 'objects': 4, 'duplicates': 1})
+                self.assertTrue(store.has(wallpapers[0].id))
+                self.assertEqual(store.path(11, 'thumb'), first)
+
+    def testLazyPages(self):
+        username = next(name for name, ids in self.data.collections.items() if len(ids) > self.data.per_page)
+        eager = self.api(authorize=False).get_user_collection(username)
+        page = self.api(authorize=False, lazy_pages=True).get_user_collection(username)
+        wallpapers = page.wallpapers
+        self.assertIsInstance(wallpapers, DesktopprApi._LazyModels)
+        self.assertEqual((page.pages_count, len(wallpapers)), (eager.pages_count, len(eager.wallpapers)))
+        self.assertEqual(wallpapers._built, 0)
+        #Only what is indexed is built, and it is built once.
+        last = wallpapers[-1]
+        self.assertEqual(last.id, eager.wallpapers[-1].id)
+        self.assertIs(wallpapers[len(wallpapers) - 1], last)
+        self.assertEqual(wallpapers._built, 1)
+        self.assertEqual([wallpaper.id for wallpaper in wallpapers[1:5:2]],
+                         [wallpaper.id for wallpaper in eager.wallpapers[1:5:2]])
+        self.assertEqual(wallpapers._built, 3)
+        self.assertEqual(wallpapers[-3:], list(wallpapers)[-3:])
+        self.assertEqual(repr(wallpapers), '<Wallpaper {0} of {0} built>'.format(len(wallpapers)))
+        with self.assertRaises(IndexError):
+            wallpapers[len(wallpapers)]
+        username = next(name for name, names in self.data.following.items() if len(names) > 1)
+        users = self.api(authorize=False, lazy_pages=True).get_followed_users(username).users
+        first = next(iter(users))
+        self.assertEqual((users._built, first.username), (1, users[0].username))
+        #The json list is let go once every object is built.
+        self.assertIsNone(wallpapers._raw)
+        self.assertEqual(page.to_dict(), eager.to_dict())
+        self.assertEqual(pickle.loads(pickle.dumps(page)).to_dict(), eager.to_dict())
+
+    def testLazyPagesThreads(self):
+        info = {'response': list(self.data.wallpapers.values())[:50], 'count': 50,
+                'pagination': {'current': 1, 'previous': None, 'next': None, 'per_page': 50, 'pages': 1}}
+        errors = []
+
+        def read(wallpapers, barrier, order):
+            barrier.wait()
+            try:
+                for index in order:
+                    self.assertIs(wallpapers[index], wallpapers[index])
+            except Exception as e:
+                errors.append(e)
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for _ in range(20):
+                wallpapers = DesktopprApi.Page('wallpapers', info, lazy=True).wallpapers
+                barrier = threading.Barrier(8)
+                orders = [list(range(50)), list(range(-1, -51, -1))] * 4
+                threads = [threading.Thread(target=read, args=(wallpapers, barrier, order)) for order in orders]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                self.assertEqual(errors, [])
+                self.assertEqual(wallpapers._built, 50)
+                self.assertIsNone(wallpapers._raw)
+                self.assertEqual([wallpaper.id for wallpaper in wallpapers], [item['id'] for item in info['response']])
+        finally:
+            sys.setswitchinterval(interval)
+
+    def testConnectionReuse(self):
+        api = self.api(authorize=False)
+        self.assertEqual(api.connection_stats(), {'requests': 0, 'connections': 0, 'reused': 0, 'reuse_ratio': 0.0})
+        for i in range(10):
+            api.get_user_info('user{}'.format(i))
+        #Error statuses don't close the connection either.
+        self.assertIsNone(api.get_user_info('HERPA_DERPA_HERP_DERP2'))
+        api.get_user_collection('user1')
+        self.assertEqual(api.connection_stats(), {'requests': 12, 'connections': 1, 'reused': 11,
+                                                  'reuse_ratio': 11 / 12})
+        api.close()
+        api.get_user_info('user1')
+        self.assertEqual(api.connection_stats()['connections'], 2)
+
+    def testJsonDecoder(self):
+        api = self.api(authorize=False)
+        bodies = []
+
+        def decoder(content):
+            bodies.append(content)
+            return json.loads(content)
+
+        try:
+            DesktopprApi.set_json_decoder(decoder)
+            self.assertEqual(api.get_user_info('user1').username, 'user1')
+            self.assertEqual(len(bodies), 1)
+            self.assertEqual(json.loads(bodies[0])['response']['username'], 'user1')
+        finally:
+            DesktopprApi.set_json_decoder(None)
+        #None goes back to the default decoder.
+        self.assertEqual(api.get_user_info('user2').username, 'user2')
+        self.assertEqual(len(bodies), 1)
+        self.assertIsNot(DesktopprApi._json_decoder, decoder)
+
+    def testInstrumentation(self):
+        api = self.api(authorize=False, cache=True)
+        records = []
+        metrics = DesktopprMetrics.MetricsAggregator()
+        api.add_listener(records.append)
+        api.add_listener(metrics)
+        api.get_user_collection('user1')
+        api.get_user_collection('user1')
+        api.get_user_info('HERPA_DERPA_HERP_DERP2')
+        self.assertEqual([(record.endpoint, record.status, record.cached) for record in records],
+                         [('users/{}/wallpapers', 200, False), ('users/{}/wallpapers', 200, True),
+                          ('users/{}', 404, False)])
+        self.assertGreater(records[0].bytes, 0)
+        self.assertGreaterEqual(records[0].total, records[0].ttfb + records[0].body + records[0].decode)
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['GET users/{}/wallpapers']['requests'], 2)
+        self.assertEqual(snapshot['GET users/{}']['errors'], 1)
+        self.assertIn('desktoppr_requests_total{endpoint="users/{}",method="GET",status="404"} 1',
+                      metrics.prometheus())
+
+    def testCrawler(self):
+        expected = {(follower, followed) for follower, followed_users in self.data.following.items()
+                    for followed in followed_users}
+        crawler = DesktopprCrawler.FollowGraphCrawler(self.api(authorize=False), ['user0'])
+        edges = list(crawler.crawl())
+        self.assertEqual(len(edges), len(set(edges)))
+        self.assertEqual(set(edges), expected)
+
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = os.path.join(directory, 'crawl.json')
+            edges_path = os.path.join(directory, 'edges.tsv')
+            crawler = DesktopprCrawler.FollowGraphCrawler(self.api(authorize=False), ['user0'], checkpoint=checkpoint,
+                                                          checkpoint_every=5, edges_path=edges_path)
+            crawl = crawler.crawl()
+            for _ in range(len(expected) // 3):
+                next(crawl)
+            crawl.close()
+            self.assertLess(len(crawler.visited), len(self.data.users))
+            resumed = DesktopprCrawler.FollowGraphCrawler(self.api(authorize=False), checkpoint=checkpoint,
+                                                          edges_path=edges_path)
+            list(resumed.crawl())
+            with open(edges_path) as f:
+                stored = [tuple(line.rstrip('\n').split('\t')) for line in f]
+        self.assertEqual(len(stored), len(set(stored)))
+        self.assertEqual(set(stored), expected)
+        self.assertEqual(resumed.edges_found, len(expected))
+
+    def testIncrementalSync(self):
+        likes = self.data.likes['user3']
+        self.addCleanup(likes.__setitem__, slice(None), list(likes))
+        likes[:] = [wallpaper_id for wallpaper_id in range(1, 201) if wallpaper_id % 3]
+        sync = DesktopprSync.IncrementalSync(self.api(authorize=False))
+        delta = sync.refresh('user3', 'likes')
+        self.assertTrue(delta.full)
+        self.assertEqual([wallpaper.id for wallpaper in delta.added], likes)
+
+        delta = sync.refresh('user3', 'likes')
+        self.assertFalse(delta)
+        self.assertEqual(delta.pages, 1)
+
+        likes[0:0] = [3, 6, 9]
+        removed = likes.pop(10)
+        delta = sync.refresh('user3', 'likes')
+        self.assertFalse(delta.full)
+        self.assertEqual(delta.pages, 2)
+        self.assertEqual([wallpaper.id for wallpaper in delta.added], [3, 6, 9])
+        self.assertEqual(delta.removed, [removed])
+        self.assertEqual(sync.known('user3', 'likes'), likes)
+
+        #Removing one wallpaper deep down changes the page count, so the whole list is walked.
+        while len(likes) % self.data.per_page != 1:
+            likes.pop()
+        sync.forget('user3', 'likes')
+        sync.refresh('user3', 'likes')
+        removed = likes.pop(-5)
+        delta = sync.refresh('user3', 'likes')
+        self.assertTrue(delta.full)
+        self.assertEqual(delta.removed, [removed])
+        self.assertEqual(sync.watermark('user3', 'likes')['count'], len(likes))
+
+        #Cached pages are checked with the server, so a refresh sees changes made while they are still fresh.
+        api = self.api(authorize=False, cache=True)
+        sync = DesktopprSync.IncrementalSync(api)
+        sync.refresh('user3', 'likes')
+        self.assertFalse(sync.refresh('user3', 'likes'))
+        self.assertEqual(api.cache.stats()['revalidations'], 1)
+        likes.insert(0, 300)
+        delta = sync.refresh('user3', 'likes')
+        self.assertEqual([wallpaper.id for wallpaper in delta.added], [300])
+        self.assertEqual(api.get_list_page('user3', 'likes').wallpapers[0].id, 300)
+        self.assertIsNone(api.get_list_page('user3', 'follows'))
+        with self.assertRaises(ValueError):
+            sync.refresh('user3', 'follows')
+        api.lazy_pages = True
+        page = api.get_list_page('user3', 'likes', revalidate=True)
+        self.assertIsInstance(page.wallpapers, DesktopprApi._LazyModels)
+        self.assertEqual(page.wallpapers[0].id, 300)
+
+    def testCatalog(self):
+        api = self.api(authorize=False)
+        wallpapers = api.fetch_all_pages('get_wallpapers', safefilter='all')
+        with DesktopprCatalog.Catalog(batch_size=64) as catalog:
+            self.assertEqual(catalog.add(wallpapers, api.get_user_followers('user2')),
+                             len(wallpapers) + len(api.get_user_followers('user2').users))
+            self.assertEqual(catalog.add_likes('user2', api.iter_userlikes('user2')), len(self.data.likes['user2']))
+            stored = catalog.wallpaper(wallpapers[0].id)
+            self.assertIsInstance(stored, DesktopprApi.Wallpaper)
+            self.assertEqual(str(stored), str(wallpapers[0]))
+            self.assertEqual(sorted(wallpaper.id for wallpaper in catalog.likes('user2')),
+                             sorted(self.data.likes['user2']))
+
+            uploader = wallpapers[0].uploader
+            expected = sorted((wallpaper for wallpaper in wallpapers
+                               if wallpaper.uploader == uploader and wallpaper.width >= 1920),
+                              key=lambda wallpaper: (-wallpaper.likes_count, wallpaper.id))
+            self.assertEqual([wallpaper.id for wallpaper in catalog.wallpapers(uploader=uploader, min_width=1920,
+                                                                               order='likes')],
+                             [wallpaper.id for wallpaper in expected])
+
+            catalog.add(DesktopprApi.Wallpaper({'id': wallpapers[0].id, 'likes_count': 12345}), partial=True)
+            self.assertEqual(catalog.wallpaper(wallpapers[0].id).likes_count, 12345)
+            self.assertEqual(catalog.wallpaper(wallpapers[0].id).uploader, uploader)
+            #A complete object replaces the row: an uploader who deleted their account is cleared.
+            orphan = dict(wallpapers[0].to_dict(), uploader=None)
+            catalog.add(DesktopprApi.Wallpaper(orphan))
+            self.assertIsNone(catalog.wallpaper(wallpapers[0].id).uploader)
+            self.assertEqual(catalog.wallpaper(wallpapers[0].id).likes_count, wallpapers[0].likes_count)
+            self.assertNotIn(wallpapers[0].id, [wallpaper.id for wallpaper in catalog.wallpapers(uploader=uploader)])
+
+        with DesktopprCatalog.Catalog(batch_size=2) as catalog:
+            catalog.add_collection('user2', [1, 2, 3])
+            self.assertEqual(catalog.add_collection('user2', [4, 5, 6, 7], replace=True), 4)
+            self.assertEqual(catalog.counts()['collections'], 4)
+            #A replacement that fails part way leaves the old list whole, however many batches it spans.
+            with self.assertRaises(sqlite3.Error):
+                catalog.add_collection('user2', [8, 9, 10, object()], replace=True)
+            self.assertEqual(catalog._column('SELECT wallpaper_id FROM collections ORDER BY wallpaper_id', ()),
+                             [4, 5, 6, 7])
+
+    def testRandomPool(self):
+        with DesktopprPrefetch.RandomWallpaperPool(self.api(authorize=False), depth=4, workers=2) as pool:
+            pool.warm(safefilters=['all'], users=['user5'])
+            deadline = time.monotonic() + 5
+            while pool.stats()['buffers'] != {'safefilter:all': 4, 'user:user5': 4} and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertIn(pool.pop_user('user5').id, self.data.collections['user5'])
+            ids = [pool.pop('all').id for _ in range(20)]
+            self.assertEqual(len(ids), len(set(ids)))
+            stats = pool.stats()
+            self.assertEqual(stats['hits'] + stats['misses'], 21)
+            self.assertGreaterEqual(stats['hits'], 2)
+            self.assertGreater(stats['refill_latency']['p50'], 0)
+            self.assertRaises(ValueError, pool.pop, 'bad')
+
+        #Past max_buffers, the least recently used buffer is dropped with its queued fetches.
+        with DesktopprPrefetch.RandomWallpaperPool(self.api(authorize=False), depth=50, workers=1, recent=0,
+                                                   max_buffers=2) as pool:
+            pool.warm(users=['user1', 'user2'])
+            self.assertIsNotNone(pool.pop_user('user1'))
+            first = pool._buffers[('user', 'user2')]
+            self.assertIsNotNone(pool.pop_user('user3'))
+            stats = pool.stats()
+            self.assertEqual(sorted(stats['buffers']), ['user:user1', 'user:user3'])
+            self.assertEqual(stats['evicted'], 1)
+            self.assertTrue(first.evicted)
+            self.assertFalse(first.wallpapers)
+            #Of the 50 fetches it had queued, at most the one running on the single worker is left.
+            self.assertLessEqual(len(first.futures), 1)
+            #recent=0 only turns off the repeat check.
+            for _ in range(5):
+                self.assertIn(pool.pop_user('user3').id, self.data.collections['user3'])
+        self.assertRaises(ValueError, DesktopprPrefetch.RandomWallpaperPool, None, max_buffers=0)
+
+    @unittest.skipIf(DesktopprFrame is None, 'needs numpy')
+    def testWallpaperFrame(self):
+        wallpapers = self.api(authorize=False).fetch_all_pages('get_wallpapers', safefilter='all')
+        frame = DesktopprFrame.WallpaperFrame.from_wallpapers(wallpapers)
+        self.assertEqual(len(frame), len(wallpapers))
+        self.assertEqual(frame.id.tolist(), [wallpaper.id for wallpaper in wallpapers])
+        self.assertEqual(frame.wallpapers(), wallpapers)
+        safe = frame[frame.state_mask('safe')]
+        self.assertEqual(safe.id.tolist(), [wallpaper.id for wallpaper in wallpapers
+                                            if wallpaper.review_state == 'safe'])
+
+        by_likes = sorted(wallpapers, key=lambda wallpaper: -wallpaper.likes_count)
+        self.assertEqual(frame.sort_by('likes_count', descending=True).id.tolist(),
+                         [wallpaper.id for wallpaper in by_likes])
+        #Ties at the k-th row may be broken either way.
+        self.assertEqual(frame.top_k('likes_count', 7).likes_count.tolist(),
+                         [wallpaper.likes_count for wallpaper in by_likes[:7]])
+        by_date = sorted(wallpapers, key=lambda wallpaper: wallpaper.created_at)
+        self.assertEqual(frame.sort_by('created_at').id.tolist(), [wallpaper.id for wallpaper in by_date])
+        self.assertEqual(len(frame.top_k('bytes', 0)), 0)
+
+        #Missing fields are -1 and NaT, and sort as the smallest values either way.
+        sparse = DesktopprFrame.WallpaperFrame.from_pages([DesktopprApi.Page('wallpapers', {
+            'response': [{'id': 2, 'review_state': 'unknown'}, {'id': 3, 'created_at': '2014-01-02T00:00:00Z'},
+                         {'id': 1, 'created_at': '2013-01-02T00:00:00Z', 'width': 1920, 'height': 1080}],
+            'count': 3, 'pagination': {'current': 1, 'previous': None, 'next': None, 'per_page': 3, 'pages': 1}}),
+            None])
+        self.assertEqual(sparse.width.tolist(), [-1, -1, 1920])
+        self.assertEqual(sparse.review_state.tolist(), [-1, -1, -1])
+        self.assertTrue(DesktopprFrame.numpy.isnat(sparse.created_at[0]))
+        self.assertEqual(sparse.sort_by('created_at', descending=True).id.tolist(), [3, 1, 2])
+        self.assertEqual(sparse.sort_by('created_at').id.tolist(), [2, 1, 3])
+        self.assertEqual(sparse.top_k('created_at', 1).id.tolist(), [3])
+        self.assertEqual(sparse.top_k('created_at', 3).id.tolist(), [3, 1, 2])
+        self.assertEqual(sparse.sort_by('width', descending=True).id.tolist(), [1, 2, 3])
+
+    @unittest.skipIf(DesktopprPalette is None, 'needs numpy')
+    def testPaletteIndex(self):
+        wallpapers = self.api(authorize=False).fetch_all_pages('get_wallpapers', safefilter='all')
+        index = DesktopprPalette.PaletteIndex()
+        for start in range(0, len(wallpapers), 50):
+            index.add(wallpapers[start:start + 50])
+        self.assertEqual(len(index), len(wallpapers))
+
+        target = wallpapers[7]
+        results = index.similar(target.id, k=5)
+        self.assertNotIn(target.id, [wallpaper.id for wallpaper, _ in results])
+        vector = index.features(target.palette)
+        expected = sorted((wallpaper for wallpaper in wallpapers if wallpaper.id != target.id),
+                          key=lambda wallpaper: ((index.features(wallpaper.palette) - vector) ** 2).sum())[:5]
+        self.assertEqual([wallpaper.id for wallpaper, _ in results], [wallpaper.id for wallpaper in expected])
+        self.assertEqual([distance for _, distance in results], sorted(distance for _, distance in results))
+
+        red = DesktopprApi.Wallpaper({'id': 10 ** 6, 'palette': ['FF0000', 'F80000', 'FF0A0A', 'E00000', 'FF1010']})
+        index.add([red])
+        wallpaper, distance = index.by_color('#FE0101', k=1)[0]
+        self.assertEqual(wallpaper.id, red.id)
+        self.assertLess(distance, 0.1)
+
+        #Ids as NumPy integers, such as those of a DesktopprFrame, work too.
+        self.assertEqual(index.similar(DesktopprPalette.numpy.int64(target.id), k=5), results)
+        #A malformed palette is skipped without losing the rest of the batch.
+        broken = [DesktopprApi.Wallpaper({'id': 10 ** 6 + i, 'palette': palette})
+                  for i, palette in enumerate((['FF0000', 'not a colour'], ['12345'], [None], ['#00FF00']), 1)]
+        self.assertEqual(index.add(broken), 1)
+        self.assertEqual(len(index), len(wallpapers) + 2)
+        self.assertEqual(index.by_color('00FF00', k=1)[0][0].id, broken[-1].id)
+
+    def testScreenFitIndex(self):
+        wallpapers = self.api(authorize=False).fetch_all_pages('get_wallpapers', safefilter='all')
+        index = DesktopprScreenFit.ScreenFitIndex()
+        for start in range(0, len(wallpapers), 50):
+            index.add(wallpapers[start:start + 50])
+        self.assertEqual(len(index), len(wallpapers))
+
+        def expected(width, height, tolerance, k):
+            fitting = [wallpaper for wallpaper in wallpapers if wallpaper.width >= width and
+                       wallpaper.height >= height and
+                       abs(math.log(wallpaper.width / wallpaper.height / (width / height))) <= math.log1p(tolerance)]
+            fitting.sort(key=lambda wallpaper: (-wallpaper.likes_count, wallpaper.id))
+            return [wallpaper.id for wallpaper in fitting[:k]]
+
+        for width, height in ((1920, 1080), (2560, 1440), (1280, 1024), (3840, 2160)):
+            self.assertEqual([wallpaper.id for wallpaper in index.best_for(width, height, k=8)],
+                             expected(width, height, 0.05, 8))
+
+        best = index.best_for(1920, 1080, k=1)[0]
+        index.add([DesktopprApi.Wallpaper({'id': best.id, 'width': best.width, 'height': best.height,
+                                           'likes_count': -1})])
+        self.assertNotEqual(index.best_for(1920, 1080, k=1)[0].id, best.id)
+        self.assertTrue(index.remove(best.id))
+        self.assertEqual(len(index), len(wallpapers) - 1)
+        for width, height, tolerance in ((1920, 0, 0.05), (0, 1080, 0.05), (-1920, -1080, 0.05), (1920, 1080, -0.1),
+                                         (float('nan'), 1080, 0.05)):
+            with self.assertRaisesRegex(ValueError, 'must be'):
+                index.best_for(width, height, tolerance)
+        exact = index.best_for(1920, 1080, 0)
+        self.assertTrue(exact)
+        self.assertTrue(all(wallpaper.width * 9 == wallpaper.height * 16 for wallpaper in exact))
+
+        #An update without a size drops the indexed copy, and empty buckets don't linger.
+        index = DesktopprScreenFit.ScreenFitIndex()
+        index.add([DesktopprApi.Wallpaper({'id': 1, 'width': 1920, 'height': 1080, 'likes_count': 3}),
+                   DesktopprApi.Wallpaper({'id': 2, 'width': 1000, 'height': 1000, 'likes_count': 1})])
+        self.assertEqual(len(index._buckets), 2)
+        self.assertEqual(index.add([DesktopprApi.Wallpaper({'id': 1, 'likes_count': 3})]), 0)
+        self.assertEqual((len(index), len(index._buckets)), (1, 1))
+        self.assertEqual(index.best_for(1920, 1080), [])
+        self.assertTrue(index.remove(2))
+        self.assertEqual((len(index), index._buckets), (0, {}))
+
+    def testModelSlots(self):
+        info = {'id': 7, 'width': 1920, 'uploader': 'user1', 'rating': 4.5, 'source': {'url': 'http://example.com'},
+                'image': {'url': 'http://example.com/full.jpg', 'thumb': {'url': 'http://example.com/thumb.jpg',
+                                                                          'width': 296, 'height': 185}}}
+        wallpaper = DesktopprApi.Wallpaper(info)
+        for model in (wallpaper, wallpaper.image, DesktopprApi.User({'username': 'user1'}),
+                      self.api(authorize=False).get_user_collection('user3')):
+            self.assertFalse(hasattr(model, '__dict__'))
+            with self.assertRaises(AttributeError):
+                model.not_a_field = 1
+        #Unknown keys are kept in extra and read as attributes; a dict among them is not mistaken for an image.
+        self.assertEqual(wallpaper.extra, {'rating': 4.5, 'source': {'url': 'http://example.com'}})
+        self.assertEqual(wallpaper.rating, 4.5)
+        self.assertEqual(wallpaper.source, {'url': 'http://example.com'})
+        self.assertIsInstance(wallpaper.source, dict)
+        self.assertIsNone(DesktopprApi.User({'username': 'user1'}).extra)
+        with self.assertRaises(AttributeError):
+            wallpaper.not_a_field
+        #The nested image dicts are still built into Image objects.
+        self.assertIsInstance(wallpaper.image, DesktopprApi.Image)
+        self.assertEqual(wallpaper.image.url, 'http://example.com/full.jpg')
+        self.assertIsInstance(wallpaper.image.thumb, DesktopprApi.Image)
+        self.assertEqual((wallpaper.image.thumb.width, wallpaper.image.thumb.height), (296, 185))
+        self.assertIsNone(wallpaper.image.preview)
+        self.assertEqual(DesktopprApi.Wallpaper.from_dict(wallpaper.to_dict()).to_dict(), info)
+
+    def testCodec(self):
+        api = self.api(authorize=False)
+        page = api.get_user_collection('user1', page=2)
+        followers = api.get_user_followers('user1')
+        odd = DesktopprApi.Wallpaper({'id': 1, 'palette': ['abcdef'], 'created_at': 'yesterday', 'url': 'nofolder',
+                                      'image': {'url': None, 'unknown': [1, None, 2.5]}, 'new_field': {'a': True}})
+        for obj in (page, followers, page.wallpapers[0], followers.users[0], page.wallpapers, followers.users, odd):
+            data = DesktopprCodec.encode(obj)
+            decoded = DesktopprCodec.decode(data)
+            self.assertIs(type(decoded), type(obj))
+            if isinstance(obj, list):
+                self.assertEqual([item.to_dict() for item in decoded], [item.to_dict() for item in obj])
+            else:
+                self.assertEqual(decoded.to_dict(), obj.to_dict())
+        self.assertEqual(DesktopprApi.Page.from_dict(page.to_dict()).to_dict(), page.to_dict())
+        self.assertEqual(DesktopprCodec.decode(DesktopprCodec.encode(odd)).new_field, {'a': True})
+        self.assertEqual(DesktopprCodec.decode(DesktopprCodec.encode([])), [])
+        self.assertLess(len(DesktopprCodec.encode(page)), len(pickle.dumps(page)) / 3)
+
+        data = DesktopprCodec.encode(page)
+        for corrupt in (b'', b'not codec data', data[:-5], data + b'\0'):
+            self.assertRaises(ValueError, DesktopprCodec.decode, corrupt)
+        self.assertRaises(TypeError, DesktopprCodec.encode, [page.wallpapers[0], followers.users[0]])
+        self.assertRaises(TypeError, DesktopprCodec.encode, DesktopprApi.Wallpaper({'id': object()}))
+
+    def testLightImport(self):
+        #requests and the optional subsystems must only be imported once they are used.
+        code = ('import sys, DesktopprApi\n'
+                'api = DesktopprApi.DesktopprAPI()\n'
+                'print(" ".join(sorted(sys.modules)))\n'
+                'api.baseurl = sys.argv[1]\n'
+                'print(api.get_user_info("user1").username)\n'
+                'print(" ".join(sorted(sys.modules)))')
+        output = subprocess.run([sys.executable, '-c', code, self.server.baseurl], capture_output=True, text=True,
+                                check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.splitlines()
+        for module in ('requests', 'urllib3', 'concurrent.futures', 'DesktopprCache', 'DesktopprDownload',
+                       'DesktopprAsync'):
+            self.assertNotIn(module, output[0].split())
+        self.assertEqual(output[1], 'user1')
+        self.assertIn('requests', output[2].split())
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
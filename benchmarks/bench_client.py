@@ -0,0 +1,127 @@
+"""
+Offline throughput, latency and allocation benchmark of :class:`DesktopprApi.DesktopprAPI`, one row per endpoint.
+
+The client talks to a :mod:`DesktopprFakeServer` started in a separate process, so the numbers don't depend on the
+network and the server's own work doesn't count towards the client's allocations. For every endpoint it reports
+requests per second with *threads* callers sharing one API object, the p50 and p99 latency of a call, and the peak
+memory a single call allocates (measured with tracemalloc on separate, sequential calls)::
+
+    $ python benchmarks/bench_client.py [--count 500] [--threads 8] [--latency 0.005] [--save run.json]
+    $ python benchmarks/bench_client.py --compare run.json
+
+``--compare`` prints each number next to the one saved by an earlier run, to check a client change.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+import DesktopprApi
+
+WALLPAPERS = 500
+
+ENDPOINTS = (
+    ('user_info', lambda api, i: api.get_user_info('user{}'.format(i % 50))),
+    ('user_collection', lambda api, i: api.get_user_collection('user{}'.format(i % 50))),
+    ('wallpapers', lambda api, i: api.get_wallpapers(i % 10 + 1, 'all')),
+    ('userlikes', lambda api, i: api.get_userlikes('user{}'.format(i % 50))),
+    ('followers', lambda api, i: api.get_user_followers('user{}'.format(i % 50))),
+    ('following', lambda api, i: api.get_followed_users('user{}'.format(i % 50))),
+    ('random_wallpaper', lambda api, i: api.get_random_wallpaper()),
+    ('check_if_liked', lambda api, i: api.check_if_liked('user{}'.format(i % 50), i % WALLPAPERS + 1)),
+    ('like_unlike', lambda api, i: (api.like_wallpaper if i % 2 else api.unlike_wallpaper)(i // 2 % WALLPAPERS + 1)),
+    ('sync_unsync', lambda api, i: (api.sync_wallpaper if i % 2 else api.unsync_wallpaper)(i // 2 % WALLPAPERS + 1)),
+    ('flag', lambda api, i: api.flag_wallpaper(i % WALLPAPERS + 1, 'flag_safe')),
+)
+
+
+def start_server(latency):
+    """Starts the fake server in a child process and returns it with its base URL."""
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'DesktopprFakeServer.py'), '--latency',
+                                str(latency), '--wallpapers', str(WALLPAPERS)], stdout=subprocess.PIPE, text=True)
+    return process, process.stdout.readline().strip()
+
+
+def percentile(ordered, fraction):
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def run_endpoint(api, call, count, threads):
+    def timed(i):
+        started = time.perf_counter()
+        call(api, i)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = sorted(executor.map(timed, range(count)))
+    elapsed = time.perf_counter() - started
+    return {'requests_per_second': count / elapsed, 'p50_ms': percentile(latencies, 0.5) * 1e3,
+            'p99_ms': percentile(latencies, 0.99) * 1e3}
+
+
+def peak_allocation(api, call, samples):
+    """Average peak memory allocated by one call, in KiB."""
+    tracemalloc.start()
+    total = 0
+    for i in range(samples):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        call(api, i)
+        total += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return total / samples / 1024
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--count', type=int, default=500, help='calls per endpoint')
+    parser.add_argument('--threads', type=int, default=8, help='threads sharing the API object')
+    parser.add_argument('--latency', type=float, default=0.005, help='seconds the server adds to each request')
+    parser.add_argument('--samples', type=int, default=50, help='sequential calls measured with tracemalloc')
+    parser.add_argument('--save', help='write the results to this json file')
+    parser.add_argument('--compare', help='json file of an earlier run to compare with')
+    args = parser.parse_args(argv)
+
+    process, baseurl = start_server(args.latency)
+    try:
+        api = DesktopprApi.DesktopprAPI(pool_maxsize=args.threads)
+        api.baseurl = baseurl
+        api.authorize_API('FAKE_API_KEY')
+        results = {}
+        for name, call in ENDPOINTS:
+            call(api, 0)
+            results[name] = run_endpoint(api, call, args.count, args.threads)
+            results[name]['peak_kib'] = peak_allocation(api, call, args.samples)
+        api.close()
+    finally:
+        process.terminate()
+        process.wait()
+
+    previous = {}
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    columns = ('requests_per_second', 'p50_ms', 'p99_ms', 'peak_kib')
+    print('{:<18}'.format('endpoint') + ''.join('{:>24}'.format(column) for column in columns))
+    for name, row in results.items():
+        cells = []
+        for column in columns:
+            cell = '{:.1f}'.format(row[column])
+            if name in previous:
+                cell = '{:.1f} -> {}'.format(previous[name][column], cell)
+            cells.append('{:>24}'.format(cell))
+        print('{:<18}'.format(name) + ''.join(cells))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Size and speed of :mod:`DesktopprCodec` against pickle and json, for pages of wallpapers and of users.
+
+The pages are built from a :class:`DesktopprFakeServer.FakeDesktoppr` data set, so every wallpaper has its own
+URLs, palette and timestamp like real ones. For every format it reports the bytes per page and the microseconds to
+encode and decode one, the best of five runs::
+
+    $ python benchmarks/bench_codec.py [--pages 20] [--per-page 50] [--save codec.json]
+    $ python benchmarks/bench_codec.py --compare codec.json
+
+The formats are the codec, pickle of the :class:`DesktopprApi.Page` objects, and pickle and json of their
+:meth:`~DesktopprApi.Page.to_dict`. ``--compare`` prints each number next to the one saved by an earlier run.
+"""
+import argparse
+import json
+import os
+import pickle
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import DesktopprApi
+import DesktopprCodec
+import DesktopprFakeServer
+
+FORMATS = (
+    ('codec', DesktopprCodec.encode, DesktopprCodec.decode),
+    ('pickle', lambda page: pickle.dumps(page, pickle.HIGHEST_PROTOCOL), pickle.loads),
+    ('pickle to_dict', lambda page: pickle.dumps(page.to_dict(), pickle.HIGHEST_PROTOCOL),
+     lambda data: DesktopprApi.Page.from_dict(pickle.loads(data))),
+    ('json to_dict', lambda page: json.dumps(page.to_dict()).encode(),
+     lambda data: DesktopprApi.Page.from_dict(json.loads(data))),
+)
+
+
+def make_pages(kind, count, per_page):
+    """Builds *count* pages of *per_page* wallpapers or users."""
+    data = DesktopprFakeServer.FakeDesktoppr(users=count * per_page if kind == 'users' else 50,
+                                             wallpapers=count * per_page if kind == 'wallpapers' else 10)
+    items = list(data.users.values() if kind == 'users' else data.wallpapers.values())
+    pages = []
+    for number in range(1, count + 1):
+        response = items[(number - 1) * per_page:number * per_page]
+        pages.append(DesktopprApi.Page(kind, {
+            'response': response, 'count': len(response),
+            'pagination': {'current': number, 'previous': number - 1 or None,
+                           'next': number + 1 if number < count else None, 'per_page': per_page, 'pages': count}}))
+    return pages
+
+
+def measure(pages, encode, decode):
+    encoded = [encode(page) for page in pages]
+    size = sum(len(data) for data in encoded) / len(pages)
+    encoding = min(timeit.repeat(lambda: [encode(page) for page in pages], number=1, repeat=5)) / len(pages)
+    decoding = min(timeit.repeat(lambda: [decode(data) for data in encoded], number=1, repeat=5)) / len(pages)
+    return {'bytes': size, 'encode_us': encoding * 1e6, 'decode_us': decoding * 1e6}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--pages', type=int, default=20, help='pages of each kind')
+    parser.add_argument('--per-page', type=int, default=50, help='wallpapers or users per page')
+    parser.add_argument('--save', help='write the results to this json file')
+    parser.add_argument('--compare', help='json file of an earlier run to compare with')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for kind in ('wallpapers', 'users'):
+        pages = make_pages(kind, args.pages, args.per_page)
+        for name, encode, decode in FORMATS:
+            results['{} {}'.format(kind, name)] = measure(pages, encode, decode)
+
+    previous = {}
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    columns = ('bytes', 'encode_us', 'decode_us')
+    print('{:<26}'.format('page of {}'.format(args.per_page)) + ''.join('{:>22}'.format(c) for c in columns))
+    for name, row in results.items():
+        cells = []
+        for column in columns:
+            cell = '{:.1f}'.format(row[column])
+            if name in previous:
+                cell = '{:.1f} -> {}'.format(previous[name][column], cell)
+            cells.append('{:>22}'.format(cell))
+        print('{:<26}'.format(name) + ''.join(cells))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
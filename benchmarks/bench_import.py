@@ -0,0 +1,91 @@
+"""
+Startup benchmark: how long ``import DesktopprApi`` (and creating an API object) takes in a fresh interpreter, and
+which modules it pulls in.
+
+Every run starts a new ``python -X importtime`` process, so nothing is cached in memory between runs; the byte code
+is compiled once beforehand so compilation isn't measured. It reports the median and best cumulative import time of
+each module, the slowest modules it imported and whether any of the heavy ones (requests, urllib3...) were loaded::
+
+    $ python benchmarks/bench_import.py [--runs 20] [--module DesktopprApi] [--save startup.json]
+    $ python benchmarks/bench_import.py --compare startup.json --max-regression 0.25
+
+With ``--max-regression``, the exit status is 1 if the median got slower than the saved one by more than that
+fraction, or if a heavy module is imported at startup, so it can guard against regressions in CI.
+"""
+import argparse
+import compileall
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+HEAVY = ('requests', 'urllib3', 'aiohttp', 'numpy', 'concurrent.futures', 'sqlite3', 'json')
+"""Modules that should only be imported once they are used."""
+
+_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def measure(code):
+    """Runs *code* in a fresh interpreter and returns the cumulative import time of every module it imported, in
+    microseconds."""
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, capture_output=True,
+                             text=True, check=True)
+    times = {}
+    for match in _LINE.finditer(process.stderr):
+        _, cumulative, _, name = match.groups()
+        times[name] = int(cumulative)
+    return times
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=20, help='fresh interpreters to start')
+    parser.add_argument('--module', default='DesktopprApi', help='module to import')
+    parser.add_argument('--top', type=int, default=10, help='slowest imported modules to list')
+    parser.add_argument('--save', help='write the results to this json file')
+    parser.add_argument('--compare', help='json file of an earlier run to compare with')
+    parser.add_argument('--max-regression', type=float, help='fail if the median is slower by more than this '
+                                                             'fraction than the compared run')
+    args = parser.parse_args(argv)
+
+    compileall.compile_dir(ROOT, maxlevels=0, quiet=1)
+    #Modules the interpreter imports on its own (site, .pth files) aren't the module's doing.
+    baseline = set(measure('pass'))
+    code = 'import {0}\nif hasattr({0}, "DesktopprAPI"): {0}.DesktopprAPI()'.format(args.module)
+    modules = {}
+    for _ in range(args.runs):
+        for name, cumulative in measure(code).items():
+            if name not in baseline:
+                modules.setdefault(name, []).append(cumulative)
+    target = [cumulative / 1000 for cumulative in modules[args.module]]
+    results = {'median_ms': statistics.median(target), 'best_ms': min(target),
+               'heavy': sorted(name for name in HEAVY if name in modules)}
+
+    print('{} runs of import {} + {}()'.format(args.runs, args.module, 'DesktopprAPI'))
+    print('  median {:.2f} ms, best {:.2f} ms'.format(results['median_ms'], results['best_ms']))
+    slowest = sorted(((statistics.median(samples), name) for name, samples in modules.items()
+                      if name != args.module), reverse=True)[:args.top]
+    for microseconds, name in slowest:
+        print('  {:>9.2f} ms  {}'.format(microseconds / 1000, name))
+    print('  heavy modules imported: {}'.format(', '.join(results['heavy']) or 'none'))
+
+    failed = bool(results['heavy']) and args.max_regression is not None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        change = results['median_ms'] / previous['median_ms'] - 1 if previous['median_ms'] else 0.0
+        print('  median was {:.2f} ms: {:+.0%}'.format(previous['median_ms'], change))
+        if args.max_regression is not None and change > args.max_regression:
+            failed = True
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Memory and construction time of the model classes.
+
+Compares the slotted :class:`DesktopprApi.Wallpaper` and :class:`DesktopprApi.User` with the ``__dict__`` based
+classes they replaced (reproduced below), building objects from a representative API json dict. Also compares
+building an eager :class:`DesktopprApi.Page` of wallpapers with a lazy one whose pagination is read but whose
+wallpapers are never touched::
+
+    $ python benchmarks/bench_models.py [count]
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import DesktopprApi
+
+WALLPAPER = {
+    'id': 418047, 'bytes': 1529372, 'created_at': '2013-12-25T11:38:57Z', 'height': 1200, 'width': 1920,
+    'review_state': 'safe', 'uploader': 'keithpitt', 'user_count': 3, 'likes_count': 12,
+    'palette': ['2D2B2C', '6B5A4E', 'A08C7A', 'D5C4B0', 'F1E9DF'],
+    'url': 'https://www.desktoppr.co/wallpapers/418047',
+    'image': {'url': 'https://a.desktopprassets.com/wallpapers/a1b2c3/full.jpg',
+              'thumb': {'url': 'https://a.desktopprassets.com/wallpapers/a1b2c3/thumb_full.jpg',
+                        'width': 296, 'height': 185},
+              'preview': {'url': 'https://a.desktopprassets.com/wallpapers/a1b2c3/preview_full.jpg',
+                          'width': 960, 'height': 600}},
+}
+
+USER = {
+    'username': 'keithpitt', 'name': 'Keith Pitt', 'avatar_url': 'https://secure.gravatar.com/avatar/0a1b2c',
+    'wallpapers_count': 93, 'uploaded_count': 402, 'followers_count': 51, 'following_count': 12,
+    'created_at': '2012-03-01T00:00:00Z', 'lifetime_member': True,
+}
+
+
+class LegacyImage(object):
+    def __init__(self, info=None):
+        self.thumb = None
+        self.preview = None
+        self.url = None
+        self.width = None
+        self.height = None
+        if info:
+            for attribute in info:
+                if isinstance(info[attribute], dict):
+                    setattr(self, attribute, LegacyImage(info[attribute]))
+                    continue
+                setattr(self, attribute, info[attribute])
+
+
+class LegacyWallpaper:
+    def __init__(self, info=None):
+        self.height = None
+        self.created_at = None
+        self.image = None
+        self.url = None
+        self.uploader = None
+        self.user_count = None
+        self.likes_count = None
+        self.review_state = None
+        self.bytes = None
+        self.palette = None
+        self.id = None
+        self.width = None
+        if info:
+            for attribute in info:
+                if isinstance(info[attribute], dict):
+                    setattr(self, attribute, LegacyImage(info[attribute]))
+                    continue
+                setattr(self, attribute, info[attribute])
+
+
+class LegacyUser:
+    def __init__(self, info=None):
+        self.uploaded_count = None
+        self.followers_count = None
+        self.username = None
+        self.lifetime_member = None
+        self.avatar_url = None
+        self.wallpapers_count = None
+        self.created_at = None
+        self.following_count = None
+        self.name = None
+        if info:
+            for attribute in info:
+                setattr(self, attribute, info[attribute])
+
+
+def bytes_per_object(cls, info, count):
+    """Memory allocated per object, not counting the json dict it was built from."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [cls(info) for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return (after - before) / count
+
+
+def construction_time(cls, info, count):
+    """Best of five runs, in microseconds per object."""
+    return min(timeit.repeat(lambda: cls(info), number=count, repeat=5)) / count * 1e6
+
+
+def main(count=20000):
+    print('{:<12} {:>14} {:>14} {:>14} {:>14}'.format('model', 'legacy B/obj', 'slotted B/obj', 'legacy us/obj',
+                                                      'slotted us/obj'))
+    for name, legacy, slotted, info in (('Wallpaper', LegacyWallpaper, DesktopprApi.Wallpaper, WALLPAPER),
+                                        ('User', LegacyUser, DesktopprApi.User, USER)):
+        print('{:<12} {:>14.0f} {:>14.0f} {:>14.2f} {:>14.2f}'.format(
+            name, bytes_per_object(legacy, info, count), bytes_per_object(slotted, info, count),
+            construction_time(legacy, info, count), construction_time(slotted, info, count)))
+
+    page = {'response': [WALLPAPER] * 50, 'count': 50,
+            'pagination': {'current': 1, 'previous': None, 'next': 2, 'per_page': 50, 'pages': 20}}
+    pages = max(count // 50, 1)
+    eager = min(timeit.repeat(lambda: DesktopprApi.Page('wallpapers', page).next_page, number=pages, repeat=5))
+    lazy = min(timeit.repeat(lambda: DesktopprApi.Page('wallpapers', page, lazy=True).next_page, number=pages,
+                             repeat=5))
+    print('Page of 50 wallpapers, pagination only: eager {:.1f} us, lazy {:.1f} us'.format(
+        eager / pages * 1e6, lazy / pages * 1e6))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -16,12 +16,22 @@ setup(name=MODULE_NAME,
                    'License :: OSI Approved :: GPL v3',
                    'Operating System :: OS Independent',
                    'Programming Language :: Python',
-                   'Programming Language :: Python :: 3.3'],
+                   'Programming Language :: Python :: 3',
+                   'Programming Language :: Python :: 3 :: Only',
+                   'Programming Language :: Python :: 3.9',
+                   'Programming Language :: Python :: 3.10',
+                   'Programming Language :: Python :: 3.11',
+                   'Programming Language :: Python :: 3.12'],
       description='API Wrapper for the Desktoppr.co web site',
       install_requires=['requests>=1.0.2', 'setuptools'],
+      extras_require={'async': ['aiohttp'], 'frame': ['numpy'], 'palette': ['numpy']},
       license='GPL v3',
       long_description=README,
-      py_modules=[MODULE_NAME, 'DesktopprTester'],
+      python_requires='>=3.9',
+      py_modules=[MODULE_NAME, 'DesktopprAsync', 'DesktopprCache', 'DesktopprCatalog', 'DesktopprCodec',
+                  'DesktopprCrawler', 'DesktopprDownload', 'DesktopprFrame', 'DesktopprFakeServer', 'DesktopprMetrics',
+                  'DesktopprPalette', 'DesktopprPrefetch', 'DesktopprRateLimit', 'DesktopprRetry', 'DesktopprScreenFit',
+                  'DesktopprStore', 'DesktopprSync', 'DesktopprTester'],
       test_suite='DesktopprTester',
       url='https://github.com/mgamerz/desktopprapi_pythonwrapper',
       version=VERSION)